@@ -1,73 +1,242 @@
+import hashlib
+import hmac
+import math
 import time
+import asyncio
 import structlog
-import requests
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
 
-from app.models.config import settings
+from app.models.config import settings, ollama_endpoints, cascade_tiers
 from app.models.schemas import (
     QuestionRequest,
     QuestionResponse,
-    Citation,
     Metrics,
     GuardrailViolation,
-    HealthResponse
+    HealthResponse,
+    PregenerationRequest
 )
-from app.services.indexer import DocumentIndexer
-from app.services.rag import RAGService
+from app.services.indexer import DocumentIndexer, load_embedding_model
+from app.services.text_cache import PageTextCache
+from app.services.llm_backend import OllamaBackend
+from app.services.vector_store import QuantizedVectorStore
+from app.services.rag import RAGService, relevance_floor_for, DEFAULT_SYSTEM_PROMPT
 from app.services.guardrails import GuardrailService
+from app.services.citations import build_citations
+from app.services.singleflight import SingleFlight
 from app.services.metrics import metrics_service
+from app.services.history import RequestHistoryStore
+from app.services.health import HealthMonitor
+from app.services.ingestion import IngestionService, IngestionQueueFull
+from app.services.profiler import ProfilingService, ProfilerBusy
+from app.services.pregeneration import PregeneratedAnswerStore, PregenerationService, generation_signature
+from app.services.answer_cache import AnswerCache, CACHED_DOCUMENT_FIELDS, answer_cache_key
+from app.services.rate_limit import RateLimiter
+from app.services.scheduler import FairScheduler, SchedulerQueueFull
 from app.utils.logger import setup_logging
+from app.utils.text import normalize_query
 
 # Configurar logging estruturado com arquivo
-logger = setup_logging(log_dir="/app/logs", log_level=settings.log_level)
+logger = setup_logging(log_dir=settings.log_dir, log_level=settings.log_level)
 
 # Variáveis globais para serviços (DI)
 indexer: DocumentIndexer = None
 rag_service: RAGService = None
 guardrail_service: GuardrailService = None
+history_store: RequestHistoryStore = None
+health_monitor: HealthMonitor = None
+ingestion_service: IngestionService = None
+pregenerated_store: PregeneratedAnswerStore = None
+pregeneration_service: PregenerationService = None
+answer_cache: AnswerCache = None
+single_flight = SingleFlight()
+profiling_service = ProfilingService()
+rate_limiter = RateLimiter({
+    "interactive": (settings.rate_limit_rps, settings.rate_limit_burst),
+    "bulk": (settings.bulk_rate_limit_rps, settings.bulk_rate_limit_burst)
+})
+generation_scheduler = FairScheduler(
+    settings.generation_concurrency,
+    {"interactive": settings.interactive_weight, "bulk": settings.bulk_weight},
+    settings.scheduler_max_queue
+) if settings.generation_concurrency > 0 else None
+bulk_api_keys = {key.strip() for key in settings.bulk_api_keys.split(",") if key.strip()}
+
+# Com gunicorn --preload o módulo é importado no master antes do fork: os pesos
+# do modelo ficam compartilhados entre os workers (copy-on-write)
+preloaded_embedding_model = (
+    load_embedding_model(settings.embedding_model, settings.torch_num_threads or None)
+    if settings.preload_embedding_model else None
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gerencia o ciclo de vida da aplicação"""
-    global indexer, rag_service, guardrail_service
+    global indexer, rag_service, guardrail_service, history_store, health_monitor, ingestion_service
+    global pregenerated_store, pregeneration_service, answer_cache
     
     logger.info("Starting application initialization")
     
     # Inicializar serviços
+    embedding_model = preloaded_embedding_model
+    if embedding_model is None:
+        embedding_model = load_embedding_model(settings.embedding_model, settings.torch_num_threads or None)
+    
+    text_cache = None
+    if settings.text_cache_enabled:
+        text_cache = PageTextCache(f"{settings.cache_path}/text")
+    
     indexer = DocumentIndexer(
         data_path=settings.data_path,
         chroma_db_path=settings.chroma_db_path,
         embedding_model_name=settings.embedding_model,
         chunk_size=settings.chunk_size,
-        chunk_overlap=settings.chunk_overlap
+        chunk_overlap=settings.chunk_overlap,
+        text_cache=text_cache,
+        embedding_batch_size=settings.embedding_batch_size,
+        embedding_model=embedding_model,
+        partition_by_source=settings.index_partition_by_source,
+        vector_store=settings.vector_store
     )
     
-    # Indexar documentos
-    logger.info("Starting document indexation")
-    indexed_count = indexer.index_documents()
-    logger.info("Document indexation complete", indexed_chunks=indexed_count)
+    # Indexar documentos (apenas se o corpus/configuração mudou)
+    if settings.index_on_startup:
+        logger.info("Starting document indexation")
+        indexed_count = await asyncio.to_thread(indexer.ensure_index)
+        logger.info("Document indexation complete", indexed_chunks=indexed_count)
+    else:
+        logger.info("Waiting for external indexer")
+        await asyncio.to_thread(indexer.wait_for_index, timeout=settings.index_wait_timeout)
     
     # Inicializar RAG service
     collection = indexer.get_collection()
     if not collection:
         raise Exception("Failed to initialize ChromaDB collection")
     
+    # Inicializar guardrails (também pontuam os níveis da cascata de modelos)
+    guardrail_service = GuardrailService(
+        max_query_length=settings.max_query_length
+    )
+    
+    quantized_store = None
+    if settings.vector_store == "int8":
+        quantized_store = QuantizedVectorStore(
+            str(indexer.quantized_path),
+            rescore_factor=settings.quantized_rescore_factor
+        )
+        if not quantized_store.load():
+            logger.warning("Quantized vector store not found, falling back to Chroma")
+    
+    llm_backend = OllamaBackend(
+        base_urls=ollama_endpoints(),
+        failure_threshold=settings.ollama_failure_threshold,
+        cooldown_seconds=settings.ollama_cooldown_seconds,
+        hedge_enabled=settings.ollama_hedge_enabled,
+        hedge_percentile=settings.ollama_hedge_percentile,
+        hedge_min_samples=settings.ollama_hedge_min_samples
+    )
+    
     rag_service = RAGService(
         collection=collection,
         embedding_model=indexer.embedding_model,
         ollama_base_url=settings.ollama_base_url,
         ollama_model=settings.ollama_model,
-        top_k=settings.top_k
+        top_k=settings.top_k,
+        max_context_docs=settings.max_context_docs,
+        retrieval_cache_size=settings.retrieval_cache_size,
+        embedding_cache_size=settings.embedding_cache_size,
+        index_version=indexer.index_version,
+        min_relevance_score=relevance_floor_for(settings.embedding_model, settings.min_relevance_score),
+        system_prompt=settings.ollama_system_prompt or DEFAULT_SYSTEM_PROMPT,
+        keep_alive=settings.ollama_keep_alive,
+        backend=llm_backend,
+        cascade_models=cascade_tiers(),
+        cascade_threshold=settings.cascade_threshold,
+        guardrail_service=guardrail_service,
+        partition_lookup=indexer.get_partition if settings.index_partition_by_source else None,
+        vector_store=quantized_store,
+        diversity_mode=settings.diversity_mode,
+        mmr_lambda=settings.mmr_lambda,
+        duplicate_threshold=settings.duplicate_threshold
     )
     
-    # Inicializar guardrails
-    guardrail_service = GuardrailService(
-        max_query_length=settings.max_query_length
+    # Carregar o modelo no Ollama em background (não bloqueia o startup)
+    if settings.ollama_warmup:
+        asyncio.get_running_loop().run_in_executor(None, rag_service.warmup)
+    
+    # Histórico persistente de requisições
+    if settings.history_enabled:
+        history_store = RequestHistoryStore(
+            db_path=settings.history_db_path,
+            queue_size=settings.history_queue_size
+        )
+        metrics_service.history_sink = history_store
+    
+    # Respostas pré-geradas: regeneradas em background para a versão atual do índice
+    # (um worker por vez, pela fila de geração na classe bulk)
+    if settings.pregeneration_enabled:
+        pregenerated_store = PregeneratedAnswerStore(settings.pregenerated_db_path)
+        pregeneration_service = PregenerationService(
+            pregenerated_store,
+            rag_service,
+            guardrail_service if settings.enable_guardrails else None,
+            scheduler=generation_scheduler,
+            loop=asyncio.get_running_loop()
+        )
+        pregeneration_service.refresh(rag_service.index_version)
+    
+    # Cache persistente de respostas: já quente após o restart se a versão do índice não mudou
+    if settings.answer_cache_enabled:
+        answer_cache = AnswerCache(
+            settings.answer_cache_db_path,
+            max_bytes=int(settings.answer_cache_max_mb * 1024 * 1024),
+            mmap_size=int(settings.answer_cache_mmap_mb * 1024 * 1024)
+        )
+        if rag_service.index_version:
+            answer_cache.purge(rag_service.index_version)
+    
+    def on_index_changed(index_version):
+        rag_service.set_index_version(index_version, collection=indexer.get_collection())
+        if answer_cache and index_version:
+            answer_cache.purge(index_version)
+        if pregeneration_service:
+            pregeneration_service.refresh(index_version)
+    
+    # Ingestão pela API: ao concluir um job, a nova versão do índice invalida os
+    # caches de retrieval e de respostas e dispara a regeneração das pré-geradas
+    if settings.ingestion_enabled:
+        ingestion_service = IngestionService(
+            indexer=indexer,
+            db_path=settings.ingestion_db_path,
+            on_index_changed=on_index_changed,
+            queue_size=settings.ingestion_queue_size
+        )
+    
+    def probe_vector_store() -> int:
+        # Índice reconstruído por outro processo (indexador standalone ou ingestão
+        # em outro worker): o manifesto mudou, então re-resolve a collection
+        index_version = indexer.index_version
+        if index_version and index_version != rag_service.index_version:
+            logger.info("Index rebuilt externally", index_version=index_version)
+            on_index_changed(index_version)
+        current = indexer.get_collection()
+        if current is None:
+            raise RuntimeError("ChromaDB collection not found")
+        return current.count()
+    
+    # Sondas de Ollama e vector store em background
+    health_monitor = HealthMonitor(
+        ollama_probe=lambda: rag_service.backend.probe(timeout=settings.health_probe_timeout),
+        vector_store_probe=probe_vector_store,
+        interval=settings.health_check_interval,
+        require_ollama=settings.ready_requires_ollama
     )
+    health_monitor.start()
     
     logger.info("Application initialization complete")
     
@@ -75,6 +244,16 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("Shutting down application")
+    await health_monitor.stop()
+    if ingestion_service:
+        ingestion_service.close()
+    if history_store:
+        metrics_service.history_sink = None
+        history_store.close()
+    if pregenerated_store:
+        pregenerated_store.close()
+    if answer_cache:
+        answer_cache.close()
 
 
 # Criar aplicação FastAPI
@@ -82,10 +261,123 @@ app = FastAPI(
     title="Micro-RAG API",
     description="Microserviço de RAG com Guardrails para responder perguntas baseadas em documentos",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
+def _round_optional(value, digits: int = 2):
+    return round(value, digits) if value is not None else None
+
+
+def _store_cached_answer(key: str, index_version: str, payload: dict) -> None:
+    """Grava no cache de respostas (executor: a transação pode esperar outro worker)"""
+    try:
+        answer_cache.put(key, index_version, payload)
+    except Exception as e:
+        logger.warning("Answer cache write failed", error=str(e))
+
+
+async def run_pipeline(request: QuestionRequest, client: Tuple[str, str], profile: bool = False):
+    """
+    Executa retrieve + generate fora do event loop, com deduplicação de
+    perguntas idênticas concorrentes (mesma pergunta normalizada, top_k e filtros)
+    
+    A execução ocupa uma vaga do scheduler justo (por cliente e classe); quem
+    recebe o resultado de outra requisição em andamento não entra na fila.
+    
+    Args:
+        client: (cliente, classe) de client_identity
+        profile: Executa sob cProfile (sem deduplicação, para medir a própria execução)
+    
+    Returns:
+        Tuple: (resultado de RAGService.answer_question, deduplicated, profile_id, queue_wait_ms)
+    """
+    loop = asyncio.get_running_loop()
+    filters = request.retrieval_filters()
+    tenant, priority = client
+    queue_wait = {}
+    
+    def pipeline():
+        if profile:
+            return profiling_service.run_profiled(
+                rag_service.answer_question, request.question, request.top_k, filters
+            )
+        return rag_service.answer_question(request.question, request.top_k, filters), None
+    
+    async def execute():
+        if generation_scheduler is None:
+            queue_wait["ms"] = 0.0
+            return await loop.run_in_executor(None, pipeline)
+        async with generation_scheduler.slot(tenant, priority) as wait_ms:
+            queue_wait["ms"] = wait_ms
+            return await loop.run_in_executor(None, pipeline)
+    
+    def record_queue_wait():
+        if "ms" in queue_wait:
+            metrics_service.record_tenant_request(tenant, priority, queue_wait["ms"])
+        return queue_wait.get("ms")
+    
+    if profile or not settings.single_flight_enabled:
+        result, profile_id = await execute()
+        return result, False, profile_id, record_queue_wait()
+    
+    key = (
+        normalize_query(request.question),
+        request.top_k,
+        tuple(sorted(set(request.sources))) if request.sources else None,
+        request.page_min,
+        request.page_max
+    )
+    (result, _), deduplicated = await single_flight.do(key, execute)
+    return result, deduplicated, None, record_queue_wait()
+
+
+async def client_identity(
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None)
+) -> Tuple[str, str]:
+    """
+    Identifica o cliente (API key ou IP) e a classe (interactive/bulk) e aplica o rate limit
+    
+    Roda como dependência, antes da validação do corpo: requisições acima do
+    limite são rejeitadas com 429 sem tocar no pipeline.
+    """
+    if x_api_key:
+        tenant = "key:" + hashlib.sha256(x_api_key.encode()).hexdigest()[:12]
+    else:
+        tenant = "ip:" + (request.client.host if request.client else "unknown")
+    bulk = (x_api_key in bulk_api_keys) if x_api_key else False
+    priority = "bulk" if bulk or (x_priority or "").lower() == "bulk" else "interactive"
+    
+    if settings.rate_limit_enabled:
+        # Limites de bulk só para BULK_API_KEYS: X-Priority: bulk apenas rebaixa na fila
+        allowed, retry_after = rate_limiter.check(tenant, "bulk" if bulk else "interactive")
+        if not allowed:
+            metrics_service.record_tenant_rejection(tenant, priority, "rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail={"error": "rate_limited", "message": "Limite de requisições excedido"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+    return tenant, priority
+
+
+def _require_admin(token: Optional[str]) -> None:
+    """Valida o header X-Admin-Token (endpoints administrativos desativados sem ADMIN_TOKEN)"""
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "admin_disabled", "message": "Endpoints administrativos desativados (ADMIN_TOKEN vazio)"}
+        )
+    if not token or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"error": "forbidden", "message": "X-Admin-Token inválido"}
+        )
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Endpoint raiz com informações da API"""
@@ -95,47 +387,94 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
             "ask": "/api/v1/ask",
-            "metrics": "/api/v1/metrics"
+            "metrics": "/api/v1/metrics",
+            "history": "/api/v1/history",
+            "documents": "/api/v1/documents"
         }
     }
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check do serviço"""
-    # Verificar status do Ollama
-    ollama_status = "unhealthy"
-    try:
-        response = requests.get(f"{settings.ollama_base_url}/api/tags", timeout=5)
-        if response.status_code == 200:
-            ollama_status = "healthy"
-    except Exception as e:
-        logger.error("Ollama health check failed", error=str(e))
-    
-    # Obter estatísticas do índice
-    stats = indexer.get_stats() if indexer else {"total_chunks": 0}
+    """Health check do serviço (último resultado das sondas em background)"""
+    if health_monitor is None:
+        ollama_status, documents_indexed, last_checked = "unknown", 0, None
+    else:
+        snapshot = health_monitor.snapshot()
+        ollama = snapshot["ollama"]
+        ollama_status = "healthy" if ollama["healthy"] else "unhealthy"
+        documents_indexed = snapshot["vector_store"]["documents_indexed"]
+        last_checked = ollama["checked_at"]
     
     return HealthResponse(
         status="healthy" if ollama_status == "healthy" else "degraded",
         ollama_status=ollama_status,
-        documents_indexed=stats["total_chunks"],
+        documents_indexed=documents_indexed,
         embedding_model=settings.embedding_model,
-        timestamp=datetime.utcnow().isoformat()
+        timestamp=datetime.utcnow().isoformat(),
+        last_checked=last_checked
     )
 
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness: o processo e o event loop estão respondendo (sem checar dependências)"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: índice acessível (e Ollama, se READY_REQUIRES_OLLAMA) em uma sonda recente"""
+    if health_monitor is None:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "starting"})
+    
+    snapshot = health_monitor.snapshot()
+    content = {"status": "ready" if snapshot["ready"] else "not_ready", **snapshot}
+    if not snapshot["ready"]:
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=content)
+    return content
+
+
 @app.post("/api/v1/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(
+    request: QuestionRequest,
+    client: Tuple[str, str] = Depends(client_identity),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
     """
     Endpoint principal para fazer perguntas
     
     - **question**: Pergunta a ser respondida (obrigatório)
     - **top_k**: Número de documentos a recuperar (opcional, padrão: 5)
+    - **citation_detail**: none | ids | excerpts (opcional, padrão: excerpts)
+    - **context_only**: cita apenas os documentos usados no prompt (opcional, padrão: false)
+    - **sources**: restringe a busca a estes arquivos (opcional)
+    - **page_min** / **page_max**: restringe a busca a um intervalo de páginas (opcional)
+    
+    O cliente é identificado por `X-API-Key` (ou IP); `X-Priority: bulk` rebaixa a
+    requisição na fila de geração (os limites de bulk valem só para BULK_API_KEYS). Acima do limite do cliente, ou com a fila cheia, retorna 429.
+    
+    Com os headers `X-Profile: 1` e `X-Admin-Token`, o pipeline roda sob cProfile e a
+    resposta traz `X-Profile-Id` (relatório em /api/v1/admin/profile/requests/{id}).
     """
     start_time = time.time()
     
-    logger.info("Received question", question=request.question, top_k=request.top_k)
+    profile = bool(x_profile) and x_profile.lower() not in ("0", "false")
+    if profile:
+        _require_admin(x_admin_token)
+    
+    logger.info(
+        "Received question",
+        question=request.question,
+        top_k=request.top_k,
+        sources=request.sources,
+        page_min=request.page_min,
+        page_max=request.page_max
+    )
     
     # 1. Validar com guardrails
     if settings.enable_guardrails:
@@ -170,31 +509,74 @@ async def ask_question(request: QuestionRequest):
                 }
             )
     
-    # 2. Processar pergunta com RAG
+    # 2. Resposta pré-gerada (perguntas frequentes, sem filtros), cache persistente ou pipeline RAG
+    filters = request.retrieval_filters()
+    pregenerated = None
+    if pregenerated_store and not profile and not any(filters.values()):
+        pregenerated = await asyncio.get_running_loop().run_in_executor(
+            None,
+            pregenerated_store.get,
+            request.question,
+            request.top_k,
+            rag_service.index_version,
+            generation_signature(rag_service)
+        )
+    
+    cache_key, cached = None, pregenerated
+    index_version = rag_service.index_version
+    if cached is None and answer_cache and not profile and index_version:
+        cache_key = answer_cache_key(
+            request.question,
+            request.top_k,
+            filters,
+            rag_service.model_signature,
+            rag_service.prompt_fingerprint,
+            index_version
+        )
+        cached = await asyncio.get_running_loop().run_in_executor(None, answer_cache.get, cache_key)
+    answer_cached = cached is not None and pregenerated is None
+    
+    deduplicated, profile_id, queue_wait_ms = False, None, None
     try:
-        answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens = \
-            rag_service.answer_question(request.question, request.top_k)
-        
-        # Validar groundedness (resposta baseada nos documentos)
-        groundedness_score = None
-        if settings.enable_guardrails and documents:
-            is_grounded, groundedness_score = guardrail_service.validate_response_groundedness(
-                answer, documents, threshold=0.3
-            )
+        if cached is not None:
+            answer, documents = cached["answer"], cached["documents"]
+            retrieval_latency = llm_latency = 0.0
+            prompt_tokens = completion_tokens = 0
+            timings = {"model": cached["llm_model"]}
+            groundedness_score = cached["groundedness_score"]
+        else:
+            result, deduplicated, profile_id, queue_wait_ms = await run_pipeline(request, client, profile)
+            answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens, timings = result
             
-            if not is_grounded:
-                logger.warning(
-                    "Low groundedness detected",
-                    score=groundedness_score,
-                    question=request.question[:50]
+            # Groundedness (reaproveitado da cascata, se calculado) + sanitização
+            groundedness_score = None
+            if settings.enable_guardrails:
+                answer, groundedness_score = guardrail_service.review_answer(
+                    answer, documents, request.question, timings.get("groundedness_score")
+                )
+            
+            # Apenas a execução líder grava (as deduplicadas receberam o mesmo resultado)
+            if cache_key and not deduplicated:
+                payload = {
+                    "answer": answer,
+                    "documents": [{field: doc.get(field) for field in CACHED_DOCUMENT_FIELDS} for doc in documents],
+                    "groundedness_score": groundedness_score,
+                    "llm_model": timings.get("model"),
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "generated_at": time.time()
+                }
+                asyncio.get_running_loop().run_in_executor(
+                    None, _store_cached_answer, cache_key, index_version, payload
                 )
-                # Não bloqueia, mas adiciona aviso
-                answer = f"[AVISO: Resposta pode não estar totalmente baseada nos documentos]\n\n{answer}"
-        
-        # Sanitizar resposta (modo contextual - preserva dados dos documentos)
-        if settings.enable_guardrails:
-            answer = guardrail_service.sanitize_response(answer, preserve_context_data=True)
         
+    except SchedulerQueueFull as e:
+        metrics_service.record_tenant_rejection(client[0], client[1], "queue_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"error": "generation_queue_full", "message": str(e)},
+            headers={"Retry-After": "5"}
+        )
     except Exception as e:
         logger.error("Error processing question", error=str(e))
         raise HTTPException(
@@ -203,23 +585,17 @@ async def ask_question(request: QuestionRequest):
         )
     
     # 3. Preparar citações
-    citations = [
-        Citation(
-            source=doc["source"],
-            excerpt=doc["text"][:300] + "..." if len(doc["text"]) > 300 else doc["text"],
-            page=doc["page"],
-            score=round(doc["score"], 4)
-        )
-        for doc in documents
-    ]
+    cited_documents = rag_service.context_documents(documents) if request.context_only else documents
+    citations = build_citations(cited_documents, request.citation_detail)
     
     # 4. Calcular métricas
     total_latency = (time.time() - start_time) * 1000
     total_tokens = prompt_tokens + completion_tokens
     context_size = sum(len(doc["text"]) for doc in documents)
     
-    # Custo estimado (Llama2 local = grátis)
-    estimated_cost = (
+    # Custo estimado (Llama2 local = grátis); requisições deduplicadas não
+    # geraram tokens próprios, o custo fica com a execução compartilhada
+    estimated_cost = 0.0 if deduplicated else (
         prompt_tokens * settings.prompt_token_cost +
         completion_tokens * settings.completion_token_cost
     )
@@ -228,13 +604,24 @@ async def ask_question(request: QuestionRequest):
         total_latency_ms=round(total_latency, 2),
         retrieval_latency_ms=round(retrieval_latency, 2),
         llm_latency_ms=round(llm_latency, 2),
+        load_latency_ms=_round_optional(timings.get("load_ms")),
+        prefill_latency_ms=_round_optional(timings.get("prefill_ms")),
+        decode_latency_ms=_round_optional(timings.get("decode_ms")),
+        tokens_per_second=_round_optional(timings.get("tokens_per_second")),
         prompt_tokens=prompt_tokens,
         completion_tokens=completion_tokens,
         total_tokens=total_tokens,
         estimated_cost_usd=round(estimated_cost, 6),
         top_k_used=len(documents),
         context_size=context_size,
-        groundedness_score=round(groundedness_score, 3) if groundedness_score else None
+        groundedness_score=round(groundedness_score, 3) if groundedness_score else None,
+        llm_model=timings.get("model"),
+        cascade_escalated=timings.get("escalated"),
+        deduplicated=deduplicated,
+        duplicates_dropped=timings.get("duplicates_dropped", 0),
+        queue_wait_ms=_round_optional(queue_wait_ms),
+        pregenerated=pregenerated is not None,
+        answer_cached=answer_cached
     )
     
     # 5. Registrar métricas
@@ -244,13 +631,19 @@ async def ask_question(request: QuestionRequest):
         total_latency=total_latency,
         retrieval_latency=retrieval_latency,
         llm_latency=llm_latency,
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-        total_tokens=total_tokens,
+        prompt_tokens=0 if deduplicated else prompt_tokens,
+        completion_tokens=0 if deduplicated else completion_tokens,
+        total_tokens=0 if deduplicated else total_tokens,
         top_k=request.top_k,
         context_size=context_size,
         citations_count=len(citations),
-        blocked=False
+        blocked=False,
+        llm_skipped=not documents,
+        llm_timings=timings,
+        deduplicated=deduplicated,
+        duplicates_dropped=timings.get("duplicates_dropped", 0),
+        pregenerated=pregenerated is not None,
+        answer_cached=answer_cached
     )
     
     logger.info(
@@ -259,12 +652,18 @@ async def ask_question(request: QuestionRequest):
         citations=len(citations)
     )
     
-    return QuestionResponse(
+    response = QuestionResponse(
         answer=answer,
         citations=citations,
         metrics=metrics,
         status="success"
     )
+    
+    # Já validado na construção: serializar direto com orjson, sem revalidar via response_model
+    return ORJSONResponse(
+        content=response.model_dump(),
+        headers={"X-Profile-Id": profile_id} if profile_id else None
+    )
 
 
 @app.get("/api/v1/metrics")
@@ -275,13 +674,277 @@ async def get_metrics():
     stats = metrics_service.get_statistics()
     recent = metrics_service.get_recent_requests(limit=10)
     
+    # Estatísticas lidas do SQLite: fora do event loop (podem esperar uma escrita de outro worker)
+    def sqlite_stats():
+        return (
+            ingestion_service.get_stats() if ingestion_service else {},
+            pregenerated_store.get_stats() if pregenerated_store else {},
+            answer_cache.get_stats() if answer_cache else {}
+        )
+    
+    ingestion_stats, pregenerated_stats, answer_cache_stats = await asyncio.get_running_loop().run_in_executor(
+        None, sqlite_stats
+    )
+    
     return {
         "statistics": stats,
+        "caches": rag_service.cache_stats() if rag_service else {},
+        "llm_timeline": metrics_service.get_llm_timeline(),
+        "llm_backend": rag_service.backend.get_stats() if rag_service else {},
+        "single_flight": single_flight.get_stats(),
+        "history": history_store.get_stats() if history_store else {},
+        "ingestion": ingestion_stats,
+        "profiling": profiling_service.get_stats(),
+        "rate_limit": {"enabled": settings.rate_limit_enabled, **rate_limiter.get_stats()},
+        "scheduler": generation_scheduler.get_stats() if generation_scheduler else {},
+        "tenants": metrics_service.get_tenant_statistics(),
+        "pregenerated": pregenerated_stats,
+        "answer_cache": answer_cache_stats,
         "recent_requests": recent,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+def _require_ingestion() -> IngestionService:
+    if not ingestion_service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "ingestion_disabled", "message": "Ingestão pela API desativada (INGESTION_ENABLED=false)"}
+        )
+    return ingestion_service
+
+
+def _validate_source(filename: Optional[str]) -> str:
+    """Nome do arquivo sem diretórios; apenas PDFs"""
+    source = Path(filename or "").name
+    if not source or not source.lower().endswith(".pdf"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "invalid_document", "message": "Envie um arquivo .pdf"}
+        )
+    return source
+
+
+def _queue_full_response(e: IngestionQueueFull) -> JSONResponse:
+    return ORJSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"error": "ingestion_queue_full", "message": str(e)},
+        headers={"Retry-After": "30"}
+    )
+
+
+@app.post("/api/v1/documents", status_code=status.HTTP_202_ACCEPTED)
+async def upload_document(file: UploadFile = File(...), x_admin_token: Optional[str] = Header(None)):
+    """
+    Envia um PDF para indexação em background (substitui o arquivo de mesmo nome)
+    
+    Retorna o job de ingestão; acompanhe em /api/v1/documents/jobs/{job_id}.
+    PDFs com o mesmo conteúdo já indexado sob esse nome retornam um job com status "skipped".
+    Requer o header X-Admin-Token.
+    """
+    _require_admin(x_admin_token)
+    service = _require_ingestion()
+    source = _validate_source(file.filename)
+    
+    max_bytes = int(settings.max_upload_mb * 1024 * 1024)
+    content = await file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"error": "document_too_large", "message": f"Limite de {settings.max_upload_mb} MB"}
+        )
+    if not content.startswith(b"%PDF"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "invalid_document", "message": "O arquivo não é um PDF válido"}
+        )
+    
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, service.submit_upsert, source, content)
+    except IngestionQueueFull as e:
+        return _queue_full_response(e)
+
+
+@app.delete("/api/v1/documents/{source}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_document(source: str, x_admin_token: Optional[str] = Header(None)):
+    """Remove um PDF e seus chunks do índice (em background; requer X-Admin-Token)"""
+    _require_admin(x_admin_token)
+    service = _require_ingestion()
+    source = _validate_source(source)
+    
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, service.submit_delete, source)
+    except IngestionQueueFull as e:
+        return _queue_full_response(e)
+
+
+@app.get("/api/v1/documents")
+async def list_documents():
+    """Documentos indexados (com hash do conteúdo) e jobs de ingestão recentes"""
+    manifest = indexer.read_manifest() if indexer else None
+    jobs = []
+    if ingestion_service:
+        jobs = await asyncio.get_running_loop().run_in_executor(None, ingestion_service.list_jobs)
+    return {
+        "index_version": manifest.get("fingerprint") if manifest else None,
+        "documents": manifest.get("documents", {}) if manifest else {},
+        "jobs": jobs
+    }
+
+
+@app.get("/api/v1/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Status de um job de ingestão (de qualquer worker)"""
+    service = _require_ingestion()
+    job = await asyncio.get_running_loop().run_in_executor(None, service.get_job, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "job_not_found", "message": f"Job {job_id} não encontrado"}
+        )
+    return job
+
+
+@app.get("/api/v1/history")
+async def get_history(
+    start: Optional[datetime] = Query(None, description="Início do intervalo (ISO 8601, UTC se sem timezone)"),
+    end: Optional[datetime] = Query(None, description="Fim do intervalo (exclusivo)"),
+    blocked: Optional[bool] = Query(None, description="Filtra requisições bloqueadas ou não"),
+    blocked_reason: Optional[str] = Query(None, description="Política de bloqueio (ex.: INJECTION_PREVENTION_POLICY)"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Consulta o histórico persistente de requisições (mais recentes primeiro)
+    """
+    if not history_store:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "history_disabled", "message": "Histórico persistente desativado (HISTORY_ENABLED=false)"}
+        )
+    
+    loop = asyncio.get_running_loop()
+    records = await loop.run_in_executor(
+        None,
+        lambda: history_store.query(start, end, blocked, blocked_reason, limit, offset)
+    )
+    return {"count": len(records), "requests": records}
+
+
+@app.get("/api/v1/admin/profile/stacks", response_class=PlainTextResponse)
+async def sample_stacks(
+    seconds: float = Query(10, gt=0, description="Duração da amostragem"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Intervalo entre amostras"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Amostra as stacks de todas as threads do worker por N segundos
+    
+    Saída no formato collapsed (flamegraph.pl, speedscope, inferno).
+    """
+    _require_admin(x_admin_token)
+    seconds = min(seconds, settings.profile_max_seconds)
+    
+    loop = asyncio.get_running_loop()
+    try:
+        collapsed, summary = await loop.run_in_executor(
+            None, profiling_service.sample_stacks, seconds, interval_ms / 1000
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"error": "profiler_busy", "message": str(e)}
+        )
+    return PlainTextResponse(collapsed, headers={"X-Profile-Samples": str(summary["samples"])})
+
+
+@app.get("/api/v1/admin/profile/requests/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(
+    profile_id: str,
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+    limit: int = Query(40, ge=1, le=500),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Relatório cProfile de uma requisição feita com X-Profile"""
+    _require_admin(x_admin_token)
+    report = profiling_service.get_profile(profile_id, sort, limit)
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "profile_not_found", "message": f"Profile {profile_id} não encontrado"}
+        )
+    return PlainTextResponse(report)
+
+
+@app.post("/api/v1/admin/tracemalloc/start")
+async def tracemalloc_start(
+    frames: int = Query(10, ge=1, le=100),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Inicia o tracemalloc e grava o snapshot de referência"""
+    _require_admin(x_admin_token)
+    profiling_service.tracemalloc_start(frames)
+    return {"tracing": True, "frames": frames}
+
+
+@app.get("/api/v1/admin/tracemalloc/diff")
+async def tracemalloc_diff(
+    limit: int = Query(30, ge=1, le=500),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Maiores variações de memória por linha desde o snapshot anterior"""
+    _require_admin(x_admin_token)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, profiling_service.tracemalloc_diff, limit)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"error": "tracemalloc_not_started", "message": str(e)}
+        )
+
+
+@app.post("/api/v1/admin/tracemalloc/stop")
+async def tracemalloc_stop(x_admin_token: Optional[str] = Header(None)):
+    """Para o tracemalloc (remove o overhead de rastreamento)"""
+    _require_admin(x_admin_token)
+    profiling_service.tracemalloc_stop()
+    return {"tracing": False}
+
+
+def _require_pregeneration() -> PregenerationService:
+    if not pregeneration_service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "pregeneration_disabled", "message": "Respostas pré-geradas desativadas (PREGENERATION_ENABLED=false)"}
+        )
+    return pregeneration_service
+
+
+@app.post("/api/v1/admin/pregenerate", status_code=status.HTTP_202_ACCEPTED)
+async def pregenerate_answers(job: PregenerationRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Pré-gera respostas em background (pipeline completo) para a versão atual do índice
+    
+    Se já houver um job em andamento, retorna o status dele.
+    """
+    _require_admin(x_admin_token)
+    service = _require_pregeneration()
+    return service.submit(
+        [(item.question, item.top_k) for item in job.questions],
+        force=job.force
+    )
+
+
+@app.get("/api/v1/admin/pregenerate")
+async def get_pregeneration_status(x_admin_token: Optional[str] = Header(None)):
+    """Último job de pré-geração e entradas do store por versão do índice"""
+    _require_admin(x_admin_token)
+    service = _require_pregeneration()
+    store_stats = await asyncio.get_running_loop().run_in_executor(None, service.store.get_stats)
+    return {"job": service.get_status(), "store": store_stats}
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Handler global de exceções"""
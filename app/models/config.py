@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 import os
@@ -6,7 +7,24 @@ import os
 class Settings(BaseSettings):
     # Ollama Configuration
     ollama_base_url: str = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+    # Réplicas do Ollama separadas por vírgula (vazio = apenas OLLAMA_BASE_URL)
+    ollama_base_urls: str = os.getenv("OLLAMA_BASE_URLS", "")
+    ollama_failure_threshold: int = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3"))
+    ollama_cooldown_seconds: float = float(os.getenv("OLLAMA_COOLDOWN_SECONDS", "30"))
+    # Hedging: reenvia para outra réplica quando a latência passa do percentil configurado
+    ollama_hedge_enabled: bool = os.getenv("OLLAMA_HEDGE_ENABLED", "false").lower() == "true"
+    ollama_hedge_percentile: float = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "0.95"))
+    ollama_hedge_min_samples: int = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
     ollama_model: str = os.getenv("OLLAMA_MODEL", "llama2")
+    # Tempo que o Ollama mantém o modelo carregado após cada chamada (ex.: 30m, -1 = sempre)
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    # Instruções fixas enviadas no campo `system` (vazio = padrão do RAGService)
+    ollama_system_prompt: str = os.getenv("OLLAMA_SYSTEM_PROMPT", "")
+    ollama_warmup: bool = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+    # Cascata de modelos (vírgula, do mais rápido ao maior): escala para o próximo
+    # quando o groundedness da resposta fica abaixo de CASCADE_THRESHOLD
+    cascade_models: str = os.getenv("CASCADE_MODELS", "")
+    cascade_threshold: float = float(os.getenv("CASCADE_THRESHOLD", "0.3"))
     
     # Embedding Model
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
@@ -15,12 +33,92 @@ class Settings(BaseSettings):
     chunk_size: int = int(os.getenv("CHUNK_SIZE", "500"))
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "50"))
     top_k: int = int(os.getenv("TOP_K", "5"))
+    max_context_docs: int = int(os.getenv("MAX_CONTEXT_DOCS", "3"))
+    
+    # Caches em memória do retrieval (0 desativa)
+    retrieval_cache_size: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    # Piso de score para chamar o LLM; vazio = valor calibrado para o EMBEDDING_MODEL
+    min_relevance_score: Optional[float] = float(os.getenv("MIN_RELEVANCE_SCORE")) if os.getenv("MIN_RELEVANCE_SCORE") else None
+    # Grava também uma collection por arquivo (buscas filtradas por `sources` não percorrem o corpus inteiro)
+    index_partition_by_source: bool = os.getenv("INDEX_PARTITION_BY_SOURCE", "false").lower() == "true"
+    # Busca vetorial: "chroma" (float32/HNSW) ou "int8" (quantizado + re-scoring exato)
+    vector_store: str = os.getenv("VECTOR_STORE", "chroma")
+    quantized_rescore_factor: int = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "4"))
+    # Diversidade do contexto: "mmr", "dedup" (só remove quase duplicados) ou "off"
+    diversity_mode: str = os.getenv("DIVERSITY_MODE", "mmr")
+    mmr_lambda: float = float(os.getenv("MMR_LAMBDA", "0.7"))
+    duplicate_threshold: float = float(os.getenv("DUPLICATE_THRESHOLD", "0.92"))
     rerank_enabled: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"
     
     # Application
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_dir: str = os.getenv("LOG_DIR", "/app/logs")
     data_path: str = os.getenv("DATA_PATH", "/app/data")
     chroma_db_path: str = os.getenv("CHROMA_DB_PATH", "/app/chroma_db")
+    cache_path: str = os.getenv("CACHE_PATH", "/app/cache")
+    
+    # Multi-worker: apenas um processo constrói o índice (lock + manifesto);
+    # com INDEX_ON_STARTUP=false os workers só aguardam o índice (somente leitura)
+    index_on_startup: bool = os.getenv("INDEX_ON_STARTUP", "true").lower() == "true"
+    index_wait_timeout: float = float(os.getenv("INDEX_WAIT_TIMEOUT", "600"))
+    # Carrega o modelo de embeddings no import (compartilhado via copy-on-write com gunicorn --preload)
+    preload_embedding_model: bool = os.getenv("PRELOAD_EMBEDDING_MODEL", "false").lower() == "true"
+    torch_num_threads: int = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    
+    # Cache do texto extraído dos PDFs (evita reprocessar com pypdf)
+    text_cache_enabled: bool = os.getenv("TEXT_CACHE_ENABLED", "true").lower() == "true"
+    
+    # Ingestão de documentos pela API (fila limitada com worker em background; upload/remoção exigem ADMIN_TOKEN)
+    ingestion_enabled: bool = os.getenv("INGESTION_ENABLED", "false").lower() == "true"
+    # Jobs de ingestão (SQLite compartilhado: o status é visível em todos os workers)
+    ingestion_db_path: str = os.getenv("INGESTION_DB_PATH", "/app/cache/ingestion.db")
+    ingestion_queue_size: int = int(os.getenv("INGESTION_QUEUE_SIZE", "16"))
+    max_upload_mb: float = float(os.getenv("MAX_UPLOAD_MB", "25"))
+    
+    # Health checks em background (endpoints respondem do estado em memória)
+    health_check_interval: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+    health_probe_timeout: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+    # Se true, /health/ready falha quando nenhuma réplica do Ollama responde
+    ready_requires_ollama: bool = os.getenv("READY_REQUIRES_OLLAMA", "false").lower() == "true"
+    
+    # Histórico persistente de requisições (SQLite WAL, gravado em background)
+    history_enabled: bool = os.getenv("HISTORY_ENABLED", "true").lower() == "true"
+    history_db_path: str = os.getenv("HISTORY_DB_PATH", "/app/cache/history.db")
+    history_queue_size: int = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+    
+    # Respostas pré-geradas para perguntas frequentes (regeneradas após reindexação; opt-in)
+    pregeneration_enabled: bool = os.getenv("PREGENERATION_ENABLED", "false").lower() == "true"
+    pregenerated_db_path: str = os.getenv("PREGENERATED_DB_PATH", "/app/cache/pregenerated.db")
+    
+    # Cache persistente de respostas (SQLite WAL compartilhado pelos workers do nó; sobrevive a restarts; opt-in)
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    answer_cache_db_path: str = os.getenv("ANSWER_CACHE_DB_PATH", "/app/cache/answers.db")
+    answer_cache_max_mb: float = float(os.getenv("ANSWER_CACHE_MAX_MB", "256"))
+    answer_cache_mmap_mb: float = float(os.getenv("ANSWER_CACHE_MMAP_MB", "64"))
+    
+    # Perguntas idênticas concorrentes compartilham a mesma execução do pipeline
+    single_flight_enabled: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    
+    # Rate limiting por cliente em /api/v1/ask: token bucket por classe. Sem X-API-Key
+    # a chave é o IP da conexão (atrás de proxy/load balancer, um único bucket para todos)
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+    rate_limit_rps: float = float(os.getenv("RATE_LIMIT_RPS", "1"))
+    rate_limit_burst: float = float(os.getenv("RATE_LIMIT_BURST", "10"))
+    bulk_rate_limit_rps: float = float(os.getenv("BULK_RATE_LIMIT_RPS", "2"))
+    bulk_rate_limit_burst: float = float(os.getenv("BULK_RATE_LIMIT_BURST", "20"))
+    # API keys com limites de bulk (vírgula); X-Priority: bulk de outros clientes só rebaixa a prioridade na fila
+    bulk_api_keys: str = os.getenv("BULK_API_KEYS", "")
+    # Fila justa (WFQ) na frente da geração: execuções simultâneas (0 = sem limite) e pesos
+    generation_concurrency: int = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+    interactive_weight: float = float(os.getenv("INTERACTIVE_WEIGHT", "4"))
+    bulk_weight: float = float(os.getenv("BULK_WEIGHT", "1"))
+    scheduler_max_queue: int = int(os.getenv("SCHEDULER_MAX_QUEUE", "64"))
+    
+    # Endpoints administrativos (/api/v1/admin/*, header X-Profile); vazio = desativados
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profile_max_seconds: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
     
     # Guardrails
     enable_guardrails: bool = os.getenv("ENABLE_GUARDRAILS", "true").lower() == "true"
@@ -30,8 +128,28 @@ class Settings(BaseSettings):
     prompt_token_cost: float = 0.0
     completion_token_cost: float = 0.0
     
+    @field_validator("min_relevance_score", mode="before")
+    @classmethod
+    def _empty_relevance_score(cls, value):
+        # MIN_RELEVANCE_SCORE= (vazio, como no .env) equivale a não definido
+        if isinstance(value, str) and not value.strip():
+            return None
+        return value
+    
     class Config:
         case_sensitive = False
 
 
 settings = Settings()
+
+
+def ollama_endpoints() -> list:
+    """Lista de réplicas do Ollama configuradas"""
+    urls = [url.strip() for url in settings.ollama_base_urls.split(",") if url.strip()]
+    return urls or [settings.ollama_base_url]
+
+
+def cascade_tiers() -> list:
+    """Modelos da cascata em ordem de tentativa (vazio = apenas OLLAMA_MODEL)"""
+    models = [model.strip() for model in settings.cascade_models.split(",") if model.strip()]
+    return models or [settings.ollama_model]
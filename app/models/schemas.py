@@ -1,14 +1,15 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 
 
 class Citation(BaseModel):
     """Citação de fonte do documento"""
     source: str = Field(..., description="Nome do arquivo fonte")
-    excerpt: str = Field(..., description="Trecho relevante do documento")
+    excerpt: Optional[str] = Field(None, description="Trecho relevante do documento (apenas com citation_detail=excerpts)")
     page: Optional[int] = Field(None, description="Número da página (se aplicável)")
     score: Optional[float] = Field(None, description="Score de relevância")
+    chunk_id: Optional[str] = Field(None, description="Identificador do chunk no índice")
 
 
 class Metrics(BaseModel):
@@ -16,13 +17,24 @@ class Metrics(BaseModel):
     total_latency_ms: float = Field(..., description="Latência total em milissegundos")
     retrieval_latency_ms: float = Field(..., description="Latência do retrieval em ms")
     llm_latency_ms: float = Field(..., description="Latência da geração LLM em ms")
-    prompt_tokens: int = Field(..., description="Número aproximado de tokens no prompt")
-    completion_tokens: int = Field(..., description="Número aproximado de tokens na resposta")
+    load_latency_ms: Optional[float] = Field(None, description="Tempo de carga do modelo no Ollama (load_duration) em ms")
+    prefill_latency_ms: Optional[float] = Field(None, description="Tempo de prefill do prompt no Ollama (prompt_eval_duration) em ms")
+    decode_latency_ms: Optional[float] = Field(None, description="Tempo de geração dos tokens no Ollama (eval_duration) em ms")
+    tokens_per_second: Optional[float] = Field(None, description="Velocidade de decode (eval_count / eval_duration)")
+    prompt_tokens: int = Field(..., description="Tokens no prompt (prompt_eval_count do Ollama; estimado se ausente)")
+    completion_tokens: int = Field(..., description="Tokens na resposta (eval_count do Ollama; estimado se ausente)")
     total_tokens: int = Field(..., description="Total de tokens utilizados")
     estimated_cost_usd: float = Field(..., description="Custo estimado em USD")
     top_k_used: int = Field(..., description="Quantidade de documentos recuperados")
     context_size: int = Field(..., description="Tamanho do contexto em caracteres")
     groundedness_score: Optional[float] = Field(None, description="Score de groundedness (0-1)")
+    llm_model: Optional[str] = Field(None, description="Modelo que gerou a resposta final")
+    cascade_escalated: Optional[bool] = Field(None, description="Se a cascata escalou para um modelo maior")
+    deduplicated: bool = Field(False, description="Se o resultado foi compartilhado com uma requisição idêntica em andamento")
+    duplicates_dropped: int = Field(0, description="Chunks quase duplicados removidos do contexto")
+    queue_wait_ms: Optional[float] = Field(None, description="Espera na fila de geração (None se o resultado foi compartilhado)")
+    pregenerated: bool = Field(False, description="Se a resposta veio do store de respostas pré-geradas")
+    answer_cached: bool = Field(False, description="Se a resposta veio do cache persistente de respostas")
     timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
 
 
@@ -30,6 +42,44 @@ class QuestionRequest(BaseModel):
     """Requisição de pergunta"""
     question: str = Field(..., description="Pergunta a ser respondida", min_length=1, max_length=500)
     top_k: Optional[int] = Field(5, description="Número de documentos a recuperar", ge=1, le=10)
+    citation_detail: Literal["none", "ids", "excerpts"] = Field(
+        "excerpts",
+        description="Nível de detalhe das citações: none (sem citações), ids (fonte/página/chunk) ou excerpts (com trecho)"
+    )
+    context_only: bool = Field(
+        False,
+        description="Se True, cita apenas os documentos efetivamente usados no prompt"
+    )
+    sources: Optional[List[str]] = Field(
+        None,
+        description="Restringe a busca a estes arquivos (ex.: 5Andar_contrato.pdf)",
+        min_length=1,
+        max_length=20
+    )
+    page_min: Optional[int] = Field(None, description="Primeira página considerada (inclusive)", ge=1)
+    page_max: Optional[int] = Field(None, description="Última página considerada (inclusive)", ge=1)
+    
+    @model_validator(mode="after")
+    def check_page_range(self):
+        if self.page_min is not None and self.page_max is not None and self.page_min > self.page_max:
+            raise ValueError("page_min deve ser menor ou igual a page_max")
+        return self
+    
+    def retrieval_filters(self) -> Dict[str, Any]:
+        """Filtros de metadados repassados ao retrieval"""
+        return {"sources": self.sources, "page_min": self.page_min, "page_max": self.page_max}
+
+
+class PregenerationQuestion(BaseModel):
+    """Pergunta a pré-gerar"""
+    question: str = Field(..., min_length=1, max_length=500)
+    top_k: int = Field(5, ge=1, le=10)
+
+
+class PregenerationRequest(BaseModel):
+    """Job de pré-geração de respostas"""
+    questions: List[PregenerationQuestion] = Field(..., min_length=1, max_length=1000)
+    force: bool = Field(False, description="Regenera perguntas já pré-geradas para a versão atual do índice")
 
 
 class QuestionResponse(BaseModel):
@@ -55,3 +105,4 @@ class HealthResponse(BaseModel):
     documents_indexed: int
     embedding_model: str
     timestamp: str
+    last_checked: Optional[str] = Field(None, description="Horário da última sonda do Ollama em background")
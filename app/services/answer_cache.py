@@ -0,0 +1,227 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+import structlog
+
+from app.utils.sqlite import ThreadLocalReaders, open_sqlite
+from app.utils.text import normalize_query
+
+logger = structlog.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_cache (
+    cache_key TEXT PRIMARY KEY,
+    index_version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_last_access ON answer_cache (last_access);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL
+);
+"""
+
+# Campos dos documentos guardados com a resposta (suficientes para citações e context_only)
+CACHED_DOCUMENT_FIELDS = ("text", "source", "page", "page_end", "chunk_id", "score")
+
+# Ao exceder o limite, remove até ficar nesta fração dele (evita evicção a cada escrita)
+EVICTION_TARGET = 0.9
+
+
+def answer_cache_key(
+    question: str,
+    top_k: int,
+    filters: Optional[Dict],
+    model: str,
+    prompt_hash: str,
+    index_version: str
+) -> str:
+    """
+    Chave do cache: pergunta normalizada, top_k, filtros de metadados,
+    modelo(s), hash do prompt (RAGService.prompt_fingerprint) e versão do índice
+    """
+    filters = filters or {}
+    sources = filters.get("sources")
+    parts = [
+        normalize_query(question),
+        top_k,
+        sorted(set(sources)) if sources else None,
+        filters.get("page_min"),
+        filters.get("page_max"),
+        model,
+        prompt_hash,
+        index_version
+    ]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Cache persistente de respostas geradas (SQLite em modo WAL, leituras via mmap)
+
+    O arquivo fica no disco local e é compartilhado por todos os workers do
+    nó: uma resposta gerada por um worker serve os demais, e o cache continua
+    quente após um restart/deploy (a versão do índice só muda se o corpus ou
+    a configuração de indexação mudar). Cada escrita é uma transação; o
+    tamanho total é limitado a `max_bytes`, removendo as entradas acessadas
+    há mais tempo. O total e o número de entradas ficam em `cache_meta`,
+    atualizada na mesma transação de cada escrita, evicção ou purge (sem
+    somar a tabela, cujos payloads ocupam páginas de overflow).
+
+    `get` usa uma conexão somente leitura por thread e não grava nada: o
+    last_access dos hits é acumulado em memória e aplicado na próxima
+    escrita. Ainda assim é I/O em disco; chame-o fora do event loop.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int, mmap_size: int = 0):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._conn = open_sqlite(db_path, mmap_size=mmap_size, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            # Arquivos criados antes de cache_meta: totais calculados uma única vez
+            self._conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (id, entries, total_bytes) "
+                "SELECT 0, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM answer_cache"
+            )
+        self._readers = ThreadLocalReaders(db_path, mmap_size=mmap_size)
+        self._lock = threading.Lock()
+        # Hits ainda não gravados em last_access (cache_key -> instante do acesso)
+        self._accessed: Dict[str, float] = {}
+        self._access_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Payload em cache (None se ausente)"""
+        row = self._readers.get().execute(
+            "SELECT payload FROM answer_cache WHERE cache_key = ?", (key,)
+        ).fetchone()
+        with self._access_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+        return json.loads(row["payload"])
+
+    def _flush_accesses(self) -> None:
+        """Grava o last_access dos hits acumulados (dentro da transação de escrita)"""
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+        if accessed:
+            self._conn.executemany(
+                "UPDATE answer_cache SET last_access = MAX(last_access, ?) WHERE cache_key = ?",
+                [(accessed_at, key) for key, accessed_at in accessed.items()]
+            )
+
+    def _adjust_totals(self, entries: int, size_bytes: int) -> None:
+        """Atualiza cache_meta (dentro da transação de escrita)"""
+        if entries or size_bytes:
+            self._conn.execute(
+                "UPDATE cache_meta SET entries = entries + ?, total_bytes = total_bytes + ? WHERE id = 0",
+                (entries, size_bytes)
+            )
+
+    def put(self, key: str, index_version: str, payload: Dict) -> None:
+        """Grava (ou substitui) uma resposta e aplica o limite de tamanho, na mesma transação"""
+        data = json.dumps(payload, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: reserva a escrita antes de ler o tamanho total, para
+            # que workers concorrentes não decidam a evicção sobre o mesmo estado
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._conn.execute(
+                    "SELECT size_bytes FROM answer_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answer_cache "
+                    "(cache_key, index_version, payload, size_bytes, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, index_version, data, size, now, now)
+                )
+                if previous is None:
+                    self._adjust_totals(1, size)
+                else:
+                    self._adjust_totals(0, size - previous["size_bytes"])
+                self._flush_accesses()
+                evicted = self._evict()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self.writes += 1
+            self.evictions += evicted
+        if evicted:
+            logger.info("Answer cache evicted entries", evicted=evicted, max_bytes=self.max_bytes)
+
+    def _evict(self) -> int:
+        """Remove as entradas menos acessadas até EVICTION_TARGET do limite (dentro da transação)"""
+        total = self._conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        excess = total - int(self.max_bytes * EVICTION_TARGET)
+        keys, removed_bytes = [], 0
+        for row in self._conn.execute("SELECT cache_key, size_bytes FROM answer_cache ORDER BY last_access"):
+            keys.append((row["cache_key"],))
+            removed_bytes += row["size_bytes"]
+            if removed_bytes >= excess:
+                break
+        self._conn.executemany("DELETE FROM answer_cache WHERE cache_key = ?", keys)
+        self._adjust_totals(-len(keys), -removed_bytes)
+        return len(keys)
+
+    def purge(self, keep_version: str) -> int:
+        """Remove as entradas de outras versões do índice"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed_bytes = self._conn.execute(
+                    "SELECT COALESCE(SUM(size_bytes), 0) FROM answer_cache WHERE index_version != ?",
+                    (keep_version,)
+                ).fetchone()[0]
+                removed = self._conn.execute(
+                    "DELETE FROM answer_cache WHERE index_version != ?", (keep_version,)
+                ).rowcount
+                self._adjust_totals(-removed, -removed_bytes)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        if removed:
+            logger.info("Answer cache purged", removed=removed, index_version=keep_version)
+        return removed
+
+    def get_stats(self) -> Dict:
+        """Estatísticas do arquivo (todos os workers) e contadores deste processo"""
+        row = self._readers.get().execute(
+            "SELECT entries, total_bytes AS size_bytes FROM cache_meta WHERE id = 0"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": row["entries"],
+            "size_bytes": row["size_bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions
+        }
+
+    def close(self) -> None:
+        self._readers.close()
+        with self._lock:
+            self._conn.close()
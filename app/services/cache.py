@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Cache LRU em memória, thread-safe, com contadores de uso
+
+    O tamanho em bytes é estimado por `sizer` (por entrada) apenas para
+    observabilidade; o limite é pelo número de entradas.
+    """
+
+    def __init__(self, max_entries: int, sizer: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.sizer = sizer
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor em cache (ou None) e atualiza a ordem LRU"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insere ou atualiza uma entrada, removendo as menos usadas se necessário"""
+        if not self.enabled:
+            return
+        size = self.sizer(value) if self.sizer else 0
+        with self._lock:
+            if key in self._data:
+                self.size_bytes -= self._sizes[key]
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._sizes[key] = size
+            self.size_bytes += size
+
+            while len(self._data) > self.max_entries:
+                old_key, _ = self._data.popitem(last=False)
+                self.size_bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.size_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """Retorna estatísticas do cache"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes
+        }
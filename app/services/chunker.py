@@ -0,0 +1,129 @@
+import re
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# Fronteira de sentença: pontuação final seguida de espaço
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+")
+
+
+class StreamingChunker:
+    """
+    Chunker por sentenças que atravessa fronteiras de página
+
+    Consome páginas ({text, page, source}) de forma incremental e produz
+    chunks de até `chunk_size` caracteres formados por sentenças inteiras.
+    Cláusulas que continuam na página seguinte ficam no mesmo chunk; a
+    proveniência é preservada em `page` (página onde o conteúdo novo do
+    chunk começa) e `page_end` (última página coberta).
+    """
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap deve ser menor que chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _split_long(self, text: str) -> Iterator[str]:
+        """Quebra sentenças maiores que chunk_size em fronteiras de palavra"""
+        current: List[str] = []
+        current_len = 0
+        for word in text.split(" "):
+            # Palavras gigantes (ex.: hashes, URLs) são cortadas por caractere
+            while len(word) > self.chunk_size:
+                if current:
+                    yield " ".join(current)
+                    current, current_len = [], 0
+                yield word[:self.chunk_size]
+                word = word[self.chunk_size:]
+            added = len(word) + (1 if current else 0)
+            if current and current_len + added > self.chunk_size:
+                yield " ".join(current)
+                current, current_len = [], 0
+                added = len(word)
+            current.append(word)
+            current_len += added
+        if current:
+            yield " ".join(current)
+
+    def _segments(self, pages: Iterable[Dict]) -> Iterator[Tuple[str, int]]:
+        """Gera (sentença, página) com espaços normalizados"""
+        for page_data in pages:
+            # pypdf insere quebras de linha no meio das frases; normalizar
+            text = " ".join(page_data["text"].split())
+            for sentence in SENTENCE_BOUNDARY.split(text):
+                if not sentence:
+                    continue
+                if len(sentence) > self.chunk_size:
+                    for piece in self._split_long(sentence):
+                        yield piece, page_data["page"]
+                else:
+                    yield sentence, page_data["page"]
+
+    def _overlap_tail(self, text: str, page: int) -> List[Tuple[str, int]]:
+        """Últimos `chunk_overlap` caracteres do chunk, alinhados em palavra"""
+        if self.chunk_overlap <= 0 or len(text) <= self.chunk_overlap:
+            return []
+        tail = text[-self.chunk_overlap:]
+        space = tail.find(" ")
+        if space == -1:
+            return []
+        tail = tail[space + 1:]
+        return [(tail, page)] if tail else []
+
+    def _chunk_source(self, source: str, pages: Iterable[Dict]) -> Iterator[Dict]:
+        """Gera os chunks de um único documento"""
+        buffer: List[Tuple[str, int]] = []
+        buffer_len = 0
+        new_segments = 0
+        first_new_page = None
+        index = 0
+
+        for segment, page in self._segments(pages):
+            added = len(segment) + (1 if buffer else 0)
+
+            if new_segments and buffer_len + added > self.chunk_size:
+                text = " ".join(s for s, _ in buffer)
+                yield {
+                    "text": text,
+                    "source": source,
+                    "page": first_new_page,
+                    "page_end": buffer[-1][1],
+                    "chunk_id": f"{source}_p{first_new_page}_c{index}"
+                }
+                index += 1
+
+                buffer = self._overlap_tail(text, buffer[-1][1])
+                buffer_len = len(buffer[0][0]) if buffer else 0
+                new_segments = 0
+                added = len(segment) + (1 if buffer else 0)
+                if buffer_len + added > self.chunk_size:
+                    buffer, buffer_len = [], 0
+                    added = len(segment)
+
+            if not new_segments:
+                first_new_page = page
+            buffer.append((segment, page))
+            buffer_len += added
+            new_segments += 1
+
+        if new_segments:
+            yield {
+                "text": " ".join(s for s, _ in buffer),
+                "source": source,
+                "page": first_new_page,
+                "page_end": buffer[-1][1],
+                "chunk_id": f"{source}_p{first_new_page}_c{index}"
+            }
+
+    def chunk_pages(self, pages: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Divide páginas em chunks de forma incremental
+
+        As páginas devem chegar agrupadas por documento e em ordem; chunks
+        nunca atravessam documentos diferentes.
+        """
+        for source, source_pages in groupby(pages, key=lambda p: p["source"]):
+            yield from self._chunk_source(source, source_pages)
@@ -0,0 +1,34 @@
+from typing import List
+from app.models.schemas import Citation
+
+# Tamanho máximo do trecho retornado em cada citação
+EXCERPT_MAX_CHARS = 300
+
+
+def build_citations(documents: List[dict], detail: str = "excerpts") -> List[Citation]:
+    """
+    Monta as citações da resposta conforme o nível de detalhe solicitado
+
+    Args:
+        documents: Documentos recuperados (formato de RAGService.retrieve_documents)
+        detail: none (sem citações), ids (sem trecho) ou excerpts (com trecho)
+    """
+    if detail == "none":
+        return []
+
+    citations = []
+    for doc in documents:
+        excerpt = None
+        if detail == "excerpts":
+            text = doc["text"]
+            excerpt = text[:EXCERPT_MAX_CHARS] + "..." if len(text) > EXCERPT_MAX_CHARS else text
+
+        citations.append(Citation(
+            source=doc["source"],
+            excerpt=excerpt,
+            page=doc["page"],
+            score=round(doc["score"], 4),
+            chunk_id=doc.get("chunk_id")
+        ))
+
+    return citations
@@ -0,0 +1,55 @@
+from typing import List, Tuple
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def diversify(
+    query_embedding: np.ndarray,
+    documents: List[dict],
+    mode: str = "mmr",
+    mmr_lambda: float = 0.7,
+    duplicate_threshold: float = 0.92
+) -> Tuple[List[dict], int]:
+    """
+    Remove chunks quase duplicados e (modo mmr) reordena por Maximal Marginal Relevance
+
+    Usa o campo `embedding` de cada documento (vetor do chunk no índice).
+    - dedup: mantém a ordem de relevância e descarta chunks com cosseno >=
+      `duplicate_threshold` em relação a um chunk já mantido
+    - mmr: além do descarte, escolhe a cada passo o chunk que maximiza
+      λ·sim(query, d) − (1 − λ)·max sim(d, já escolhidos)
+
+    Returns:
+        Tuple[List[dict], int]: (documentos mantidos, quantidade descartada)
+    """
+    if mode == "off" or len(documents) < 2 or any(doc.get("embedding") is None for doc in documents):
+        return documents, 0
+
+    vectors = _normalize(np.asarray([doc["embedding"] for doc in documents], dtype=np.float32))
+    similarity = vectors @ vectors.T
+    relevance = vectors @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+    selected: List[int] = []
+    remaining = list(range(len(documents)))  # já em ordem de relevância
+    dropped = 0
+
+    while remaining:
+        if mode == "mmr" and selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            marginal = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(marginal))]
+        else:
+            best = remaining[0]
+        remaining.remove(best)
+
+        if selected and similarity[best, selected].max() >= duplicate_threshold:
+            dropped += 1
+            continue
+        selected.append(best)
+
+    return [documents[i] for i in selected], dropped
@@ -1,6 +1,7 @@
 import re
 from typing import Tuple, Optional, List
 from app.models.schemas import GuardrailViolation
+from app.services.redaction import RedactionEngine
 import structlog
 
 logger = structlog.get_logger()
@@ -27,14 +28,6 @@ class GuardrailService:
         r"new\s*[^\w]*\s*instructions?",
     ]
     
-    # Padrões de dados sensíveis
-    SENSITIVE_PATTERNS = [
-        r"\b\d{3}[\.\-]?\d{3}[\.\-]?\d{3}[\.\-]?\d{2}\b",  # CPF
-        r"\b\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b",  # CNPJ
-        r"\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b",  # Cartão de crédito
-        r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",  # Email (menos restritivo)
-    ]
-    
     # Palavras-chave de domínio inválido
     OUT_OF_DOMAIN_KEYWORDS = [
         "cpf", "rg", "senha", "password", "cartão de crédito", "credit card",
@@ -59,6 +52,8 @@ class GuardrailService:
     def __init__(self, max_query_length: int = 500, enable_llm_guardrail: bool = False):
         self.max_query_length = max_query_length
         self.enable_llm_guardrail = enable_llm_guardrail
+        # Padrões de dados sensíveis (CPF, CNPJ, cartão, email): usados na query e na resposta
+        self.redactor = RedactionEngine()
     
     def validate_query(self, query: str) -> Tuple[bool, Optional[GuardrailViolation]]:
         """
@@ -98,14 +93,13 @@ class GuardrailService:
                 )
         
         # 4. Verificar padrões de dados sensíveis na query
-        for pattern in self.SENSITIVE_PATTERNS:
-            if re.search(pattern, query):
-                return False, GuardrailViolation(
-                    blocked=True,
-                    reason="Sensitive data pattern detected in query",
-                    policy="DATA_PROTECTION_POLICY",
-                    message="Sua pergunta contém padrões de dados sensíveis. Por favor, remova informações pessoais da pergunta."
-                )
+        if self.redactor.contains(query):
+            return False, GuardrailViolation(
+                blocked=True,
+                reason="Sensitive data pattern detected in query",
+                policy="DATA_PROTECTION_POLICY",
+                message="Sua pergunta contém padrões de dados sensíveis. Por favor, remova informações pessoais da pergunta."
+            )
         
         # 5. Verificar conteúdo inadequado (com contexto)
         for keyword, (suspicious_context, severity) in self.INAPPROPRIATE_CONTENT.items():
@@ -144,37 +138,59 @@ class GuardrailService:
             preserve_context_data: Se True, preserva dados que vieram dos documentos fonte
         """
         if not preserve_context_data:
-            # Modo agressivo - remove todos os padrões
-            response = re.sub(
-                r"\b\d{3}[\.\-]?\d{3}[\.\-]?\d{3}[\.\-]?\d{2}\b",
-                "[CPF REMOVIDO]",
-                response
-            )
-            
-            response = re.sub(
-                r"\b\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b",
-                "[CNPJ REMOVIDO]",
-                response
+            # Modo agressivo - remove todos os padrões (uma única passada)
+            response, counts = self.redactor.redact(response)
+        else:
+            # Modo contextual - apenas registra as ocorrências
+            counts = self.redactor.count(response)
+        
+        if counts:
+            logger.warning(
+                "Sensitive data in response",
+                redacted=not preserve_context_data,
+                **{f"{kind}_count": count for kind, count in counts.items()}
             )
+        
+        return response
+    
+    def review_answer(
+        self,
+        answer: str,
+        documents: List[dict],
+        question: str = "",
+        groundedness_score: Optional[float] = None,
+        threshold: float = 0.3
+    ) -> Tuple[str, Optional[float]]:
+        """
+        Pós-processamento da resposta gerada: groundedness + sanitização
+        
+        Respostas pouco baseadas nos documentos não são bloqueadas, apenas
+        recebem um aviso no início.
+        
+        Args:
+            groundedness_score: Score já calculado (ex.: pela cascata de modelos)
             
-            response = re.sub(
-                r"\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b",
-                "[CARTÃO REMOVIDO]",
-                response
-            )
-        else:
-            # Modo contextual - apenas marca com aviso
-            cpf_count = len(re.findall(r"\b\d{3}[\.\-]?\d{3}[\.\-]?\d{3}[\.\-]?\d{2}\b", response))
-            cnpj_count = len(re.findall(r"\b\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b", response))
+        Returns:
+            Tuple[str, Optional[float]]: (resposta final, groundedness_score ou None sem documentos)
+        """
+        if documents:
+            if groundedness_score is None:
+                is_grounded, groundedness_score = self.validate_response_groundedness(
+                    answer, documents, threshold=threshold
+                )
+            else:
+                is_grounded = groundedness_score >= threshold
             
-            if cpf_count > 0 or cnpj_count > 0:
+            if not is_grounded:
                 logger.warning(
-                    "Sensitive data in response",
-                    cpf_count=cpf_count,
-                    cnpj_count=cnpj_count
+                    "Low groundedness detected",
+                    score=groundedness_score,
+                    question=question[:50]
                 )
+                answer = f"[AVISO: Resposta pode não estar totalmente baseada nos documentos]\n\n{answer}"
         
-        return response
+        # Modo contextual: preserva dados que vieram dos documentos
+        return self.sanitize_response(answer, preserve_context_data=True), groundedness_score
     
     def validate_response_groundedness(
         self,
@@ -233,18 +249,3 @@ class GuardrailService:
         )
         
         return is_grounded, overlap_score
-        # Substituir CNPJs
-        response = re.sub(
-            r"\b\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b",
-            "[CNPJ REMOVIDO]",
-            response
-        )
-        
-        # Substituir números de cartão
-        response = re.sub(
-            r"\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b",
-            "[CARTÃO REMOVIDO]",
-            response
-        )
-        
-        return response
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+
+class HealthMonitor:
+    """
+    Verificação periódica de dependências em background
+
+    Sonda o Ollama e o vector store a cada `interval` segundos (fora do event
+    loop) e guarda o último resultado com timestamp; os endpoints de health
+    respondem apenas a partir desse estado em memória.
+    """
+
+    def __init__(
+        self,
+        ollama_probe: Callable[[], Dict[str, bool]],
+        vector_store_probe: Callable[[], int],
+        interval: float = 10.0,
+        stale_after: Optional[float] = None,
+        require_ollama: bool = False
+    ):
+        self.ollama_probe = ollama_probe
+        self.vector_store_probe = vector_store_probe
+        self.interval = interval
+        # Resultado mais antigo que isto não conta para readiness
+        self.stale_after = stale_after or interval * 3
+        self.require_ollama = require_ollama
+        self.ollama: Dict = {"healthy": False, "replicas": {}, "checked_at": None, "latency_ms": None, "error": None}
+        self.vector_store: Dict = {"healthy": False, "documents_indexed": 0, "checked_at": None, "latency_ms": None, "error": None}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self, name: str, fn: Callable, parse: Callable[[object], Dict]) -> Dict:
+        start_time = time.time()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, fn)
+            state = {**parse(result), "error": None}
+        except Exception as e:
+            logger.error("Health probe failed", dependency=name, error=str(e))
+            state = {"healthy": False, "error": str(e)}
+        state["checked_at"] = time.time()
+        state["latency_ms"] = (state["checked_at"] - start_time) * 1000
+        return state
+
+    async def check_once(self) -> None:
+        """Executa as sondas em paralelo e atualiza o estado em memória"""
+        ollama, vector_store = await asyncio.gather(
+            self._probe(
+                "ollama",
+                self.ollama_probe,
+                lambda replicas: {"healthy": any(replicas.values()), "replicas": replicas}
+            ),
+            self._probe(
+                "vector_store",
+                self.vector_store_probe,
+                lambda count: {"healthy": True, "documents_indexed": count}
+            )
+        )
+
+        if self.ollama["healthy"] != ollama["healthy"] and self.ollama["checked_at"] is not None:
+            logger.warning("Ollama health changed", healthy=ollama["healthy"], replicas=ollama.get("replicas"))
+        self.ollama = {**self.ollama, **ollama}
+        self.vector_store = {**self.vector_store, **vector_store}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error("Health monitor iteration failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _fresh(self, state: Dict) -> bool:
+        return state["checked_at"] is not None and time.time() - state["checked_at"] <= self.stale_after
+
+    def is_ready(self) -> bool:
+        """Pronto para tráfego: índice acessível (e Ollama, se exigido) em uma sonda recente"""
+        ready = self.vector_store["healthy"] and self._fresh(self.vector_store)
+        if self.require_ollama:
+            ready = ready and self.ollama["healthy"] and self._fresh(self.ollama)
+        return ready
+
+    @staticmethod
+    def _public(state: Dict) -> Dict:
+        checked_at = state["checked_at"]
+        return {
+            **state,
+            "checked_at": datetime.utcfromtimestamp(checked_at).isoformat() if checked_at else None
+        }
+
+    def snapshot(self) -> Dict:
+        return {
+            "ready": self.is_ready(),
+            "ollama": self._public(self.ollama),
+            "vector_store": self._public(self.vector_store)
+        }
@@ -0,0 +1,171 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import structlog
+
+from app.utils.sqlite import open_sqlite
+
+logger = structlog.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    blocked INTEGER NOT NULL,
+    blocked_reason TEXT,
+    total_latency_ms REAL,
+    llm_latency_ms REAL,
+    total_tokens INTEGER,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_request_history_ts ON request_history (ts);
+CREATE INDEX IF NOT EXISTS idx_request_history_blocked_reason ON request_history (blocked_reason, ts);
+"""
+
+_STOP = object()
+
+
+def _timestamp_to_epoch(value: str) -> float:
+    """Converte o timestamp ISO (UTC, sem timezone) do registro em epoch"""
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class RequestHistoryStore:
+    """
+    Histórico persistente de requisições (SQLite em modo WAL, append-only)
+
+    `submit` apenas enfileira o registro (fila limitada, sem I/O no caminho da
+    requisição); uma thread em background grava em lotes. Se a fila estiver
+    cheia o registro é descartado e contabilizado em `dropped`.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        conn = open_sqlite(db_path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Dict) -> None:
+        """Enfileira um registro para gravação (não bloqueia)"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        conn = open_sqlite(self.db_path)
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if batch:
+                try:
+                    self._write_batch(conn, batch)
+                except Exception as e:
+                    logger.error("Failed to write request history", error=str(e), records=len(batch))
+        conn.close()
+
+    def _write_batch(self, conn, batch: List[Dict]) -> None:
+        rows = [
+            (
+                _timestamp_to_epoch(record["timestamp"]),
+                int(record.get("blocked", False)),
+                record.get("blocked_reason"),
+                record.get("total_latency_ms"),
+                record.get("llm_latency_ms"),
+                record.get("total_tokens"),
+                json.dumps(record, ensure_ascii=False)
+            )
+            for record in batch
+        ]
+        with conn:
+            conn.executemany(
+                "INSERT INTO request_history "
+                "(ts, blocked, blocked_reason, total_latency_ms, llm_latency_ms, total_tokens, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self.written += len(rows)
+        self.batches += 1
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        blocked: Optional[bool] = None,
+        blocked_reason: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Consulta o histórico por intervalo de tempo e motivo de bloqueio (mais recentes primeiro)"""
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("ts >= ?")
+            params.append(start.replace(tzinfo=start.tzinfo or timezone.utc).timestamp())
+        if end is not None:
+            conditions.append("ts < ?")
+            params.append(end.replace(tzinfo=end.tzinfo or timezone.utc).timestamp())
+        if blocked is not None:
+            conditions.append("blocked = ?")
+            params.append(int(blocked))
+        if blocked_reason is not None:
+            conditions.append("blocked_reason = ?")
+            params.append(blocked_reason)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = open_sqlite(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT record FROM request_history {where} ORDER BY ts DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row["record"]) for row in rows]
+
+    def get_stats(self) -> Dict:
+        return {
+            "db_path": self.db_path,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Grava o que ainda está na fila e encerra a thread"""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("History queue full on shutdown", queued=self._queue.qsize())
+            return
+        self._thread.join(timeout)
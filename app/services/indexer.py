@@ -1,17 +1,35 @@
 import os
+import json
 import time
-from typing import List, Dict
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator
 from pathlib import Path
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
 from pypdf import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import structlog
 
+from app.services.chunker import StreamingChunker
+from app.services.text_cache import PageTextCache, file_sha256
+from app.services.vector_store import QuantizedVectorStore
+
 logger = structlog.get_logger()
 
 
+def load_embedding_model(model_name: str, num_threads: Optional[int] = None) -> SentenceTransformer:
+    """Carrega o modelo de embeddings, limitando threads do torch se solicitado"""
+    if num_threads:
+        # Evita oversubscription de CPU com vários workers na mesma máquina
+        import torch
+        torch.set_num_threads(num_threads)
+    
+    logger.info("Loading embedding model", model=model_name)
+    return SentenceTransformer(model_name)
+
+
 class DocumentIndexer:
     """Serviço responsável pela ingestão e indexação de documentos"""
     
@@ -21,16 +39,31 @@ class DocumentIndexer:
         chroma_db_path: str,
         embedding_model_name: str,
         chunk_size: int = 500,
-        chunk_overlap: int = 50
+        chunk_overlap: int = 50,
+        text_cache: Optional[PageTextCache] = None,
+        embedding_batch_size: int = 64,
+        embedding_model: Optional[SentenceTransformer] = None,
+        partition_by_source: bool = False,
+        vector_store: str = "chroma"
     ):
         self.data_path = Path(data_path)
         self.chroma_db_path = chroma_db_path
+        self.embedding_model_name = embedding_model_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.text_cache = text_cache
+        self.embedding_batch_size = embedding_batch_size
+        # Partições: cada chunk também é gravado em uma collection do seu arquivo,
+        # para que buscas filtradas por fonte não percorram o corpus inteiro
+        self.partition_by_source = partition_by_source
+        # "int8": além do Chroma, exporta um QuantizedVectorStore usado nas buscas
+        self.vector_store = vector_store
+        self.chunker = StreamingChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         
-        # Inicializar modelo de embeddings
-        logger.info("Loading embedding model", model=embedding_model_name)
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+        # Inicializar modelo de embeddings (ou reutilizar um já carregado)
+        if embedding_model is None:
+            embedding_model = load_embedding_model(embedding_model_name)
+        self.embedding_model = embedding_model
         
         # Inicializar ChromaDB
         self.chroma_client = chromadb.PersistentClient(
@@ -41,8 +74,24 @@ class DocumentIndexer:
         # Collection name
         self.collection_name = "documents"
         
+        # Manifesto do índice construído (fingerprint do corpus + configuração)
+        self.manifest_path = Path(chroma_db_path) / "index_manifest.json"
+        self.lock_path = Path(chroma_db_path) / ".index.lock"
+        self.quantized_path = Path(chroma_db_path) / "quantized"
+        
     def _extract_text_from_pdf(self, pdf_path: Path) -> List[Dict[str, str]]:
-        """Extrai texto de um PDF página por página"""
+        """Extrai texto de um PDF página por página (usando o cache quando disponível)"""
+        file_hash = None
+        if self.text_cache:
+            file_hash = file_sha256(pdf_path)
+            cached_pages = self.text_cache.get(file_hash)
+            if cached_pages is not None:
+                logger.info("PDF text loaded from cache", file=pdf_path.name, pages=len(cached_pages))
+                return [
+                    {"text": page["text"], "page": page["page"], "source": pdf_path.name}
+                    for page in cached_pages
+                ]
+        
         logger.info("Extracting text from PDF", file=pdf_path.name)
         
         reader = PdfReader(str(pdf_path))
@@ -57,103 +106,346 @@ class DocumentIndexer:
                     "source": pdf_path.name
                 })
         
+        if self.text_cache:
+            self.text_cache.put(file_hash, pages)
+        
         logger.info("PDF extraction complete", file=pdf_path.name, pages=len(pages))
         return pages
     
     def _chunk_documents(self, pages: List[Dict[str, str]]) -> List[Dict[str, any]]:
         """Divide documentos em chunks com overlap"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        
-        chunks = []
-        for page_data in pages:
-            page_chunks = text_splitter.split_text(page_data["text"])
-            
-            for i, chunk_text in enumerate(page_chunks):
-                chunks.append({
-                    "text": chunk_text,
-                    "source": page_data["source"],
-                    "page": page_data["page"],
-                    "chunk_id": f"{page_data['source']}_p{page_data['page']}_c{i}"
-                })
-        
-        return chunks
+        return list(self.chunker.chunk_pages(pages))
+    
+    def _iter_chunks(self, pdf_files: List[Path]) -> Iterator[Dict[str, any]]:
+        """Gera chunks de todos os PDFs sem materializar o corpus inteiro"""
+        for pdf_file in pdf_files:
+            yield from self.chunker.chunk_pages(self._extract_text_from_pdf(pdf_file))
     
     def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Gera embeddings para os textos"""
         logger.info("Generating embeddings", count=len(texts))
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=True)
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=self.embedding_batch_size,
+            show_progress_bar=False
+        )
         return embeddings.tolist()
     
+    def partition_name(self, source: str) -> str:
+        """Nome da collection de partição de um arquivo (nomes do Chroma são restritos)"""
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return f"{self.collection_name}_src_{digest}"
+    
+    def _delete_partitions(self) -> None:
+        prefix = f"{self.collection_name}_src_"
+        for collection in self.chroma_client.list_collections():
+            if collection.name.startswith(prefix):
+                self.chroma_client.delete_collection(collection.name)
+    
+    def _add_batch(
+        self,
+        collection,
+        chunks: List[Dict[str, any]],
+        partitions: Optional[Dict[str, any]] = None
+    ) -> None:
+        """Gera embeddings de um lote de chunks e adiciona à collection (e às partições)"""
+        texts = [chunk["text"] for chunk in chunks]
+        embeddings = self._create_embeddings(texts)
+        
+        metadatas = [
+            {
+                "source": chunk["source"],
+                "page": chunk["page"],
+                "page_end": chunk["page_end"],
+                "chunk_id": chunk["chunk_id"]
+            }
+            for chunk in chunks
+        ]
+        
+        ids = [chunk["chunk_id"] for chunk in chunks]
+        collection.add(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+        
+        if partitions is None:
+            return
+        
+        # Mesmos embeddings, agrupados por arquivo
+        by_source: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            by_source.setdefault(chunk["source"], []).append(i)
+        for source, positions in by_source.items():
+            if source not in partitions:
+                partitions[source] = self.chroma_client.create_collection(
+                    name=self.partition_name(source),
+                    metadata={"hnsw:space": "cosine", "source": source}
+                )
+            partitions[source].add(
+                embeddings=[embeddings[i] for i in positions],
+                documents=[texts[i] for i in positions],
+                metadatas=[metadatas[i] for i in positions],
+                ids=[ids[i] for i in positions]
+            )
+    
     def index_documents(self) -> int:
         """Indexa todos os documentos PDF da pasta data"""
         start_time = time.time()
         
         # Listar PDFs
-        pdf_files = list(self.data_path.glob("*.pdf"))
+        pdf_files = self._list_pdfs()
         if not pdf_files:
             logger.warning("No PDF files found", path=str(self.data_path))
             return 0
         
         logger.info("Found PDF files", count=len(pdf_files), files=[f.name for f in pdf_files])
         
-        # Extrair e processar todos os documentos
-        all_chunks = []
-        for pdf_file in pdf_files:
-            pages = self._extract_text_from_pdf(pdf_file)
-            chunks = self._chunk_documents(pages)
-            all_chunks.extend(chunks)
-        
-        logger.info("Total chunks created", count=len(all_chunks))
-        
         # Criar ou obter collection
         try:
             self.chroma_client.delete_collection(self.collection_name)
             logger.info("Deleted existing collection")
         except Exception:
             pass
+        self._delete_partitions()
         
         collection = self.chroma_client.create_collection(
             name=self.collection_name,
             metadata={"hnsw:space": "cosine"}
         )
+        partitions = {} if self.partition_by_source else None
         
-        # Gerar embeddings
-        texts = [chunk["text"] for chunk in all_chunks]
-        embeddings = self._create_embeddings(texts)
+        # Extrair, dividir e indexar em lotes (streaming)
+        total_chunks = 0
+        batch = []
+        for chunk in self._iter_chunks(pdf_files):
+            batch.append(chunk)
+            if len(batch) >= self.embedding_batch_size:
+                self._add_batch(collection, batch, partitions)
+                total_chunks += len(batch)
+                batch = []
         
-        # Preparar metadados
-        metadatas = [
-            {
-                "source": chunk["source"],
-                "page": chunk["page"],
-                "chunk_id": chunk["chunk_id"]
-            }
-            for chunk in all_chunks
-        ]
-        
-        ids = [chunk["chunk_id"] for chunk in all_chunks]
-        
-        # Adicionar à collection
-        collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        if batch:
+            self._add_batch(collection, batch, partitions)
+            total_chunks += len(batch)
         
         elapsed_time = time.time() - start_time
         logger.info(
             "Indexing complete",
-            chunks=len(all_chunks),
+            chunks=total_chunks,
+            partitions=len(partitions) if partitions is not None else 0,
             elapsed_seconds=elapsed_time
         )
         
-        return len(all_chunks)
+        return total_chunks
+    
+    def _list_pdfs(self) -> List[Path]:
+        return sorted(self.data_path.glob("*.pdf"))
+    
+    def document_hashes(self) -> Dict[str, str]:
+        """Hash do conteúdo de cada PDF em data_path ({arquivo: sha256})"""
+        return {pdf_file.name: file_sha256(pdf_file) for pdf_file in self._list_pdfs()}
+    
+    def compute_fingerprint(self, document_hashes: Optional[Dict[str, str]] = None) -> str:
+        """Fingerprint do corpus e da configuração que determinam o conteúdo do índice"""
+        if document_hashes is None:
+            document_hashes = self.document_hashes()
+        digest = hashlib.sha256()
+        config = {
+            "embedding_model": self.embedding_model_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunker": type(self.chunker).__name__,
+            "partition_by_source": self.partition_by_source
+        }
+        digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+        for name in sorted(document_hashes):
+            digest.update(name.encode("utf-8"))
+            digest.update(document_hashes[name].encode("utf-8"))
+        return digest.hexdigest()
+    
+    def export_quantized_store(self) -> None:
+        """Exporta os vetores da collection para o QuantizedVectorStore (versão = index_version)"""
+        collection = self.get_collection()
+        if collection is None:
+            return
+        
+        # Os textos ficam só no Chroma (o store guarda vetores, ids e metadados de filtro)
+        ids, embeddings, metadatas = [], [], []
+        total = collection.count()
+        page_size = 1000
+        for offset in range(0, total, page_size):
+            page = collection.get(
+                include=["embeddings", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+            metadatas.extend(page["metadatas"])
+        
+        QuantizedVectorStore.build(
+            str(self.quantized_path),
+            ids,
+            embeddings,
+            metadatas,
+            version=self.index_version
+        )
+    
+    def _sync_quantized_store(self, force: bool = False) -> None:
+        if self.vector_store != "int8":
+            return
+        if force or QuantizedVectorStore(str(self.quantized_path)).read_version() != self.index_version:
+            self.export_quantized_store()
+    
+    def read_manifest(self) -> Optional[Dict]:
+        """Lê o manifesto do último índice construído (None se inexistente)"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def _write_manifest(self, chunks: int, document_hashes: Optional[Dict[str, str]] = None) -> None:
+        if document_hashes is None:
+            document_hashes = self.document_hashes()
+        manifest = {
+            "fingerprint": self.compute_fingerprint(document_hashes),
+            "chunks": chunks,
+            "documents": document_hashes,
+            "built_at": time.time()
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+    
+    @property
+    def index_version(self) -> Optional[str]:
+        """Versão do índice atual (fingerprint do manifesto)"""
+        manifest = self.read_manifest()
+        return manifest["fingerprint"] if manifest else None
+    
+    @contextmanager
+    def _index_lock(self):
+        """Lock exclusivo entre processos para construção do índice"""
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def ensure_index(self, force: bool = False) -> int:
+        """
+        Garante que o índice está atualizado, reconstruindo apenas se necessário
+        
+        Seguro com múltiplos processos: o primeiro a obter o lock constrói o
+        índice; os demais aguardam e, ao encontrar o manifesto atualizado,
+        apenas reutilizam a collection existente.
+        """
+        with self._index_lock():
+            document_hashes = self.document_hashes()
+            fingerprint = self.compute_fingerprint(document_hashes)
+            manifest = self.read_manifest()
+            
+            if not force and manifest and manifest.get("fingerprint") == fingerprint \
+                    and self.get_collection() is not None:
+                logger.info("Index is up to date, skipping indexation", chunks=manifest.get("chunks"))
+                if "documents" not in manifest:
+                    # Manifesto anterior à ingestão pela API: registrar os hashes por arquivo
+                    self._write_manifest(manifest.get("chunks", 0), document_hashes)
+                self._sync_quantized_store()
+                return manifest.get("chunks", 0)
+            
+            chunks = self.index_documents()
+            self._write_manifest(chunks, document_hashes)
+            self._sync_quantized_store(force=True)
+            return chunks
+    
+    def wait_for_index(self, timeout: float = 600.0, poll_interval: float = 2.0) -> None:
+        """Aguarda (somente leitura) até que outro processo publique o índice"""
+        deadline = time.time() + timeout
+        while self.read_manifest() is None or self.get_collection() is None:
+            if time.time() > deadline:
+                raise TimeoutError(f"Index not available after {timeout}s")
+            logger.info("Waiting for index to be built", path=self.chroma_db_path)
+            time.sleep(poll_interval)
+    
+    def _get_or_create_collection(self):
+        return self.chroma_client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+    
+    def _remove_source(self, collection, source: str) -> None:
+        """Remove os chunks de um arquivo da collection e a partição dele"""
+        collection.delete(where={"source": source})
+        if self.partition_by_source:
+            try:
+                self.chroma_client.delete_collection(self.partition_name(source))
+            except Exception:
+                pass
+    
+    def upsert_document(self, source: str, content: bytes) -> int:
+        """
+        Grava (ou substitui) um PDF em data_path e reindexa apenas esse arquivo
+        
+        Os chunks antigos do arquivo são removidos antes; os demais documentos
+        não são reprocessados. O manifesto é atualizado (nova index_version).
+        
+        Returns:
+            int: chunks indexados do arquivo
+        """
+        pdf_path = self.data_path / source
+        
+        with self._index_lock():
+            tmp_path = pdf_path.with_suffix(".pdf.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, pdf_path)
+            
+            collection = self._get_or_create_collection()
+            self._remove_source(collection, source)
+            partitions = {} if self.partition_by_source else None
+            
+            chunks = 0
+            batch = []
+            for chunk in self.chunker.chunk_pages(self._extract_text_from_pdf(pdf_path)):
+                batch.append(chunk)
+                if len(batch) >= self.embedding_batch_size:
+                    self._add_batch(collection, batch, partitions)
+                    chunks += len(batch)
+                    batch = []
+            if batch:
+                self._add_batch(collection, batch, partitions)
+                chunks += len(batch)
+            
+            self._write_manifest(collection.count())
+            self._sync_quantized_store(force=True)
+        
+        logger.info("Document upserted", source=source, chunks=chunks)
+        return chunks
+    
+    def delete_document(self, source: str) -> bool:
+        """Remove um PDF de data_path e seus chunks do índice (False se não existia)"""
+        pdf_path = self.data_path / source
+        
+        with self._index_lock():
+            existed = pdf_path.exists()
+            if existed:
+                pdf_path.unlink()
+            
+            collection = self.get_collection()
+            if collection is not None:
+                self._remove_source(collection, source)
+                self._write_manifest(collection.count())
+                self._sync_quantized_store(force=True)
+        
+        logger.info("Document deleted", source=source, existed=existed)
+        return existed
     
     def get_collection(self):
         """Retorna a collection do ChromaDB"""
@@ -162,6 +454,15 @@ class DocumentIndexer:
         except Exception:
             return None
     
+    def get_partition(self, source: str):
+        """Retorna a collection de partição de um arquivo (None se não particionado)"""
+        if not self.partition_by_source:
+            return None
+        try:
+            return self.chroma_client.get_collection(self.partition_name(source))
+        except Exception:
+            return None
+    
     def get_stats(self) -> Dict:
         """Retorna estatísticas da indexação"""
         collection = self.get_collection()
@@ -171,3 +472,24 @@ class DocumentIndexer:
                 "collection_name": self.collection_name
             }
         return {"total_chunks": 0, "collection_name": self.collection_name}
+
+
+if __name__ == "__main__":
+    # Indexador standalone: constrói o índice uma vez para N workers somente leitura
+    #   python -m app.services.indexer [--force]
+    import sys
+    from app.models.config import settings
+    
+    indexer = DocumentIndexer(
+        data_path=settings.data_path,
+        chroma_db_path=settings.chroma_db_path,
+        embedding_model_name=settings.embedding_model,
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        text_cache=PageTextCache(f"{settings.cache_path}/text") if settings.text_cache_enabled else None,
+        embedding_batch_size=settings.embedding_batch_size,
+        partition_by_source=settings.index_partition_by_source,
+        vector_store=settings.vector_store
+    )
+    chunks = indexer.ensure_index(force="--force" in sys.argv)
+    logger.info("Standalone indexation finished", chunks=chunks, index_version=indexer.index_version)
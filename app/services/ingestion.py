@@ -0,0 +1,249 @@
+import hashlib
+import json
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+import structlog
+
+from app.utils.sqlite import open_sqlite
+
+logger = structlog.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    job_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_created_at ON ingestion_jobs (created_at);
+"""
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class IngestionQueueFull(Exception):
+    """Fila de ingestão cheia (backpressure)"""
+
+
+class IngestionService:
+    """
+    Fila de ingestão de documentos com um worker em background
+
+    Cada job (upsert ou delete de um PDF) é processado fora do caminho das
+    perguntas: extração, chunking, embeddings em lotes e upsert no índice via
+    DocumentIndexer. A fila é limitada (submit falha com IngestionQueueFull) e
+    uploads são idempotentes pelo hash do conteúdo: reenviar um arquivo com o
+    mesmo conteúdo já indexado sob esse nome, ou igual a um job ainda
+    pendente, não gera trabalho novo.
+
+    Os jobs ficam em SQLite (modo WAL, compartilhado entre workers): o status
+    pode ser consultado em qualquer worker, não só no que recebeu o upload.
+    Os métodos fazem I/O no banco; chame-os fora do event loop.
+    """
+
+    def __init__(
+        self,
+        indexer,
+        db_path: str,
+        on_index_changed: Optional[Callable[[Optional[str]], None]] = None,
+        queue_size: int = 16,
+        max_jobs_history: int = 500
+    ):
+        self.indexer = indexer
+        self.on_index_changed = on_index_changed
+        self.max_jobs_history = max_jobs_history
+        self.db_path = db_path
+        self._conn = open_sqlite(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # Jobs deste worker ainda não concluídos (o histórico completo fica no banco)
+        self._jobs: Dict[str, Dict] = {}
+        # (operação, arquivo, hash) -> job_id dos jobs ainda não concluídos
+        self._pending: Dict[tuple, str] = {}
+        self._contents: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.chunks_ingested = 0
+        self.busy_seconds = 0.0
+        self.jobs_rejected = 0
+        self._thread = threading.Thread(target=self._run, name="ingestion-worker", daemon=True)
+        self._thread.start()
+
+    def _new_job(self, operation: str, source: str, content_hash: Optional[str], status: str = "queued") -> Dict:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "operation": operation,
+            "source": source,
+            "content_hash": content_hash,
+            "status": status,
+            "chunks": None,
+            "error": None,
+            "duplicate_of": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+        if status in ACTIVE_STATUSES:
+            self._jobs[job["job_id"]] = job
+        self._save(job)
+        return job
+
+    def _save(self, job: Dict) -> None:
+        """Grava o estado do job (chamado com self._lock)"""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingestion_jobs (job_id, created_at, status, record) VALUES (?, ?, ?, ?)",
+                (job["job_id"], job["created_at"], job["status"], json.dumps(job, ensure_ascii=False))
+            )
+
+    def _trim_history(self) -> None:
+        """Mantém apenas os `max_jobs_history` jobs concluídos mais recentes (chamado com self._lock)"""
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM ingestion_jobs WHERE status NOT IN (?, ?) AND job_id NOT IN "
+                "(SELECT job_id FROM ingestion_jobs ORDER BY created_at DESC LIMIT ?)",
+                (*ACTIVE_STATUSES, self.max_jobs_history)
+            )
+
+    def _enqueue(self, job: Dict, key: tuple) -> None:
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except queue.Full:
+            self._jobs.pop(job["job_id"], None)
+            self._contents.pop(job["job_id"], None)
+            with self._conn:
+                self._conn.execute("DELETE FROM ingestion_jobs WHERE job_id = ?", (job["job_id"],))
+            self.jobs_rejected += 1
+            raise IngestionQueueFull("Fila de ingestão cheia, tente novamente mais tarde")
+        self._pending[key] = job["job_id"]
+
+    def submit_upsert(self, source: str, content: bytes) -> Dict:
+        """Enfileira a indexação de um PDF (ou retorna o job equivalente já existente)"""
+        content_hash = hashlib.sha256(content).hexdigest()
+        key = ("upsert", source, content_hash)
+
+        with self._lock:
+            if key in self._pending:
+                return dict(self._jobs[self._pending[key]])
+
+            # Apenas o mesmo arquivo: conteúdo igual sob outro nome ainda precisa ser gravado
+            manifest = self.indexer.read_manifest() or {}
+            if manifest.get("documents", {}).get(source) == content_hash:
+                job = self._new_job("upsert", source, content_hash, status="skipped")
+                job["duplicate_of"] = source
+                job["finished_at"] = job["created_at"]
+                logger.info("Document already indexed, skipping", source=source)
+                return dict(job)
+
+            job = self._new_job("upsert", source, content_hash)
+            self._contents[job["job_id"]] = content
+            self._enqueue(job, key)
+
+        logger.info("Ingestion job queued", job_id=job["job_id"], operation="upsert", source=source)
+        return dict(job)
+
+    def submit_delete(self, source: str) -> Dict:
+        """Enfileira a remoção de um PDF do índice"""
+        key = ("delete", source, None)
+        with self._lock:
+            if key in self._pending:
+                return dict(self._jobs[self._pending[key]])
+            job = self._new_job("delete", source, None)
+            self._enqueue(job, key)
+
+        logger.info("Ingestion job queued", job_id=job["job_id"], operation="delete", source=source)
+        return dict(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["record"]) if row else None
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """Jobs mais recentes de todos os workers (do mais antigo ao mais novo)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM ingestion_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [json.loads(row["record"]) for row in reversed(rows)]
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+                content = self._contents.pop(job_id, None)
+                if job is None:
+                    continue
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                self._save(job)
+
+            try:
+                if job["operation"] == "upsert":
+                    chunks = self.indexer.upsert_document(job["source"], content)
+                else:
+                    self.indexer.delete_document(job["source"])
+                    chunks = 0
+                status, error = "done", None
+            except Exception as e:
+                logger.error("Ingestion job failed", job_id=job_id, source=job["source"], error=str(e))
+                chunks, status, error = None, "failed", str(e)
+
+            finished_at = time.time()
+            with self._lock:
+                job.update({"status": status, "chunks": chunks, "error": error, "finished_at": finished_at})
+                self._jobs.pop(job_id, None)
+                self._save(job)
+                self._trim_history()
+                self._pending.pop((job["operation"], job["source"], job["content_hash"]), None)
+                self.busy_seconds += finished_at - job["started_at"]
+                if chunks:
+                    self.chunks_ingested += chunks
+
+            if status == "done":
+                logger.info(
+                    "Ingestion job finished",
+                    job_id=job_id,
+                    operation=job["operation"],
+                    source=job["source"],
+                    chunks=chunks,
+                    elapsed_seconds=finished_at - job["started_at"]
+                )
+                if self.on_index_changed:
+                    self.on_index_changed(self.indexer.index_version)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS jobs FROM ingestion_jobs GROUP BY status").fetchall()
+            by_status = {row["status"]: row["jobs"] for row in rows}
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "jobs": by_status,
+                "jobs_rejected": self.jobs_rejected,
+                "chunks_ingested": self.chunks_ingested,
+                "chunks_per_second": self.chunks_ingested / self.busy_seconds if self.busy_seconds else 0.0
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Encerra o worker após o job em andamento (jobs na fila são descartados e marcados como failed)"""
+        discarded = []
+        while True:
+            try:
+                discarded.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._queue.put(None)
+        self._thread.join(timeout)
+        with self._lock:
+            for job_id in discarded:
+                job = self._jobs.pop(job_id, None)
+                if job:
+                    job.update({"status": "failed", "error": "Descartado no shutdown", "finished_at": time.time()})
+                    self._save(job)
+            self._conn.close()
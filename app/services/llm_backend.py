@@ -0,0 +1,220 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+import requests
+import structlog
+
+logger = structlog.get_logger()
+
+
+class OllamaReplica:
+    """Estado de roteamento e métricas de uma instância do Ollama"""
+
+    def __init__(self, base_url: str, latency_window: int = 200):
+        self.base_url = base_url.rstrip("/")
+        self.in_flight = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.ewma_latency_ms: Optional[float] = None
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.unhealthy_until
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def get_stats(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ewma_latency_ms": self.ewma_latency_ms,
+            "p50_latency_ms": self.latency_percentile(0.50),
+            "p95_latency_ms": self.latency_percentile(0.95),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won
+        }
+
+
+class OllamaBackend:
+    """
+    Camada de geração sobre uma ou mais réplicas do Ollama
+
+    - Roteamento least-loaded: menor número de requisições em andamento,
+      desempatando pela latência recente (EWMA)
+    - Health check passivo: após `failure_threshold` falhas consecutivas a
+      réplica sai do roteamento por `cooldown_seconds`
+    - Hedging: se a réplica escolhida passar do percentil `hedge_percentile`
+      da própria latência recente, a mesma requisição é enviada a uma segunda
+      réplica e vence a primeira resposta
+    """
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        max_concurrency: int = 32
+    ):
+        if not base_urls:
+            raise ValueError("At least one Ollama base URL is required")
+        self.replicas = [OllamaReplica(url) for url in base_urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.hedge_enabled = hedge_enabled and len(self.replicas) > 1
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ollama-hedge") \
+            if self.hedge_enabled else None
+
+    def _acquire(self, exclude: Tuple[OllamaReplica, ...] = ()) -> Optional[OllamaReplica]:
+        """Escolhe a réplica menos carregada e reserva um slot nela"""
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in exclude]
+            if not candidates:
+                return None
+            healthy = [r for r in candidates if r.healthy]
+            if healthy:
+                replica = min(healthy, key=lambda r: (r.in_flight, r.ewma_latency_ms or 0.0))
+            else:
+                # Nenhuma saudável: tenta a que sai do cooldown primeiro (fail-open)
+                replica = min(candidates, key=lambda r: r.unhealthy_until)
+            replica.in_flight += 1
+            replica.requests += 1
+            return replica
+
+    def _call(self, replica: OllamaReplica, path: str, payload: Dict, timeout: float) -> Dict:
+        start_time = time.time()
+        try:
+            response = requests.post(f"{replica.base_url}{path}", json=payload, timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.RequestException:
+            with self._lock:
+                replica.failures += 1
+                replica.consecutive_failures += 1
+                if replica.consecutive_failures >= self.failure_threshold:
+                    replica.unhealthy_until = time.time() + self.cooldown_seconds
+                    logger.warning(
+                        "Ollama replica marked unhealthy",
+                        replica=replica.base_url,
+                        consecutive_failures=replica.consecutive_failures
+                    )
+            raise
+        finally:
+            # Qualquer saída (inclusive corpo que não é JSON) libera a vaga da réplica
+            with self._lock:
+                replica.in_flight -= 1
+
+        latency = (time.time() - start_time) * 1000
+        with self._lock:
+            replica.consecutive_failures = 0
+            replica.unhealthy_until = 0.0
+            replica.latencies.append(latency)
+            if replica.ewma_latency_ms is None:
+                replica.ewma_latency_ms = latency
+            else:
+                replica.ewma_latency_ms += self.EWMA_ALPHA * (latency - replica.ewma_latency_ms)
+        return result
+
+    def _hedge_delay_seconds(self, replica: OllamaReplica) -> Optional[float]:
+        if not self.hedge_enabled or len(replica.latencies) < self.hedge_min_samples:
+            return None
+        return replica.latency_percentile(self.hedge_percentile) / 1000
+
+    def post(self, path: str, payload: Dict, timeout: float) -> Tuple[Dict, str]:
+        """
+        Envia a requisição à melhor réplica (com hedging se configurado)
+
+        Returns:
+            Tuple[Dict, str]: (JSON da resposta, URL da réplica que respondeu)
+
+        Raises:
+            requests.exceptions.RequestException: se todas as tentativas falharem
+        """
+        primary = self._acquire()
+        hedge_delay = self._hedge_delay_seconds(primary)
+
+        if hedge_delay is None:
+            return self._call(primary, path, payload, timeout), primary.base_url
+
+        futures = {self._executor.submit(self._call, primary, path, payload, timeout): primary}
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            secondary = self._acquire(exclude=(primary,))
+            if secondary is not None:
+                with self._lock:
+                    secondary.hedges_sent += 1
+                logger.info(
+                    "Hedging Ollama request",
+                    primary=primary.base_url,
+                    secondary=secondary.base_url,
+                    hedge_delay_ms=hedge_delay * 1000
+                )
+                futures[self._executor.submit(self._call, secondary, path, payload, timeout)] = secondary
+
+        # Primeira resposta bem-sucedida vence; a outra termina em background
+        pending = set(futures)
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    replica = futures[future]
+                    if replica is not primary:
+                        with self._lock:
+                            replica.hedges_won += 1
+                    return future.result(), replica.base_url
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def broadcast(self, path: str, payload: Dict, timeout: float) -> Dict[str, Optional[str]]:
+        """Envia a mesma requisição a todas as réplicas (ex.: warmup); retorna erro por réplica"""
+        errors = {}
+        for replica in self.replicas:
+            try:
+                response = requests.post(f"{replica.base_url}{path}", json=payload, timeout=timeout)
+                response.raise_for_status()
+                errors[replica.base_url] = None
+            except requests.exceptions.RequestException as e:
+                errors[replica.base_url] = str(e)
+        return errors
+
+    def probe(self, timeout: float = 5.0) -> Dict[str, bool]:
+        """Verifica /api/tags em cada réplica"""
+        status = {}
+        for replica in self.replicas:
+            try:
+                response = requests.get(f"{replica.base_url}/api/tags", timeout=timeout)
+                status[replica.base_url] = response.status_code == 200
+            except requests.exceptions.RequestException:
+                status[replica.base_url] = False
+        return status
+
+    def get_stats(self) -> Dict:
+        """Métricas por réplica"""
+        with self._lock:
+            return {
+                "hedge_enabled": self.hedge_enabled,
+                "replicas": [replica.get_stats() for replica in self.replicas]
+            }
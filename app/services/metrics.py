@@ -1,12 +1,33 @@
 import time
 import structlog
-from typing import Dict, List
+from typing import Deque, Dict, List, Optional, Sequence
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 
 
 logger = structlog.get_logger()
 
+# Load do modelo acima deste tempo conta como stall (modelo descarregado pelo Ollama)
+MODEL_LOAD_STALL_MS = 1000.0
+# Janela da série temporal de tokens/s (em minutos)
+TIMELINE_MINUTES = 60
+# Amostras mantidas para médias/percentis da quebra de tempo do LLM
+LLM_TIMINGS_WINDOW = 5000
+# Janela do throughput por cliente (segundos) e número máximo de clientes acompanhados
+TENANT_WINDOW_SECONDS = 60
+MAX_TENANTS = 1000
+
+
+def _avg(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
 
 class MetricsService:
     """Serviço de observabilidade e métricas"""
@@ -14,11 +35,49 @@ class MetricsService:
     def __init__(self):
         self.request_count = 0
         self.blocked_count = 0
+        self.llm_calls_avoided = 0
+        self.deduplicated_count = 0
+        self.pregenerated_count = 0
+        self.answer_cache_count = 0
+        # Chunks quase duplicados removidos do contexto (etapa de diversidade)
+        self.duplicates_dropped = 0
         self.latencies: List[float] = []
         self.retrieval_latencies: List[float] = []
         self.llm_latencies: List[float] = []
+        # Últimas LLM_TIMINGS_WINDOW amostras (memória constante em processos longos)
+        self.load_latencies: Deque[float] = deque(maxlen=LLM_TIMINGS_WINDOW)
+        self.prefill_latencies: Deque[float] = deque(maxlen=LLM_TIMINGS_WINDOW)
+        self.decode_latencies: Deque[float] = deque(maxlen=LLM_TIMINGS_WINDOW)
+        self.tokens_per_second: Deque[float] = deque(maxlen=LLM_TIMINGS_WINDOW)
+        self.model_load_stalls = 0
+        self.estimated_token_counts = 0
+        # Agregados por minuto: {minuto_epoch: {requests, tps_sum, tps_count, load_ms, stalls}}
+        self.llm_timeline: Dict[int, Dict] = defaultdict(
+            lambda: {"requests": 0, "tps_sum": 0.0, "tps_count": 0, "load_ms": 0.0, "stalls": 0}
+        )
+        # Cascata de modelos: latência/tokens por nível e requisições resolvidas
+        # sem escalar (comparadas com a média do maior modelo)
+        self.cascade_requests = 0
+        self.cascade_escalations = 0
+        self.cascade_tiers: Dict[str, Dict] = defaultdict(
+            lambda: {
+                "calls": 0,
+                "answered": 0,
+                "failures": 0,
+                "latencies": deque(maxlen=LLM_TIMINGS_WINDOW),
+                "tokens": 0
+            }
+        )
+        self.cascade_top_model: Optional[str] = None
+        # Respostas sem escalar até o maior modelo: apenas contagem e somas
+        self.cascade_early_answers = {"count": 0, "latency_ms": 0.0, "tokens": 0}
         self.token_usage: List[int] = []
-        self.request_history: List[Dict] = []
+        # Por cliente (API key ou IP): requisições, rejeições e espera na fila de geração
+        self.tenants: "OrderedDict[str, Dict]" = OrderedDict()
+        # Últimas requisições em memória; o histórico completo vai para o
+        # history_sink (gravação assíncrona, ver RequestHistoryStore)
+        self.request_history = deque(maxlen=100)
+        self.history_sink = None
         
     def record_request(
         self,
@@ -34,19 +93,50 @@ class MetricsService:
         context_size: int,
         citations_count: int,
         blocked: bool = False,
-        blocked_reason: str = None
+        blocked_reason: str = None,
+        llm_skipped: bool = False,
+        llm_timings: Optional[Dict] = None,
+        deduplicated: bool = False,
+        duplicates_dropped: int = 0,
+        pregenerated: bool = False,
+        answer_cached: bool = False
     ):
-        """Registra métricas de uma requisição"""
+        """
+        Registra métricas de uma requisição
+        
+        Requisições deduplicadas (resultado compartilhado de outra em andamento)
+        entram na latência total, mas não na latência/timings nem nos tokens do
+        LLM, que já foram contabilizados pela execução líder. O mesmo vale para respostas
+        pré-geradas ou do cache persistente (sem retrieval nem LLM no caminho
+        da requisição).
+        """
+        reused = deduplicated or pregenerated or answer_cached
         self.request_count += 1
         
         if blocked:
             self.blocked_count += 1
         
+        if llm_skipped or reused:
+            self.llm_calls_avoided += 1
+        if deduplicated:
+            self.deduplicated_count += 1
+        if pregenerated:
+            self.pregenerated_count += 1
+        if answer_cached:
+            self.answer_cache_count += 1
+        
         if not blocked:
             self.latencies.append(total_latency)
-            self.retrieval_latencies.append(retrieval_latency)
-            self.llm_latencies.append(llm_latency)
-            self.token_usage.append(total_tokens)
+            if not reused:
+                self.retrieval_latencies.append(retrieval_latency)
+                self.duplicates_dropped += duplicates_dropped
+                if not llm_skipped:
+                    self.llm_latencies.append(llm_latency)
+                if llm_timings:
+                    self._record_llm_timings(llm_timings)
+                self.token_usage.append(total_tokens)
+        
+        llm_timings = llm_timings or {}
         
         # Manter histórico das últimas 100 requisições
         request_log = {
@@ -56,19 +146,30 @@ class MetricsService:
             "total_latency_ms": total_latency,
             "retrieval_latency_ms": retrieval_latency,
             "llm_latency_ms": llm_latency,
+            "load_latency_ms": llm_timings.get("load_ms"),
+            "prefill_latency_ms": llm_timings.get("prefill_ms"),
+            "decode_latency_ms": llm_timings.get("decode_ms"),
+            "tokens_per_second": llm_timings.get("tokens_per_second"),
+            "llm_model": llm_timings.get("model"),
+            "cascade_escalated": llm_timings.get("escalated"),
             "prompt_tokens": prompt_tokens,
             "completion_tokens": completion_tokens,
             "total_tokens": total_tokens,
             "top_k": top_k,
             "context_size": context_size,
+            "duplicates_dropped": duplicates_dropped,
             "citations_count": citations_count,
             "blocked": blocked,
-            "blocked_reason": blocked_reason
+            "blocked_reason": blocked_reason,
+            "llm_skipped": llm_skipped,
+            "deduplicated": deduplicated,
+            "pregenerated": pregenerated,
+            "answer_cached": answer_cached
         }
         
         self.request_history.append(request_log)
-        if len(self.request_history) > 100:
-            self.request_history.pop(0)
+        if self.history_sink is not None:
+            self.history_sink.submit(request_log)
         
         logger.info(
             "Request recorded",
@@ -77,12 +178,193 @@ class MetricsService:
             total_latency_ms=total_latency
         )
     
+    def _record_llm_timings(self, timings: Dict) -> None:
+        """Agrega a quebra de tempo do Ollama (load, prefill, decode) e tokens/s"""
+        bucket = self.llm_timeline[int(time.time() // 60)]
+        bucket["requests"] += 1
+        
+        load_ms = timings.get("load_ms")
+        if load_ms is not None:
+            self.load_latencies.append(load_ms)
+            bucket["load_ms"] += load_ms
+            if load_ms >= MODEL_LOAD_STALL_MS:
+                self.model_load_stalls += 1
+                bucket["stalls"] += 1
+        
+        if timings.get("prefill_ms") is not None:
+            self.prefill_latencies.append(timings["prefill_ms"])
+        if timings.get("decode_ms") is not None:
+            self.decode_latencies.append(timings["decode_ms"])
+        
+        tps = timings.get("tokens_per_second")
+        if tps is not None:
+            self.tokens_per_second.append(tps)
+            bucket["tps_sum"] += tps
+            bucket["tps_count"] += 1
+        
+        if timings.get("tokens_estimated"):
+            self.estimated_token_counts += 1
+        
+        if timings.get("cascade"):
+            self._record_cascade(timings)
+        
+        # Descartar minutos fora da janela
+        oldest = int(time.time() // 60) - TIMELINE_MINUTES
+        for minute in [m for m in self.llm_timeline if m < oldest]:
+            del self.llm_timeline[minute]
+    
+    def _record_cascade(self, timings: Dict) -> None:
+        """Agrega os níveis tentados pela cascata de modelos"""
+        tiers = timings["cascade"]
+        self.cascade_requests += 1
+        self.cascade_top_model = timings.get("cascade_top_model", tiers[-1]["model"])
+        if timings.get("escalated"):
+            self.cascade_escalations += 1
+        
+        for tier in tiers:
+            stats = self.cascade_tiers[tier["model"]]
+            stats["calls"] += 1
+            if "error" in tier:
+                stats["failures"] += 1
+                continue
+            stats["latencies"].append(tier["latency_ms"])
+            stats["tokens"] += tier["prompt_tokens"] + tier["completion_tokens"]
+        
+        # Resposta usada: a do último nível que não falhou
+        final = next(tier for tier in reversed(tiers) if "error" not in tier)
+        self.cascade_tiers[final["model"]]["answered"] += 1
+        if final["model"] != self.cascade_top_model:
+            early = self.cascade_early_answers
+            early["count"] += 1
+            early["latency_ms"] += sum(tier["latency_ms"] for tier in tiers)
+            early["tokens"] += sum(tier.get("prompt_tokens", 0) + tier.get("completion_tokens", 0) for tier in tiers)
+    
+    def _cascade_statistics(self) -> Dict:
+        """Taxa de escalonamento, latência por nível e economia estimada da cascata"""
+        if not self.cascade_requests:
+            return {}
+        
+        tiers = {
+            model: {
+                "calls": stats["calls"],
+                "answered": stats["answered"],
+                "failures": stats["failures"],
+                "avg_latency_ms": _avg(stats["latencies"]),
+                "p95_latency_ms": _percentile(stats["latencies"], 0.95),
+                "avg_tokens": (
+                    stats["tokens"] / (stats["calls"] - stats["failures"])
+                    if stats["calls"] > stats["failures"] else 0.0
+                )
+            }
+            for model, stats in self.cascade_tiers.items()
+        }
+        
+        # Economia = (média do maior modelo - custo real) nas respostas que não escalaram
+        latency_saved_ms = None
+        tokens_saved = None
+        top = tiers.get(self.cascade_top_model)
+        if top and top["calls"] > top["failures"]:
+            early = self.cascade_early_answers
+            latency_saved_ms = early["count"] * top["avg_latency_ms"] - early["latency_ms"]
+            tokens_saved = early["count"] * top["avg_tokens"] - early["tokens"]
+        
+        return {
+            "requests": self.cascade_requests,
+            "escalations": self.cascade_escalations,
+            "escalation_rate": self.cascade_escalations / self.cascade_requests,
+            "tiers": tiers,
+            "estimated_latency_saved_ms": latency_saved_ms,
+            "estimated_tokens_saved": tokens_saved
+        }
+    
+    def _tenant(self, tenant: str, priority: str) -> Dict:
+        stats = self.tenants.get(tenant)
+        if stats is None:
+            stats = self.tenants[tenant] = {
+                "priority": priority,
+                "requests": 0,
+                "rate_limited": 0,
+                "queue_rejected": 0,
+                "queue_waits": deque(maxlen=500),
+                "completed_at": deque()
+            }
+            if len(self.tenants) > MAX_TENANTS:
+                self.tenants.popitem(last=False)
+        else:
+            self.tenants.move_to_end(tenant)
+        return stats
+    
+    def record_tenant_request(self, tenant: str, priority: str, queue_wait_ms: float) -> None:
+        """Registra uma execução do pipeline de um cliente e a espera na fila de geração"""
+        stats = self._tenant(tenant, priority)
+        stats["requests"] += 1
+        stats["queue_waits"].append(queue_wait_ms)
+        now = time.time()
+        stats["completed_at"].append(now)
+        while stats["completed_at"] and stats["completed_at"][0] < now - TENANT_WINDOW_SECONDS:
+            stats["completed_at"].popleft()
+    
+    def record_tenant_rejection(self, tenant: str, priority: str, reason: str) -> None:
+        """Registra uma requisição rejeitada (rate_limited ou queue_rejected)"""
+        self._tenant(tenant, priority)[reason] += 1
+    
+    def get_tenant_statistics(self, limit: int = 50) -> Dict:
+        """Throughput (req/s na última janela), rejeições e espera na fila por cliente"""
+        now = time.time()
+        tenants = {}
+        for tenant, stats in list(self.tenants.items())[-limit:]:
+            recent = sum(1 for ts in stats["completed_at"] if ts >= now - TENANT_WINDOW_SECONDS)
+            waits = list(stats["queue_waits"])
+            tenants[tenant] = {
+                "priority": stats["priority"],
+                "requests": stats["requests"],
+                "rate_limited": stats["rate_limited"],
+                "queue_rejected": stats["queue_rejected"],
+                "throughput_rps": recent / TENANT_WINDOW_SECONDS,
+                "avg_queue_wait_ms": _avg(waits),
+                "p95_queue_wait_ms": _percentile(waits, 0.95)
+            }
+        return tenants
+    
+    def get_llm_timeline(self) -> List[Dict]:
+        """Série por minuto de tokens/s e stalls de load do modelo"""
+        return [
+            {
+                "minute": datetime.utcfromtimestamp(minute * 60).isoformat(),
+                "requests": bucket["requests"],
+                "avg_tokens_per_second": bucket["tps_sum"] / bucket["tps_count"] if bucket["tps_count"] else 0.0,
+                "total_load_ms": bucket["load_ms"],
+                "model_load_stalls": bucket["stalls"]
+            }
+            for minute, bucket in sorted(self.llm_timeline.items())
+        ]
+    
+    def _llm_statistics(self) -> Dict:
+        return {
+            "avg_load_latency_ms": _avg(self.load_latencies),
+            "model_load_stalls": self.model_load_stalls,
+            "avg_prefill_latency_ms": _avg(self.prefill_latencies),
+            "p95_prefill_latency_ms": _percentile(self.prefill_latencies, 0.95),
+            "avg_decode_latency_ms": _avg(self.decode_latencies),
+            "p95_decode_latency_ms": _percentile(self.decode_latencies, 0.95),
+            "avg_tokens_per_second": _avg(self.tokens_per_second),
+            "p50_tokens_per_second": _percentile(self.tokens_per_second, 0.50),
+            "p05_tokens_per_second": _percentile(self.tokens_per_second, 0.05),
+            "estimated_token_counts": self.estimated_token_counts,
+            "cascade": self._cascade_statistics()
+        }
+    
     def get_statistics(self) -> Dict:
         """Retorna estatísticas agregadas"""
         if not self.latencies:
             return {
                 "total_requests": self.request_count,
                 "blocked_requests": self.blocked_count,
+                "llm_calls_avoided": self.llm_calls_avoided,
+                "deduplicated_requests": self.deduplicated_count,
+                "pregenerated_answers_served": self.pregenerated_count,
+                "cached_answers_served": self.answer_cache_count,
+                "duplicates_dropped": self.duplicates_dropped,
                 "success_requests": 0,
                 "block_rate": 0.0,
                 "avg_latency_ms": 0.0,
@@ -91,6 +373,7 @@ class MetricsService:
                 "p99_latency_ms": 0.0,
                 "avg_retrieval_latency_ms": 0.0,
                 "avg_llm_latency_ms": 0.0,
+                **self._llm_statistics(),
                 "avg_tokens": 0.0,
                 "total_tokens": 0
             }
@@ -101,21 +384,27 @@ class MetricsService:
         return {
             "total_requests": self.request_count,
             "blocked_requests": self.blocked_count,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "deduplicated_requests": self.deduplicated_count,
+            "pregenerated_answers_served": self.pregenerated_count,
+            "cached_answers_served": self.answer_cache_count,
+            "duplicates_dropped": self.duplicates_dropped,
             "success_requests": len(self.latencies),
             "block_rate": self.blocked_count / self.request_count if self.request_count > 0 else 0.0,
             "avg_latency_ms": sum(self.latencies) / n,
             "p50_latency_ms": sorted_latencies[n // 2],
             "p95_latency_ms": sorted_latencies[int(n * 0.95)],
             "p99_latency_ms": sorted_latencies[int(n * 0.99)],
-            "avg_retrieval_latency_ms": sum(self.retrieval_latencies) / len(self.retrieval_latencies),
-            "avg_llm_latency_ms": sum(self.llm_latencies) / len(self.llm_latencies),
-            "avg_tokens": sum(self.token_usage) / len(self.token_usage),
+            "avg_retrieval_latency_ms": _avg(self.retrieval_latencies),
+            "avg_llm_latency_ms": sum(self.llm_latencies) / len(self.llm_latencies) if self.llm_latencies else 0.0,
+            **self._llm_statistics(),
+            "avg_tokens": _avg(self.token_usage),
             "total_tokens": sum(self.token_usage)
         }
     
     def get_recent_requests(self, limit: int = 10) -> List[Dict]:
         """Retorna as requisições mais recentes"""
-        return self.request_history[-limit:]
+        return list(self.request_history)[-limit:]
 
 
 # Singleton instance
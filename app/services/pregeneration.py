@@ -0,0 +1,392 @@
+import asyncio
+import fcntl
+import json
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import structlog
+
+from app.services.answer_cache import CACHED_DOCUMENT_FIELDS
+from app.services.scheduler import SchedulerQueueFull
+from app.utils.sqlite import ThreadLocalReaders, open_sqlite
+from app.utils.text import normalize_query
+
+logger = structlog.get_logger()
+
+# Cliente da pré-geração no scheduler de geração (sempre na classe bulk)
+SCHEDULER_CLIENT = "pregeneration"
+# Espera antes de tentar de novo quando a fila do scheduler está cheia
+QUEUE_FULL_BACKOFF = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pregenerated_answers (
+    question_key TEXT NOT NULL,
+    top_k INTEGER NOT NULL,
+    index_version TEXT NOT NULL,
+    question TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    signature TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (question_key, top_k, index_version)
+);
+"""
+
+
+def generation_signature(rag_service) -> str:
+    """Modelo(s) e hash do prompt que geraram a resposta (mesmos componentes da chave do AnswerCache)"""
+    return f"{rag_service.model_signature}:{rag_service.prompt_fingerprint}"
+
+
+class PregeneratedAnswerStore:
+    """
+    Respostas pré-geradas para perguntas frequentes (SQLite em modo WAL)
+
+    Chave: pergunta normalizada + top_k + versão do índice; cada entrada
+    guarda também a assinatura de geração (modelo e hash do prompt, ver
+    `generation_signature`). Uma reindexação ou mudança de modelo/prompt faz
+    as entradas antigas deixarem de ser servidas até serem regeneradas. O
+    arquivo é compartilhado entre workers.
+
+    `get` (caminho das requisições) usa uma conexão somente leitura por
+    thread, sem esperar as escritas da pré-geração; chame-o fora do event loop.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = open_sqlite(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(pregenerated_answers)")}
+        if "signature" not in columns:
+            # Arquivos anteriores à assinatura: entradas sem assinatura nunca são servidas
+            with self._conn:
+                self._conn.execute("ALTER TABLE pregenerated_answers ADD COLUMN signature TEXT NOT NULL DEFAULT ''")
+        self._readers = ThreadLocalReaders(db_path)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str, top_k: int, index_version: Optional[str], signature: str) -> Optional[Dict]:
+        """Resposta pré-gerada para a pergunta (None se inexistente para esta versão do índice e assinatura)"""
+        if index_version is None:
+            return None
+        row = self._readers.get().execute(
+            "SELECT payload FROM pregenerated_answers "
+            "WHERE question_key = ? AND top_k = ? AND index_version = ? AND signature = ?",
+            (normalize_query(question), top_k, index_version, signature)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row["payload"])
+
+    def contains(self, question: str, top_k: int, index_version: str, signature: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM pregenerated_answers "
+                "WHERE question_key = ? AND top_k = ? AND index_version = ? AND signature = ?",
+                (normalize_query(question), top_k, index_version, signature)
+            ).fetchone() is not None
+
+    def put(self, question: str, top_k: int, index_version: str, signature: str, payload: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pregenerated_answers "
+                "(question_key, top_k, index_version, question, payload, created_at, signature) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    normalize_query(question), top_k, index_version, question,
+                    json.dumps(payload, ensure_ascii=False), time.time(), signature
+                )
+            )
+
+    def questions(self) -> List[Tuple[str, int]]:
+        """Perguntas conhecidas (qualquer versão do índice), para regeneração"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, top_k FROM pregenerated_answers "
+                "GROUP BY question_key, top_k ORDER BY MAX(created_at) DESC"
+            ).fetchall()
+        return [(row["question"], row["top_k"]) for row in rows]
+
+    def purge(self, keep_version: str, keep_signature: str) -> int:
+        """Remove as entradas de outras versões do índice ou geradas com outro modelo/prompt"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM pregenerated_answers WHERE index_version != ? OR signature != ?",
+                (keep_version, keep_signature)
+            ).rowcount
+
+    def get_stats(self) -> Dict:
+        rows = self._readers.get().execute(
+            "SELECT index_version, COUNT(*) AS entries FROM pregenerated_answers GROUP BY index_version"
+        ).fetchall()
+        total = self.hits + self.misses
+        return {
+            "entries": {row["index_version"]: row["entries"] for row in rows},
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self) -> None:
+        self._readers.close()
+        with self._lock:
+            self._conn.close()
+
+
+class PregenerationService:
+    """
+    Gera respostas offline com o pipeline completo (guardrail de entrada,
+    RAGService.answer_question, groundedness e sanitização) e grava no
+    PregeneratedAnswerStore
+
+    Um job por vez, em uma thread em background. `refresh` regenera todas as
+    perguntas conhecidas para a versão atual do índice (chamado no startup e
+    após cada reindexação) e remove as entradas das versões anteriores.
+
+    Com vários workers, o job roda apenas no processo que obtiver o lock
+    `lock_path` (os demais registram o job como "locked"). Cada geração passa
+    pelo `scheduler` de geração na classe bulk, executado no event loop `loop`,
+    para não competir com as requisições interativas fora da fila justa.
+    """
+
+    def __init__(
+        self,
+        store: PregeneratedAnswerStore,
+        rag_service,
+        guardrail_service=None,
+        lock_path: Optional[str] = None,
+        scheduler=None,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
+        self.store = store
+        self.rag_service = rag_service
+        self.guardrail_service = guardrail_service
+        self.lock_path = lock_path or f"{store.db_path}.lock"
+        self.scheduler = scheduler
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Refresh pedido durante outro job: executado quando ele terminar
+        self._refresh_pending = False
+        self.last_job: Optional[Dict] = None
+
+    def _generate(self, question: str, top_k: int) -> Optional[Dict]:
+        """Payload da resposta (None se a pergunta for bloqueada pelos guardrails)"""
+        if self.guardrail_service is not None:
+            is_valid, violation = self.guardrail_service.validate_query(question)
+            if not is_valid:
+                logger.warning("Pregeneration question blocked", violation=violation.policy)
+                return None
+
+        start_time = time.time()
+        answer, documents, _, _, prompt_tokens, completion_tokens, timings = self._answer(question, top_k)
+        groundedness_score = None
+        if self.guardrail_service is not None:
+            answer, groundedness_score = self.guardrail_service.review_answer(
+                answer, documents, question, timings.get("groundedness_score")
+            )
+
+        return {
+            "answer": answer,
+            "documents": [{field: doc.get(field) for field in CACHED_DOCUMENT_FIELDS} for doc in documents],
+            "groundedness_score": groundedness_score,
+            "llm_model": timings.get("model"),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "generation_latency_ms": (time.time() - start_time) * 1000,
+            "generated_at": time.time()
+        }
+
+    async def _scheduled_answer(self, question: str, top_k: int):
+        async with self.scheduler.slot(SCHEDULER_CLIENT, "bulk"):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.rag_service.answer_question, question, top_k
+            )
+
+    def _answer(self, question: str, top_k: int):
+        """RAGService.answer_question, ocupando uma vaga bulk do scheduler (se configurado)"""
+        if self.scheduler is None or self.loop is None:
+            return self.rag_service.answer_question(question, top_k)
+        while True:
+            try:
+                return asyncio.run_coroutine_threadsafe(
+                    self._scheduled_answer(question, top_k), self.loop
+                ).result()
+            except SchedulerQueueFull:
+                time.sleep(QUEUE_FULL_BACKOFF)
+
+    def _run(self, job: Dict, questions: List[Tuple[str, int]], force: bool, purge: bool) -> None:
+        with open(self.lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Outro worker já está pré-gerando; as entradas dele servem a todos
+                job["status"] = "locked"
+            else:
+                try:
+                    self._generate_all(job, questions, force, purge)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        job["finished_at"] = time.time()
+        logger.info("Pregeneration job finished", **job)
+
+        with self._lock:
+            self._thread = None
+            refresh = self._refresh_pending
+        if refresh:
+            self._start_refresh()
+
+    def _generate_all(self, job: Dict, questions: List[Tuple[str, int]], force: bool, purge: bool) -> None:
+        index_version = job["index_version"]
+        signature = generation_signature(self.rag_service)
+        for question, top_k in questions:
+            if self.rag_service.index_version != index_version:
+                # Reindexado durante o job: o próximo refresh assume
+                job["status"] = "superseded"
+                break
+            try:
+                if not force and self.store.contains(question, top_k, index_version, signature):
+                    job["skipped"] += 1
+                    continue
+                payload = self._generate(question, top_k)
+                if payload is None:
+                    job["blocked"] += 1
+                    continue
+                self.store.put(question, top_k, index_version, signature, payload)
+                job["generated"] += 1
+            except Exception as e:
+                logger.error("Pregeneration failed", question=question[:50], error=str(e))
+                job["failed"] += 1
+        else:
+            job["status"] = "done"
+            if purge:
+                job["purged"] = self.store.purge(index_version, signature)
+
+    def submit(
+        self,
+        questions: Iterable[Tuple[str, int]],
+        force: bool = False,
+        purge: bool = False
+    ) -> Dict:
+        """
+        Inicia um job em background (se já houver um em andamento, retorna o dele)
+
+        Args:
+            questions: Pares (pergunta, top_k); duplicatas normalizadas são ignoradas
+            force: Regenera mesmo perguntas já presentes para a versão atual
+            purge: Ao final, remove entradas de outras versões do índice
+        """
+        with self._lock:
+            if self._thread is not None:
+                return dict(self.last_job)
+            if purge:
+                self._refresh_pending = False
+
+            unique: Dict[Tuple[str, int], Tuple[str, int]] = {}
+            for question, top_k in questions:
+                unique.setdefault((normalize_query(question), top_k), (question, top_k))
+
+            job = {
+                "status": "running",
+                "index_version": self.rag_service.index_version,
+                "questions": len(unique),
+                "generated": 0,
+                "skipped": 0,
+                "blocked": 0,
+                "failed": 0,
+                "purged": 0,
+                "started_at": time.time(),
+                "finished_at": None
+            }
+            self.last_job = job
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(job, list(unique.values()), force, purge),
+                name="pregeneration",
+                daemon=True
+            )
+            self._thread.start()
+            return dict(job)
+
+    def refresh(self, index_version: Optional[str] = None) -> Optional[Dict]:
+        """Regenera as perguntas conhecidas para a versão atual do índice (callback de reindexação)"""
+        with self._lock:
+            self._refresh_pending = True
+        return self._start_refresh()
+
+    def _start_refresh(self) -> Optional[Dict]:
+        questions = self.store.questions()
+        if not questions or self.rag_service.index_version is None:
+            with self._lock:
+                self._refresh_pending = False
+            return None
+        logger.info(
+            "Refreshing pregenerated answers",
+            questions=len(questions),
+            index_version=self.rag_service.index_version
+        )
+        return self.submit(questions, purge=True)
+
+    def get_status(self) -> Optional[Dict]:
+        return dict(self.last_job) if self.last_job else None
+
+
+def rank_questions(lines: Iterable[str], default_top_k: int, top: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    Perguntas mais frequentes de um arquivo (JSONL com "question"/"top_k" ou uma pergunta por linha)
+
+    Agrupa pela pergunta normalizada e mantém o texto da primeira ocorrência.
+    """
+    counts: Counter = Counter()
+    first_seen: Dict[Tuple[str, int], str] = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            item = json.loads(line)
+            question, top_k = item.get("question"), item.get("top_k") or default_top_k
+        else:
+            question, top_k = line, default_top_k
+        if not question:
+            continue
+        key = (normalize_query(question), int(top_k))
+        counts[key] += 1
+        first_seen.setdefault(key, question)
+    return [(first_seen[key], key[1]) for key, _ in counts.most_common(top)]
+
+
+if __name__ == "__main__":
+    # Job de pré-geração (ex.: cron fora do horário de pico), executado pela API em execução:
+    #   python -m app.services.pregeneration perguntas.jsonl [--top 50] [--force] [--api-url http://localhost:8000]
+    import argparse
+    import os
+    import requests
+
+    parser = argparse.ArgumentParser(description="Pré-gera respostas para as perguntas mais frequentes")
+    parser.add_argument("files", nargs="+", help="JSONL com question/top_k ou texto com uma pergunta por linha")
+    parser.add_argument("--top", type=int, default=None, help="Apenas as N perguntas mais frequentes")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--force", action="store_true", help="Regenera perguntas já pré-geradas")
+    parser.add_argument("--api-url", default=os.getenv("API_URL", "http://localhost:8000"))
+    args = parser.parse_args()
+
+    lines: List[str] = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            lines.extend(f)
+    ranked = rank_questions(lines, args.top_k, args.top)
+
+    response = requests.post(
+        f"{args.api_url}/api/v1/admin/pregenerate",
+        json={"questions": [{"question": question, "top_k": top_k} for question, top_k in ranked], "force": args.force},
+        headers={"X-Admin-Token": os.getenv("ADMIN_TOKEN", "")},
+        timeout=30
+    )
+    response.raise_for_status()
+    print(json.dumps(response.json(), ensure_ascii=False, indent=2))
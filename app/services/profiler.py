@@ -0,0 +1,174 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+
+class ProfilerBusy(Exception):
+    """Já existe uma amostragem de stacks em andamento"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class ProfilingService:
+    """
+    Profiling sob demanda do worker em execução
+
+    - Amostragem de stacks: uma thread lê sys._current_frames() a cada
+      `interval` durante N segundos e agrega as stacks no formato "collapsed"
+      (frame;frame;frame contagem), aceito por flamegraph.pl e speedscope
+    - cProfile por requisição: executa uma chamada sob cProfile e guarda o
+      resultado (últimos `max_profiles`) para consulta posterior
+    - tracemalloc: snapshots com diff em relação ao anterior, para achar
+      crescimento de memória por linha de código
+
+    Nada roda enquanto não for solicitado: sem hooks de trace nem threads
+    permanentes, o custo com o profiling desligado é zero.
+    """
+
+    def __init__(self, max_profiles: int = 20):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sampling = threading.Lock()
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self.samplings = 0
+
+    def sample_stacks(self, seconds: float, interval: float = 0.005) -> Tuple[str, Dict]:
+        """
+        Amostra as stacks de todas as threads (bloqueia por `seconds`)
+
+        Returns:
+            Tuple[str, Dict]: (stacks no formato collapsed, resumo da amostragem)
+        """
+        if not self._sampling.acquire(blocking=False):
+            raise ProfilerBusy("Já existe uma amostragem em andamento")
+
+        try:
+            own_thread = threading.get_ident()
+            counts: Counter = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                    counts[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._sampling.release()
+
+        self.samplings += 1
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+        summary = {"seconds": seconds, "interval_ms": interval * 1000, "samples": samples, "stacks": len(counts)}
+        logger.info("Stack sampling finished", **summary)
+        return collapsed, summary
+
+    def run_profiled(self, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, str]:
+        """
+        Executa fn sob cProfile (na thread atual)
+
+        Returns:
+            Tuple[Any, str]: (resultado de fn, id do profile para get_profile)
+        """
+        profiler = cProfile.Profile()
+        start_time = time.time()
+        try:
+            result = profiler.runcall(fn, *args, **kwargs)
+        finally:
+            profile_id = uuid.uuid4().hex
+            with self._lock:
+                self._profiles[profile_id] = {
+                    "profiler": profiler,
+                    "created_at": start_time,
+                    "elapsed_ms": (time.time() - start_time) * 1000
+                }
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+        return result, profile_id
+
+    def get_profile(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+        """Relatório pstats de um profile guardado (None se expirado ou inexistente)"""
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+            if profile is None:
+                return None
+            output = io.StringIO()
+            stats = pstats.Stats(profile["profiler"], stream=output)
+            stats.sort_stats(sort).print_stats(limit)
+        return f"# elapsed_ms={profile['elapsed_ms']:.2f}\n{output.getvalue()}"
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        # Sem as alocações do próprio tracemalloc e do import system
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def tracemalloc_start(self, frames: int = 10) -> None:
+        """Inicia o rastreamento de alocações e grava o snapshot de referência"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = self._take_snapshot()
+        logger.info("Tracemalloc started", frames=frames)
+
+    def tracemalloc_diff(self, limit: int = 30, key_type: str = "lineno") -> Dict:
+        """
+        Diff do snapshot atual contra o anterior (o atual vira a nova referência)
+
+        Raises:
+            RuntimeError: tracemalloc não iniciado
+        """
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            raise RuntimeError("tracemalloc não iniciado")
+
+        snapshot = self._take_snapshot()
+        top: List[Dict] = []
+        for stat in snapshot.compare_to(self._baseline, key_type)[:limit]:
+            top.append({
+                "location": str(stat.traceback),
+                "size_kb": round(stat.size / 1024, 2),
+                "size_diff_kb": round(stat.size_diff / 1024, 2),
+                "count": stat.count,
+                "count_diff": stat.count_diff
+            })
+        self._baseline = snapshot
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current_kb": round(current / 1024, 2), "peak_kb": round(peak / 1024, 2), "top": top}
+
+    def tracemalloc_stop(self) -> None:
+        tracemalloc.stop()
+        self._baseline = None
+        logger.info("Tracemalloc stopped")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            profiles = len(self._profiles)
+        return {
+            "stack_samplings": self.samplings,
+            "sampling_in_progress": self._sampling.locked(),
+            "request_profiles": profiles,
+            "tracemalloc_tracing": tracemalloc.is_tracing()
+        }
@@ -1,11 +1,89 @@
+import hashlib
 import time
 import requests
-from typing import List, Tuple
+from typing import Any, Callable, List, Tuple, Dict, Optional
+import numpy as np
 from sentence_transformers import SentenceTransformer
 import structlog
 
+from app.services.cache import LRUCache
+from app.services.diversity import diversify
+from app.services.llm_backend import OllamaBackend
+from app.services.vector_store import QuantizedVectorStore
+from app.utils.text import normalize_query
+
 logger = structlog.get_logger()
 
+NO_RELEVANT_INFO_ANSWER = "Não encontrei informações relevantes nos documentos para responder sua pergunta."
+
+# Instruções fixas enviadas no campo `system` do Ollama. Por ficarem sempre no
+# início do prompt, o runner reaproveita o KV cache desse prefixo entre chamadas.
+DEFAULT_SYSTEM_PROMPT = (
+    "Responda a pergunta usando APENAS as informações dos documentos fornecidos. "
+    "Cite as fontes (arquivo e página)."
+)
+
+# Template do prompt do usuário (as instruções fixas vão no campo `system`)
+PROMPT_TEMPLATE = """DOCUMENTOS:
+{context}
+
+PERGUNTA: {query}
+
+RESPOSTA:"""
+
+# Limite de caracteres de cada documento no contexto do prompt
+MAX_CHARS_PER_DOC = 400
+
+# Score mínimo de relevância (1 - distância cosseno) por modelo de embeddings.
+# Calibrado comparando o score top-1 de perguntas rotuladas do domínio com o de
+# perguntas fora do domínio (python -m benchmarks.retrieval_eval --calibrate).
+# Apenas modelos medidos entram aqui; os demais usam 0 (sem piso) até serem
+# calibrados ou até MIN_RELEVANCE_SCORE ser definido.
+RELEVANCE_FLOORS = {
+    "all-MiniLM-L6-v2": 0.20,
+}
+
+
+def relevance_floor_for(model_name: str, override: Optional[float] = None) -> float:
+    """Retorna o piso de relevância configurado ou o calibrado para o modelo (0 = desativado)"""
+    if override is not None:
+        return override
+    return RELEVANCE_FLOORS.get(model_name.split("/")[-1], 0.0)
+
+
+def build_where_filter(
+    sources: Optional[List[str]] = None,
+    page_min: Optional[int] = None,
+    page_max: Optional[int] = None
+) -> Optional[Dict]:
+    """
+    Monta o filtro `where` do ChromaDB a partir dos filtros da requisição
+    
+    Um chunk pode cobrir várias páginas (page..page_end); ele entra no
+    resultado se esse intervalo tiver interseção com [page_min, page_max].
+    """
+    conditions = []
+    if sources:
+        conditions.append({"source": sources[0]} if len(sources) == 1 else {"source": {"$in": list(sources)}})
+    if page_min is not None:
+        conditions.append({"page_end": {"$gte": page_min}})
+    if page_max is not None:
+        conditions.append({"page": {"$lte": page_max}})
+    
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def _documents_size(documents: List[dict]) -> int:
+    """Estimativa do tamanho em memória de uma lista de documentos recuperados"""
+    return sum(
+        len(doc["text"]) + 256 + (doc["embedding"].nbytes if doc.get("embedding") is not None else 0)
+        for doc in documents
+    )
+
 
 class RAGService:
     """Serviço de Retrieval-Augmented Generation"""
@@ -16,97 +94,393 @@ class RAGService:
         embedding_model: SentenceTransformer,
         ollama_base_url: str,
         ollama_model: str,
-        top_k: int = 5
+        top_k: int = 5,
+        max_context_docs: int = 3,
+        retrieval_cache_size: int = 0,
+        embedding_cache_size: int = 0,
+        index_version: Optional[str] = None,
+        min_relevance_score: float = 0.0,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        keep_alive: Optional[str] = None,
+        backend: Optional[OllamaBackend] = None,
+        cascade_models: Optional[List[str]] = None,
+        cascade_threshold: float = 0.3,
+        guardrail_service=None,
+        partition_lookup: Optional[Callable[[str], Any]] = None,
+        vector_store: Optional[QuantizedVectorStore] = None,
+        diversity_mode: str = "off",
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.92
     ):
         self.collection = collection
         self.embedding_model = embedding_model
         self.ollama_base_url = ollama_base_url
         self.ollama_model = ollama_model
+        # Camada de geração (uma ou mais réplicas do Ollama)
+        self.backend = backend or OllamaBackend([ollama_base_url])
         self.top_k = top_k
+        self.max_context_docs = max_context_docs
+        self.index_version = index_version
+        self.min_relevance_score = min_relevance_score
+        self.system_prompt = system_prompt
+        self.keep_alive = keep_alive
         
-    def retrieve_documents(self, query: str, top_k: int = None) -> Tuple[List[dict], float]:
-        """
-        Recupera documentos relevantes do índice
+        # Cascata: modelos do mais rápido ao maior; a resposta de um nível é
+        # aceita se o groundedness (GuardrailService) atingir cascade_threshold
+        self.cascade_models = cascade_models or [ollama_model]
+        self.cascade_threshold = cascade_threshold
+        self.guardrail_service = guardrail_service
         
-        Returns:
-            Tuple[List[dict], float]: (documentos, latência em ms)
-        """
-        start_time = time.time()
+        # Partições por arquivo (DocumentIndexer.get_partition), se o índice for particionado
+        self.partition_lookup = partition_lookup
+        self._partitions: Dict[str, Any] = {}
         
-        if top_k is None:
-            top_k = self.top_k
+        # Store quantizado (int8 + re-scoring); se carregado, substitui a busca no Chroma
+        self.vector_store = vector_store
         
-        # Gerar embedding da query
-        query_embedding = self.embedding_model.encode(query).tolist()
+        # Diversidade do contexto (ver app.services.diversity): usa os embeddings
+        # dos chunks, que só são trazidos do índice se o modo estiver ativo
+        self.diversity_mode = diversity_mode
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
         
-        # Buscar no ChromaDB
-        results = self.collection.query(
+        # Caches: resultados de retrieval (por query normalizada + top_k + versão
+        # do índice) e embeddings de query (reutilizáveis por outras etapas)
+        self.retrieval_cache = LRUCache(retrieval_cache_size, sizer=_documents_size)
+        self.embedding_cache = LRUCache(embedding_cache_size, sizer=lambda emb: emb.nbytes)
+    
+    def set_index_version(self, index_version: Optional[str], collection=None) -> None:
+        """
+        Atualiza a versão do índice, descartando resultados de retrieval em cache
+
+        `collection` substitui o handle do Chroma (re-resolvido após uma
+        reconstrução feita por outro processo).
+        """
+        if index_version != self.index_version:
+            if collection is not None:
+                self.collection = collection
+            self.index_version = index_version
+            self.retrieval_cache.clear()
+            self._partitions.clear()
+            if self.vector_store is not None:
+                self.vector_store.load()
+            logger.info("Index version changed, retrieval cache cleared", index_version=index_version)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Gera (ou reutiliza do cache) o embedding float32 de uma query"""
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            embedding = np.asarray(self.embedding_model.encode(query), dtype=np.float32)
+            self.embedding_cache.put(key, embedding)
+        return embedding
+    
+    def cache_stats(self) -> Dict:
+        """Estatísticas dos caches do pipeline de retrieval"""
+        return {
+            "retrieval": self.retrieval_cache.get_stats(),
+            "query_embedding": self.embedding_cache.get_stats(),
+            "index_version": self.index_version,
+            "vector_store": self.vector_store.get_stats() if self.vector_store is not None else {"type": "chroma"}
+        }
+        
+    def _get_partition(self, source: str):
+        """Collection de partição de um arquivo (None se o índice não for particionado)"""
+        if self.partition_lookup is None:
+            return None
+        if source not in self._partitions:
+            self._partitions[source] = self.partition_lookup(source)
+        return self._partitions[source]
+    
+    @property
+    def _with_embeddings(self) -> bool:
+        return self.diversity_mode != "off"
+    
+    @staticmethod
+    def _query_collection(
+        collection,
+        query_embedding: List[float],
+        top_k: int,
+        where: Optional[Dict],
+        with_embeddings: bool = False
+    ) -> List[dict]:
+        """Busca na collection e formata os resultados"""
+        include = ["documents", "metadatas", "distances"]
+        if with_embeddings:
+            include.append("embeddings")
+        results = collection.query(
             query_embeddings=[query_embedding],
             n_results=top_k,
-            include=["documents", "metadatas", "distances"]
+            where=where,
+            include=include
         )
         
-        # Formatar resultados
         documents = []
         if results["documents"] and len(results["documents"]) > 0:
             for i in range(len(results["documents"][0])):
+                metadata = results["metadatas"][0][i]
                 documents.append({
                     "text": results["documents"][0][i],
-                    "source": results["metadatas"][0][i]["source"],
-                    "page": results["metadatas"][0][i]["page"],
+                    "source": metadata["source"],
+                    "page": metadata["page"],
+                    "page_end": metadata.get("page_end", metadata["page"]),
+                    "chunk_id": metadata.get("chunk_id", results["ids"][0][i]),
                     "distance": results["distances"][0][i],
                     "score": 1 - results["distances"][0][i]  # Converter distância em score
                 })
+                if with_embeddings:
+                    documents[-1]["embedding"] = np.asarray(results["embeddings"][0][i], dtype=np.float32)
+        return documents
+    
+    def _attach_texts(self, documents: List[dict]) -> List[dict]:
+        """
+        Busca no Chroma os textos dos documentos do store quantizado (só os top_k finais)
+        
+        Chunks removidos do índice entre o snapshot do store e esta leitura são descartados.
+        """
+        if not documents:
+            return documents
+        results = self.collection.get(ids=[doc["chunk_id"] for doc in documents], include=["documents"])
+        texts = dict(zip(results["ids"], results["documents"]))
+        attached = []
+        for doc in documents:
+            text = texts.get(doc["chunk_id"])
+            if text is not None:
+                doc["text"] = text
+                attached.append(doc)
+        return attached
+    
+    def retrieve_documents(
+        self,
+        query: str,
+        top_k: int = None,
+        sources: Optional[List[str]] = None,
+        page_min: Optional[int] = None,
+        page_max: Optional[int] = None
+    ) -> Tuple[List[dict], float]:
+        """
+        Recupera documentos relevantes do índice
+        
+        Args:
+            sources: Restringe a busca a estes arquivos
+            page_min / page_max: Restringe a busca a um intervalo de páginas
+        
+        Returns:
+            Tuple[List[dict], float]: (documentos, latência em ms)
+        """
+        start_time = time.time()
+        
+        if top_k is None:
+            top_k = self.top_k
+        
+        sources = sorted(set(sources)) if sources else None
+        cache_key = (
+            normalize_query(query), top_k, self.index_version,
+            tuple(sources) if sources else None, page_min, page_max
+        )
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            latency = (time.time() - start_time) * 1000
+            logger.info("Documents retrieved from cache", count=len(cached), latency_ms=latency)
+            return [dict(doc) for doc in cached], latency
+        
+        # Gerar embedding da query
+        query_vector = self.embed_query(query)
+        query_embedding = query_vector.tolist()
+        
+        if self.vector_store is not None and self.vector_store.loaded:
+            documents = self._attach_texts(self.vector_store.search(
+                query_vector, top_k, sources, page_min, page_max, with_embeddings=self._with_embeddings
+            ))
+            self.retrieval_cache.put(cache_key, [dict(doc) for doc in documents])
+            latency = (time.time() - start_time) * 1000
+            logger.info("Documents retrieved", count=len(documents), store="int8", latency_ms=latency)
+            return documents, latency
+        
+        # Com partições, cada arquivo é buscado na própria collection e os
+        # resultados são intercalados por distância
+        partitions = [self._get_partition(source) for source in sources] if sources else []
+        partitioned = bool(partitions) and all(partition is not None for partition in partitions)
+        if partitioned:
+            where = build_where_filter(page_min=page_min, page_max=page_max)
+            documents = []
+            for partition in partitions:
+                documents.extend(
+                    self._query_collection(partition, query_embedding, top_k, where, self._with_embeddings)
+                )
+            documents = sorted(documents, key=lambda doc: doc["distance"])[:top_k]
+        else:
+            where = build_where_filter(sources, page_min, page_max)
+            documents = self._query_collection(
+                self.collection, query_embedding, top_k, where, self._with_embeddings
+            )
+        
+        self.retrieval_cache.put(cache_key, [dict(doc) for doc in documents])
         
         latency = (time.time() - start_time) * 1000
-        logger.info("Documents retrieved", count=len(documents), latency_ms=latency)
+        logger.info(
+            "Documents retrieved",
+            count=len(documents),
+            filtered=where is not None or partitioned,
+            partitioned=partitioned,
+            latency_ms=latency
+        )
         
         return documents, latency
     
+    def diversify_documents(self, query: str, documents: List[dict]) -> Tuple[List[dict], int]:
+        """
+        Remove chunks quase duplicados (e reordena por MMR) antes de montar o contexto
+        
+        Os embeddings dos chunks são descartados dos documentos retornados.
+        
+        Returns:
+            Tuple[List[dict], int]: (documentos, quantidade de duplicados removidos)
+        """
+        dropped = 0
+        if self._with_embeddings:
+            kept, dropped = diversify(
+                self.embed_query(query),
+                documents,
+                mode=self.diversity_mode,
+                mmr_lambda=self.mmr_lambda,
+                duplicate_threshold=self.duplicate_threshold
+            )
+            if dropped:
+                logger.info("Near-duplicate chunks dropped", dropped=dropped, kept=len(kept))
+            documents = kept
+        for doc in documents:
+            doc.pop("embedding", None)
+        return documents, dropped
+    
+    def context_documents(self, documents: List[dict]) -> List[dict]:
+        """Retorna os documentos efetivamente usados no prompt (os mais relevantes)"""
+        return documents[:self.max_context_docs]
+    
     def _build_prompt(self, query: str, documents: List[dict]) -> str:
         """Constrói o prompt para o LLM com o contexto recuperado"""
         # Limitar tamanho de cada documento para evitar prompts muito grandes
-        max_chars_per_doc = 400
-        
         context_parts = []
-        for doc in documents[:3]:  # Usar no máximo 3 documentos mais relevantes
-            text = doc['text'][:max_chars_per_doc]
-            if len(doc['text']) > max_chars_per_doc:
+        for doc in self.context_documents(documents):
+            text = doc['text'][:MAX_CHARS_PER_DOC]
+            if len(doc['text']) > MAX_CHARS_PER_DOC:
                 text += "..."
             context_parts.append(f"[{doc['source']}, pág. {doc['page']}]\n{text}")
         
         context = "\n\n".join(context_parts)
         
-        # Prompt mais conciso
-        prompt = f"""Responda a pergunta usando APENAS as informações dos documentos abaixo. 
-Cite as fontes (arquivo e página).
-
-DOCUMENTOS:
-{context}
-
-PERGUNTA: {query}
-
-RESPOSTA:"""
+        # Instruções fixas vão no campo `system` (ver DEFAULT_SYSTEM_PROMPT)
+        return PROMPT_TEMPLATE.format(context=context, query=query)
+    
+    @property
+    def model_signature(self) -> str:
+        """Modelo(s) que podem gerar a resposta: os níveis e o limiar da cascata, se ativa"""
+        if self.cascade_enabled:
+            return f"{','.join(self.cascade_models)}@{self.cascade_threshold}"
+        return self.ollama_model
+    
+    @property
+    def prompt_fingerprint(self) -> str:
+        """
+        Hash de tudo que, além da pergunta e do índice, muda o prompt enviado ao
+        LLM: system prompt, template e seleção/limites do contexto
+        """
+        parts = (
+            self.system_prompt,
+            PROMPT_TEMPLATE,
+            MAX_CHARS_PER_DOC,
+            self.max_context_docs,
+            self.min_relevance_score,
+            self.diversity_mode,
+            self.mmr_lambda,
+            self.duplicate_threshold
+        )
+        return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:16]
+    
+    @property
+    def cascade_enabled(self) -> bool:
+        return len(self.cascade_models) > 1 and self.guardrail_service is not None
+    
+    def _base_payload(self, model: Optional[str] = None) -> Dict:
+        """Campos comuns às chamadas de /api/generate"""
+        payload = {"model": model or self.ollama_model}
+        if self.keep_alive:
+            # Mantém o modelo carregado entre rajadas de requisições
+            payload["keep_alive"] = self.keep_alive
+        return payload
+    
+    def warmup(self) -> None:
+        """Carrega os modelos em todas as réplicas (prompt vazio) para evitar o load na primeira pergunta"""
+        for model in self.cascade_models:
+            start_time = time.time()
+            errors = self.backend.broadcast(
+                "/api/generate",
+                {**self._base_payload(model), "stream": False},
+                timeout=600
+            )
+            for replica, error in errors.items():
+                if error:
+                    logger.warning("Ollama warmup failed", model=model, replica=replica, error=error)
+            logger.info("Ollama model warmed up", model=model, latency_ms=(time.time() - start_time) * 1000)
+    
+    @staticmethod
+    def _parse_usage(result: Dict, estimated_prompt_tokens: int, answer: str) -> Tuple[int, int, Dict]:
+        """
+        Extrai contagens de tokens e a quebra de tempo da resposta do Ollama
+        
+        Usa prompt_eval_count/eval_count quando presentes (o Ollama omite
+        prompt_eval_count quando o prompt inteiro veio do cache) e converte as
+        durações de nanossegundos para ms.
+        """
+        def ns_to_ms(key):
+            value = result.get(key)
+            return value / 1e6 if value is not None else None
+        
+        prompt_tokens = result.get("prompt_eval_count")
+        completion_tokens = result.get("eval_count")
+        tokens_estimated = prompt_tokens is None or completion_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = estimated_prompt_tokens
+        if completion_tokens is None:
+            completion_tokens = len(answer) // 4
+        
+        decode_ms = ns_to_ms("eval_duration")
+        tokens_per_second = None
+        if decode_ms and result.get("eval_count"):
+            tokens_per_second = result["eval_count"] / (decode_ms / 1000)
         
-        return prompt
+        timings = {
+            "load_ms": ns_to_ms("load_duration"),
+            "prefill_ms": ns_to_ms("prompt_eval_duration"),
+            "decode_ms": decode_ms,
+            "tokens_per_second": tokens_per_second,
+            "tokens_estimated": tokens_estimated
+        }
+        return prompt_tokens, completion_tokens, timings
     
     def generate_answer(
         self,
         query: str,
-        documents: List[dict]
-    ) -> Tuple[str, float, int, int]:
+        documents: List[dict],
+        model: Optional[str] = None
+    ) -> Tuple[str, float, int, int, Dict]:
         """
         Gera resposta usando o LLM
         
+        Args:
+            model: Modelo do Ollama (padrão: ollama_model)
+        
         Returns:
-            Tuple[str, float, int, int]: (resposta, latência ms, prompt_tokens, completion_tokens)
+            Tuple[str, float, int, int, Dict]: (resposta, latência ms, prompt_tokens, completion_tokens, timings)
+            timings: load_ms, prefill_ms, decode_ms, tokens_per_second, tokens_estimated, replica, model
         """
         start_time = time.time()
+        model = model or self.ollama_model
         
         prompt = self._build_prompt(query, documents)
         
-        # Estimar tokens (aproximação: ~4 caracteres por token)
-        prompt_tokens = len(prompt) // 4
+        # Estimativa (~4 caracteres por token), usada só se o Ollama não retornar contagens
+        estimated_prompt_tokens = (len(self.system_prompt) + len(prompt)) // 4
         
         # Tentar múltiplas vezes com timeout crescente
         max_retries = 3
@@ -118,15 +492,17 @@ RESPOSTA:"""
                 
                 logger.info(
                     "Calling Ollama API",
+                    model=model,
                     attempt=attempt + 1,
                     timeout=current_timeout
                 )
                 
-                # Chamar Ollama API
-                response = requests.post(
-                    f"{self.ollama_base_url}/api/generate",
-                    json={
-                        "model": self.ollama_model,
+                # Chamar Ollama API (réplica escolhida pelo backend)
+                result, replica = self.backend.post(
+                    "/api/generate",
+                    {
+                        **self._base_payload(model),
+                        "system": self.system_prompt,
                         "prompt": prompt,
                         "stream": False,
                         "options": {
@@ -138,23 +514,30 @@ RESPOSTA:"""
                     timeout=current_timeout
                 )
                 
-                response.raise_for_status()
-                result = response.json()
-                
                 answer = result.get("response", "")
-                completion_tokens = len(answer) // 4
-                
                 latency = (time.time() - start_time) * 1000
                 
+                prompt_tokens, completion_tokens, timings = self._parse_usage(
+                    result, estimated_prompt_tokens, answer
+                )
+                timings["replica"] = replica
+                timings["model"] = model
+                
                 logger.info(
                     "Answer generated",
+                    model=model,
+                    replica=replica,
                     latency_ms=latency,
+                    load_ms=timings["load_ms"],
+                    prefill_ms=timings["prefill_ms"],
+                    decode_ms=timings["decode_ms"],
+                    tokens_per_second=timings["tokens_per_second"],
                     prompt_tokens=prompt_tokens,
                     completion_tokens=completion_tokens,
                     attempt=attempt + 1
                 )
                 
-                return answer, latency, prompt_tokens, completion_tokens
+                return answer, latency, prompt_tokens, completion_tokens, timings
                 
             except requests.exceptions.Timeout as e:
                 logger.warning(
@@ -182,34 +565,139 @@ RESPOSTA:"""
                     
                 time.sleep(2)
     
+    def generate_with_cascade(
+        self,
+        query: str,
+        documents: List[dict]
+    ) -> Tuple[str, float, int, int, Dict]:
+        """
+        Gera a resposta percorrendo a cascata de modelos
+        
+        Cada nível é pontuado com GuardrailService.validate_response_groundedness;
+        escala para o próximo modelo apenas se o score ficar abaixo de
+        cascade_threshold. Um nível que falha (modelo não baixado, timeout)
+        também escala; a exceção só é propagada se nenhum nível responder. Se o
+        último falhar, vale a resposta do último nível que respondeu. Latência e
+        tokens somam todos os níveis tentados; a quebra de tempo
+        (load/prefill/decode) é a do nível cuja resposta foi usada.
+        
+        Returns:
+            Mesmo formato de generate_answer; timings inclui `cascade` (um item
+            por nível tentado, com `error` nos que falharam), `escalated` e
+            `groundedness_score`
+        """
+        if not self.cascade_enabled:
+            return self.generate_answer(query, documents)
+        
+        tiers = []
+        total_latency = 0.0
+        total_prompt_tokens = 0
+        total_completion_tokens = 0
+        # Resposta do último nível que respondeu: (answer, timings, groundedness)
+        result = None
+        
+        for level, model in enumerate(self.cascade_models):
+            is_last = level == len(self.cascade_models) - 1
+            start_time = time.time()
+            try:
+                answer, latency, prompt_tokens, completion_tokens, tier_timings = self.generate_answer(
+                    query, documents, model=model
+                )
+            except Exception as e:
+                # Modelo indisponível (não baixado, timeout...): segue para o próximo nível
+                latency = (time.time() - start_time) * 1000
+                total_latency += latency
+                tiers.append({"model": model, "latency_ms": latency, "error": str(e)})
+                if is_last and result is None:
+                    raise
+                logger.warning(
+                    "Cascade model failed",
+                    model=model,
+                    next_model=None if is_last else self.cascade_models[level + 1],
+                    error=str(e)
+                )
+                continue
+            
+            _, groundedness_score = self.guardrail_service.validate_response_groundedness(
+                answer, documents, threshold=self.cascade_threshold
+            )
+            
+            total_latency += latency
+            total_prompt_tokens += prompt_tokens
+            total_completion_tokens += completion_tokens
+            tiers.append({
+                "model": model,
+                "latency_ms": latency,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "groundedness_score": groundedness_score
+            })
+            result = (answer, tier_timings, groundedness_score)
+            
+            if groundedness_score >= self.cascade_threshold:
+                break
+            if not is_last:
+                logger.info(
+                    "Escalating to next cascade model",
+                    model=model,
+                    next_model=self.cascade_models[level + 1],
+                    groundedness_score=round(groundedness_score, 3),
+                    cascade_threshold=self.cascade_threshold
+                )
+        
+        answer, timings, groundedness_score = result
+        timings["cascade"] = tiers
+        timings["cascade_top_model"] = self.cascade_models[-1]
+        timings["escalated"] = len(tiers) > 1
+        timings["groundedness_score"] = groundedness_score
+        
+        return answer, total_latency, total_prompt_tokens, total_completion_tokens, timings
+    
     def answer_question(
         self,
         query: str,
-        top_k: int = None
-    ) -> Tuple[str, List[dict], float, float, int, int]:
+        top_k: int = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[str, List[dict], float, float, int, int, Dict]:
         """
         Pipeline completo de RAG: retrieve + generate
         
+        Args:
+            filters: Filtros de metadados do retrieval (sources, page_min, page_max)
+        
         Returns:
-            Tuple: (answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens)
+            Tuple: (answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens, timings)
+            timings inclui `duplicates_dropped` (chunks removidos pela etapa de diversidade)
         """
         # Retrieval
-        documents, retrieval_latency = self.retrieve_documents(query, top_k)
+        documents, retrieval_latency = self.retrieve_documents(query, top_k, **(filters or {}))
+        
+        # Early exit: nenhum documento acima do piso de relevância => sem chamada ao LLM
+        relevant = [doc for doc in documents if doc["score"] >= self.min_relevance_score]
+        if documents and not relevant:
+            logger.info(
+                "No document above relevance floor, skipping LLM",
+                best_score=round(max(doc["score"] for doc in documents), 4),
+                min_relevance_score=self.min_relevance_score
+            )
+        documents, duplicates_dropped = self.diversify_documents(query, relevant)
         
         if not documents:
             return (
-                "Não encontrei informações relevantes nos documentos para responder sua pergunta.",
+                NO_RELEVANT_INFO_ANSWER,
                 [],
                 retrieval_latency,
                 0.0,
                 0,
-                0
+                0,
+                {}
             )
         
-        # Generation
-        answer, llm_latency, prompt_tokens, completion_tokens = self.generate_answer(
+        # Generation (com cascata de modelos, se configurada)
+        answer, llm_latency, prompt_tokens, completion_tokens, timings = self.generate_with_cascade(
             query,
             documents
         )
+        timings["duplicates_dropped"] = duplicates_dropped
         
-        return answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens
+        return answer, documents, retrieval_latency, llm_latency, prompt_tokens, completion_tokens, timings
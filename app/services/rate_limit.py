@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens/s, acumulando até `burst`"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Consome `cost` tokens se disponíveis
+
+        Returns:
+            Tuple[bool, float]: (permitido, segundos até haver tokens suficientes)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class RateLimiter:
+    """
+    Rate limiting por cliente (API key ou IP) com um token bucket por cliente
+
+    Cada classe (interactive/bulk) tem limites próprios e um bucket separado
+    por cliente: a classe da primeira requisição não fixa os limites das
+    seguintes. Usado a partir do event loop (sem locks); o número de buckets
+    é limitado e os clientes inativos há mais tempo são descartados primeiro
+    (um bucket recriado começa cheio, o mesmo estado de um bucket ocioso).
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_clients: int = 10000):
+        # classe -> (tokens/s, burst)
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, client: str, priority: str = "interactive") -> Tuple[bool, float]:
+        """
+        Returns:
+            Tuple[bool, float]: (permitido, Retry-After em segundos)
+        """
+        if priority not in self.limits:
+            priority = "interactive"
+        key = (client, priority)
+        bucket: Optional[TokenBucket] = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[priority]
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        allowed, retry_after = bucket.try_acquire()
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def get_stats(self) -> Dict:
+        return {
+            "limits": {priority: {"rate": rate, "burst": burst} for priority, (rate, burst) in self.limits.items()},
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected
+        }
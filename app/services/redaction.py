@@ -0,0 +1,124 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Dados sensíveis: (nome do grupo, padrão, substituto, tamanho máximo do match ou None se ilimitado).
+# Todos começam em fronteira de palavra: o \b é aplicado uma única vez na frente da alternação.
+# A ordem importa na alternação: em uma mesma posição vence o primeiro padrão que casar.
+REDACTION_PATTERNS: List[Tuple[str, str, str, Optional[int]]] = [
+    ("card", r"\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b", "[CARTÃO REMOVIDO]", 19),
+    ("cnpj", r"\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b", "[CNPJ REMOVIDO]", 18),
+    ("cpf", r"\d{3}[\.\-]?\d{3}[\.\-]?\d{3}[\.\-]?\d{2}\b", "[CPF REMOVIDO]", 14),
+    ("email", r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", "[EMAIL REMOVIDO]", None),
+]
+
+# Caracteres que podem compor um email (único padrão sem tamanho máximo)
+_EMAIL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-@")
+
+
+class RedactionEngine:
+    """
+    Detecção e remoção de dados sensíveis (cartão, CNPJ, CPF, email)
+
+    Todos os padrões ficam em uma única regex compilada com grupos nomeados:
+    uma varredura do texto identifica o tipo de cada ocorrência pelo
+    `lastgroup`, em vez de uma passada (e uma compilação) por padrão.
+    Os padrões de REDACTION_PATTERNS não incluem a fronteira de palavra inicial.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str, str, Optional[int]]] = REDACTION_PATTERNS):
+        alternation = "|".join(f"(?P<{name}>{regex})" for name, regex, _, _ in patterns)
+        # \b compartilhado: posições no meio de palavras são descartadas sem testar cada padrão
+        self.pattern = re.compile(rf"\b(?:{alternation})")
+        self.replacements: Dict[str, str] = {name: replacement for name, _, replacement, _ in patterns}
+        # Maior match possível dos padrões limitados + 1 caractere para o \b final
+        self.max_bounded_length = max(length for *_, length in patterns if length is not None) + 1
+
+    def contains(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Ocorrências por tipo (sem alterar o texto)"""
+        return dict(Counter(match.lastgroup for match in self.pattern.finditer(text)))
+
+    def redact(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Substitui todas as ocorrências em uma única passada
+
+        Returns:
+            Tuple[str, Dict[str, int]]: (texto redigido, ocorrências por tipo)
+        """
+        counts: Counter = Counter()
+
+        def replace(match: re.Match) -> str:
+            counts[match.lastgroup] += 1
+            return self.replacements[match.lastgroup]
+
+        return self.pattern.sub(replace, text), dict(counts)
+
+    def stream(self) -> "StreamRedactor":
+        return StreamRedactor(self)
+
+
+class StreamRedactor:
+    """
+    Redação incremental de um stream de tokens
+
+    `feed` devolve apenas o trecho que já não pode mudar com os próximos
+    chunks; segura o final do buffer que ainda pode fazer parte de um dado
+    sensível incompleto (os últimos `max_bounded_length` caracteres ou a
+    sequência final de caracteres de email, o que for maior). `flush` libera
+    o restante no fim do stream. A saída concatenada é idêntica a
+    RedactionEngine.redact sobre o texto completo.
+    """
+
+    def __init__(self, engine: RedactionEngine):
+        self.engine = engine
+        self.counts: Counter = Counter()
+        self._pending = ""
+        # Último caractere já emitido: mantém o \b inicial correto entre chunks
+        self._context = ""
+
+    def _holdback(self, text: str) -> int:
+        run = 0
+        for char in reversed(text):
+            if char not in _EMAIL_CHARS:
+                break
+            run += 1
+        return max(self.engine.max_bounded_length, run)
+
+    def _emit(self, cutoff: Optional[int]) -> str:
+        text = self._context + self._pending
+        offset = len(self._context)
+        limit = len(text) if cutoff is None else offset + cutoff
+
+        output = []
+        last = offset
+        for match in self.engine.pattern.finditer(text, offset):
+            if match.start() >= limit:
+                break
+            output.append(text[last:match.start()])
+            output.append(self.engine.replacements[match.lastgroup])
+            self.counts[match.lastgroup] += 1
+            last = match.end()
+
+        boundary = max(limit, last)
+        output.append(text[last:boundary])
+        if boundary > 0:
+            self._context = text[boundary - 1]
+        self._pending = text[boundary:]
+        return "".join(output)
+
+    def feed(self, chunk: str) -> str:
+        """Adiciona um chunk e retorna o texto redigido que já pode ser enviado"""
+        self._pending += chunk
+        cutoff = len(self._pending) - self._holdback(self._pending)
+        if cutoff <= 0:
+            return ""
+        return self._emit(cutoff)
+
+    def flush(self) -> str:
+        """Fim do stream: redige e retorna o restante do buffer"""
+        output = self._emit(None)
+        self._context = ""
+        return output
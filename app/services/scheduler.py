@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Tuple
+
+
+class SchedulerQueueFull(Exception):
+    """Fila do scheduler de geração cheia"""
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing na frente do pipeline de geração
+
+    Limita as execuções simultâneas a `concurrency`. Quando não há vaga, a
+    requisição entra na fila com uma tag de término virtual
+    (start-time fair queueing): tag = max(tempo virtual, última tag do
+    cliente) + 1 / peso da classe. A vaga liberada vai para a menor tag, então
+    cada cliente recebe uma fatia proporcional ao peso (interactive > bulk) e
+    um cliente com muitas requisições enfileiradas não atrasa os demais.
+    """
+
+    def __init__(self, concurrency: int, weights: Dict[str, float], max_queue: int = 100):
+        self.concurrency = concurrency
+        self.weights = weights
+        self.max_queue = max_queue
+        self._active = 0
+        self._queue: List[Tuple[float, int, asyncio.Future, float]] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self.rejected = 0
+
+    async def _acquire(self, client: str, priority: str) -> None:
+        if self._active < self.concurrency and not self._waiting:
+            self._active += 1
+            return
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerQueueFull("Fila de geração cheia, tente novamente mais tarde")
+
+        weight = self.weights.get(priority, self.weights["interactive"])
+        start = max(self._virtual_time, self._finish_tags.get(client, 0.0))
+        finish = start + 1.0 / weight
+        self._finish_tags[client] = finish
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._seq), future, start))
+        self._waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A vaga já tinha sido transferida para esta requisição
+                self._release()
+            else:
+                self._waiting -= 1
+            raise
+
+    def _release(self) -> None:
+        # Transfere a vaga para a menor tag (entradas canceladas são ignoradas)
+        while self._queue:
+            _, _, future, start = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._waiting -= 1
+            self._virtual_time = start
+            future.set_result(None)
+            return
+        self._active -= 1
+        # Sem fila não há atraso a compensar: as tags recomeçam do tempo virtual
+        self._finish_tags.clear()
+
+    @asynccontextmanager
+    async def slot(self, client: str, priority: str = "interactive") -> AsyncIterator[float]:
+        """
+        Ocupa uma vaga de execução durante o bloco
+
+        Yields:
+            float: Tempo de espera na fila (ms)
+
+        Raises:
+            SchedulerQueueFull: fila cheia
+        """
+        start_time = time.perf_counter()
+        await self._acquire(client, priority)
+        try:
+            yield (time.perf_counter() - start_time) * 1000
+        finally:
+            self._release()
+
+    def get_stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queued": self._waiting,
+            "max_queue": self.max_queue,
+            "weights": self.weights,
+            "rejected": self.rejected
+        }
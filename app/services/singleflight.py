@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+
+class SingleFlight:
+    """
+    Deduplicação de execuções concorrentes (single-flight)
+
+    A primeira chamada com uma chave (líder) executa a função; chamadas com a
+    mesma chave que chegam enquanto ela está em andamento (seguidoras) aguardam
+    e recebem o mesmo resultado ou a mesma exceção. Nada é cacheado depois que
+    a execução termina.
+
+    A execução roda em uma task própria, aguardada com `asyncio.shield` por
+    todas as chamadas (inclusive a líder): cancelar qualquer uma delas, mesmo a
+    que iniciou a execução, não cancela o trabalho nem as demais.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Executa `fn` ou aguarda a execução em andamento com a mesma chave
+
+        Returns:
+            Tuple[Any, bool]: (resultado, se foi compartilhado de outra requisição)
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.followers += 1
+            logger.info("Joining in-flight request", in_flight=len(self._in_flight))
+            return await asyncio.shield(task), True
+
+        task = asyncio.get_running_loop().create_task(fn())
+        self._in_flight[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), False
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Evita o aviso "exception was never retrieved" quando nenhuma chamada aguardou o fim
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict:
+        total = self.leaders + self.followers
+        return {
+            "executions": self.leaders,
+            "deduplicated": self.followers,
+            "dedup_rate": self.followers / total if total else 0.0,
+            "in_flight": len(self._in_flight)
+        }
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """Calcula o hash SHA-256 do conteúdo de um arquivo (leitura em blocos)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageTextCache:
+    """
+    Cache persistente do texto extraído de PDFs
+
+    Cada arquivo é armazenado como um JSONL (uma linha por página) nomeado
+    pelo hash do conteúdo do PDF. Como a chave é o conteúdo, e não o nome ou
+    os parâmetros de chunking, mudar chunk_size/chunk_overlap reaproveita o
+    texto já extraído sem chamar o pypdf novamente.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, file_hash: str) -> Path:
+        return self.cache_path / f"{file_hash}.jsonl"
+
+    def get(self, file_hash: str) -> Optional[List[Dict]]:
+        """Retorna as páginas em cache ([{page, text}]) ou None se ausente"""
+        entry = self._entry_path(file_hash)
+        try:
+            with open(entry, "r", encoding="utf-8") as f:
+                pages = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            # Entrada corrompida: descarta e força nova extração
+            logger.warning("Invalid text cache entry", file=entry.name, error=str(e))
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return pages
+
+    def put(self, file_hash: str, pages: List[Dict]) -> None:
+        """Grava as páginas de forma atômica (arquivo temporário + rename)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for page in pages:
+                    f.write(json.dumps(
+                        {"page": page["page"], "text": page["text"]},
+                        ensure_ascii=False
+                    ))
+                    f.write("\n")
+            os.replace(tmp_path, self._entry_path(file_hash))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def get_stats(self) -> Dict:
+        """Retorna estatísticas de uso do cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(list(self.cache_path.glob("*.jsonl")))
+        }
@@ -0,0 +1,327 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantização escalar simétrica por vetor: x ≈ codes * scale
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (codes int8 N×D, scales float32 N)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _int8_dot(codes: np.ndarray, query: np.ndarray, block_size: int = 1024) -> np.ndarray:
+    """
+    Produto codes (int8) · query (float32) em blocos
+
+    Converte um bloco por vez para um buffer float32 reutilizado (cabe no
+    cache da CPU) em vez de materializar a matriz inteira em float32.
+    """
+    scores = np.empty(len(codes), dtype=np.float32)
+    buffer = np.empty((min(block_size, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), block_size):
+        block = codes[start:start + block_size]
+        np.copyto(buffer[:len(block)], block)
+        scores[start:start + len(block)] = buffer[:len(block)] @ query
+    return scores
+
+
+def _read_rows(vectors_file, rows: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Lê linhas de um arquivo float32 cru com pread
+
+    Em vez de memmap: mapear o arquivo traz páginas (folios grandes) muito
+    além das poucas linhas da shortlist para o RSS de cada worker.
+    """
+    row_bytes = dim * 4
+    vectors = np.empty((len(rows), dim), dtype=np.float32)
+    fd = vectors_file.fileno()
+    for position, row in enumerate(rows):
+        vectors[position] = np.frombuffer(os.pread(fd, row_bytes, int(row) * row_bytes), dtype=np.float32)
+    return vectors
+
+
+class QuantizedVectorStore:
+    """
+    Vetores int8 em memória para a busca de candidatos + float32 em disco
+    para re-scoring exato de uma shortlist
+
+    A busca calcula o cosseno aproximado contra os códigos int8 de todos os
+    chunks (que satisfazem os filtros), seleciona `top_k * rescore_factor`
+    candidatos e reordena esses poucos com os vetores float32 originais, lidos
+    sob demanda do arquivo (pread das linhas da shortlist).
+
+    Em memória ficam apenas códigos, escalas, ids e os arrays dos filtros
+    (arquivo e páginas); os textos continuam no Chroma e são buscados pelo id
+    só para os top_k finais (RAGService). Cada build grava um diretório
+    versionado em `path` (codes.npy, scales.npy, ids.npy, sources.npy,
+    pages.npy, page_ends.npy, vectors.f32 e meta.json) e publica-o trocando
+    o ponteiro `CURRENT` de uma vez: um load() concorrente em outro worker
+    lê sempre um build completo.
+    """
+
+    POINTER = "CURRENT"
+    # Builds mantidos além do atual (um worker pode estar carregando o anterior)
+    KEEP_PREVIOUS = 1
+
+    def __init__(self, path: str, rescore_factor: int = 4):
+        self.path = Path(path)
+        self.rescore_factor = rescore_factor
+        # Estado carregado, trocado de uma vez em load() (buscas concorrentes
+        # sempre enxergam um snapshot consistente)
+        self._index: Optional[Dict] = None
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        ids: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict],
+        version: Optional[str]
+    ) -> None:
+        """Grava um novo build em um diretório próprio e publica-o trocando o ponteiro (atômico)"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        if len(ids):
+            vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+            # Normalizados: o produto interno vira cosseno
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+            codes, scales = quantize_int8(vectors)
+        else:
+            # Collection vazia (ex.: último documento removido): store vazio, dim=0
+            vectors = np.zeros((0, 0), dtype=np.float32)
+            codes, scales = np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=np.float32)
+
+        # Arquivo de cada chunk como índice em `sources` (um int32 por chunk, não uma string)
+        sources = sorted({metadata["source"] for metadata in metadatas})
+        source_positions = {source: position for position, source in enumerate(sources)}
+        arrays = {
+            "codes.npy": codes,
+            "scales.npy": scales,
+            "ids.npy": np.array([chunk_id.encode("utf-8") for chunk_id in ids], dtype=np.bytes_),
+            "sources.npy": np.array([source_positions[m["source"]] for m in metadatas], dtype=np.int32),
+            "pages.npy": np.array([m["page"] for m in metadatas], dtype=np.int32),
+            "page_ends.npy": np.array([m.get("page_end", m["page"]) for m in metadatas], dtype=np.int32)
+        }
+
+        build_name = f"build-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        build_path = path / build_name
+        build_path.mkdir()
+        for name, array in arrays.items():
+            np.save(build_path / name, array)
+        vectors.tofile(build_path / "vectors.f32")
+        with open(build_path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version,
+                "count": len(ids),
+                "dim": int(vectors.shape[1]) if len(ids) else 0,
+                "sources": sources
+            }, f, ensure_ascii=False)
+
+        tmp_path = path / f"{cls.POINTER}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(build_name)
+        os.replace(tmp_path, path / cls.POINTER)
+        cls._remove_old_builds(path, build_name)
+
+        logger.info(
+            "Quantized vector store built",
+            path=str(build_path),
+            count=len(ids),
+            resident_bytes=sum(array.nbytes for array in arrays.values()),
+            float32_bytes=vectors.nbytes
+        )
+
+    @classmethod
+    def _remove_old_builds(cls, path: Path, current: str) -> None:
+        builds = sorted(
+            (build for build in path.glob("build-*") if build.name != current),
+            key=lambda build: build.name,
+            reverse=True
+        )
+        for build in builds[cls.KEEP_PREVIOUS:]:
+            shutil.rmtree(build, ignore_errors=True)
+        # Layout anterior (arquivos soltos, com os textos em meta.json)
+        for name in ("meta.json", "codes.npy", "scales.npy", "vectors.f32"):
+            (path / name).unlink(missing_ok=True)
+
+    def _current_build(self) -> Optional[Path]:
+        try:
+            name = (self.path / self.POINTER).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        return self.path / name if name else None
+
+    def read_version(self) -> Optional[str]:
+        """Versão do índice gravada no build atual (None se inexistente)"""
+        build_path = self._current_build()
+        if build_path is None:
+            return None
+        try:
+            with open(build_path / "meta.json", "r", encoding="utf-8") as f:
+                return json.load(f).get("version")
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def load(self) -> bool:
+        """Carrega (ou recarrega) o build atual; False se ainda não foi construído ou não pôde ser lido"""
+        build_path = self._current_build()
+        if build_path is None:
+            return False
+        try:
+            with open(build_path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            count, dim = meta["count"], meta["dim"]
+            index = {
+                "version": meta.get("version"),
+                "count": count,
+                "source_names": meta["sources"],
+                "codes": np.load(build_path / "codes.npy"),
+                "scales": np.load(build_path / "scales.npy"),
+                "ids": np.load(build_path / "ids.npy"),
+                "sources": np.load(build_path / "sources.npy"),
+                "pages": np.load(build_path / "pages.npy"),
+                "page_ends": np.load(build_path / "page_ends.npy"),
+                "dim": dim,
+                # Fechado pelo GC quando o snapshot deixa de ser usado (buscas em andamento seguem válidas)
+                "vectors_file": open(build_path / "vectors.f32", "rb"),
+                "disk_bytes": sum(f.stat().st_size for f in build_path.iterdir())
+            }
+        except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+            # Build removido entre a leitura do ponteiro e a carga: mantém o snapshot anterior
+            logger.warning("Failed to load quantized vector store", path=str(build_path), error=str(e))
+            return False
+
+        self._index = index
+        logger.info("Quantized vector store loaded", count=count, version=self.version)
+        return True
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._index["version"] if self._index else None
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    @staticmethod
+    def _filter_mask(
+        index: Dict,
+        sources: Optional[List[str]],
+        page_min: Optional[int],
+        page_max: Optional[int]
+    ) -> Optional[np.ndarray]:
+        """Mesma semântica de build_where_filter (interseção de page..page_end)"""
+        mask = None
+        if sources:
+            sources = set(sources)
+            wanted = [position for position, name in enumerate(index["source_names"]) if name in sources]
+            mask = np.isin(index["sources"], wanted)
+        if page_min is not None:
+            condition = index["page_ends"] >= page_min
+            mask = condition if mask is None else mask & condition
+        if page_max is not None:
+            condition = index["pages"] <= page_max
+            mask = condition if mask is None else mask & condition
+        return mask
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        sources: Optional[List[str]] = None,
+        page_min: Optional[int] = None,
+        page_max: Optional[int] = None,
+        with_embeddings: bool = False
+    ) -> List[dict]:
+        """
+        Busca int8 + re-scoring float32; documentos no formato de RAGService.retrieve_documents,
+        sem o campo "text" (buscado no Chroma pelo chunk_id)
+        
+        Com `with_embeddings`, cada documento traz também o vetor float32 (normalizado) do chunk.
+        """
+        index = self._index
+        if index is None or not index["count"]:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        candidates = np.arange(index["count"])
+        codes, scales = index["codes"], index["scales"]
+        mask = self._filter_mask(index, sources, page_min, page_max)
+        if mask is not None:
+            candidates = candidates[mask]
+            if not len(candidates):
+                return []
+            codes, scales = codes[candidates], scales[candidates]
+
+        # 1. Candidatos pelo cosseno aproximado (int8)
+        approx = _int8_dot(codes, query) * scales
+        shortlist_size = min(len(candidates), top_k * self.rescore_factor)
+        shortlist = candidates[np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]]
+
+        # 2. Re-scoring exato da shortlist com os vetores float32 (lidos do disco)
+        order = np.sort(shortlist)  # leitura sequencial no arquivo
+        vectors = _read_rows(index["vectors_file"], order, index["dim"])
+        exact = vectors @ query
+        best = np.argsort(-exact)[:top_k]
+
+        documents = []
+        for position in best:
+            row = order[position]
+            score = float(exact[position])
+            documents.append({
+                "source": index["source_names"][index["sources"][row]],
+                "page": int(index["pages"][row]),
+                "page_end": int(index["page_ends"][row]),
+                "chunk_id": index["ids"][row].decode("utf-8"),
+                "distance": 1 - score,
+                "score": score
+            })
+            if with_embeddings:
+                documents[-1]["embedding"] = vectors[position].copy()
+        return documents
+
+    def get_stats(self) -> Dict:
+        index = self._index
+        if index is None:
+            return {"type": "int8", "loaded": False}
+        count = index["count"]
+        int8_bytes = index["codes"].nbytes + index["scales"].nbytes
+        resident_bytes = int8_bytes + sum(
+            index[name].nbytes for name in ("ids", "sources", "pages", "page_ends")
+        )
+        return {
+            "type": "int8",
+            "loaded": True,
+            "version": index["version"],
+            "count": count,
+            "dim": int(index["codes"].shape[1]) if count else 0,
+            "int8_bytes": int8_bytes,
+            "bytes_per_vector": int8_bytes / count if count else 0.0,
+            "resident_bytes": resident_bytes,
+            "resident_bytes_per_chunk": resident_bytes / count if count else 0.0,
+            "float32_bytes_on_disk": count * index["dim"] * 4,
+            "disk_bytes": index["disk_bytes"],
+            "rescore_factor": self.rescore_factor
+        }
@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+
+def open_sqlite(path: str, mmap_size: int = 0, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Abre um banco SQLite local em modo WAL
+
+    WAL permite leituras concorrentes com um escritor (inclusive entre
+    processos/workers); synchronous=NORMAL evita fsync a cada commit, ao custo
+    de perder as últimas transações em caso de queda da máquina (não do processo).
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    if mmap_size:
+        conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ThreadLocalReaders:
+    """
+    Uma conexão somente leitura por thread
+
+    Leituras não disputam o lock do escritor do processo: em modo WAL elas
+    enxergam o último commit sem esperar transações em andamento (de outras
+    threads ou de outros workers).
+    """
+
+    def __init__(self, path: str, mmap_size: int = 0):
+        self.path = path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = open_sqlite(self.path, mmap_size=self.mmap_size, check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
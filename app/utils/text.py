@@ -0,0 +1,17 @@
+"""Normalização de texto compartilhada entre caches e deduplicação"""
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza uma pergunta para uso como chave de cache
+
+    Unicode NFKC, minúsculas, espaços colapsados e pontuação final removida:
+    "Qual o prazo?" e "  qual o PRAZO " produzem a mesma chave.
+    """
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip("?!. ")
@@ -0,0 +1 @@
+"""Benchmarks e ferramentas de avaliação offline"""
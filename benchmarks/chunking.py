@@ -0,0 +1,151 @@
+"""
+Benchmark do chunker: StreamingChunker vs RecursiveCharacterTextSplitter
+
+Mede throughput (páginas/s e MB/s) e, com --quality, a qualidade de
+retrieval de cada estratégia: sentenças amostradas das próprias páginas são
+usadas como consultas e um acerto ocorre quando um dos top-k chunks cobre a
+página de origem da sentença.
+
+Uso:
+    python -m benchmarks.chunking --data-path data --repeat 20
+    python -m benchmarks.chunking --data-path data --quality --top-k 5
+"""
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+
+from app.services.chunker import StreamingChunker
+from benchmarks.common import load_pages, print_table
+
+
+def recursive_splitter_chunks(pages: List[Dict], chunk_size: int, chunk_overlap: int) -> List[Dict]:
+    """Estratégia anterior do indexer: RecursiveCharacterTextSplitter por página"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+    chunks = []
+    for page_data in pages:
+        for i, chunk_text in enumerate(text_splitter.split_text(page_data["text"])):
+            chunks.append({
+                "text": chunk_text,
+                "source": page_data["source"],
+                "page": page_data["page"],
+                "page_end": page_data["page"],
+                "chunk_id": f"{page_data['source']}_p{page_data['page']}_c{i}"
+            })
+    return chunks
+
+
+def streaming_chunks(pages: List[Dict], chunk_size: int, chunk_overlap: int) -> List[Dict]:
+    """Estratégia atual do indexer"""
+    return list(StreamingChunker(chunk_size, chunk_overlap).chunk_pages(iter(pages)))
+
+
+STRATEGIES = {
+    "recursive_splitter": recursive_splitter_chunks,
+    "streaming_chunker": streaming_chunks,
+}
+
+
+def sample_queries(pages: List[Dict], count: int, seed: int) -> List[Dict]:
+    """Amostra sentenças das páginas para usar como consultas"""
+    candidates = []
+    for page_data in pages:
+        text = " ".join(page_data["text"].split())
+        for sentence in re.split(r"(?<=[.!?;])\s+", text):
+            if 40 <= len(sentence) <= 200:
+                candidates.append({
+                    "question": sentence,
+                    "source": page_data["source"],
+                    "page": page_data["page"]
+                })
+    random.Random(seed).shuffle(candidates)
+    return candidates[:count]
+
+
+def retrieval_quality(chunks: List[Dict], queries: List[Dict], model, top_k: int) -> Dict:
+    """Calcula recall@k e MRR por página usando similaridade cosseno exata"""
+    import numpy as np
+
+    chunk_vectors = model.encode([c["text"] for c in chunks], normalize_embeddings=True)
+    query_vectors = model.encode([q["question"] for q in queries], normalize_embeddings=True)
+    scores = query_vectors @ chunk_vectors.T
+
+    hits = 0
+    reciprocal_ranks = 0.0
+    for query, row in zip(queries, scores):
+        ranking = np.argsort(-row)[:top_k]
+        for rank, idx in enumerate(ranking, start=1):
+            chunk = chunks[idx]
+            if chunk["source"] == query["source"] and chunk["page"] <= query["page"] <= chunk["page_end"]:
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+                break
+
+    return {
+        f"recall@{top_k}": hits / len(queries),
+        "mrr": reciprocal_ranks / len(queries)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-path", default="data")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10, help="Repetições para medir throughput")
+    parser.add_argument("--quality", action="store_true", help="Avalia recall@k/MRR (requer sentence-transformers)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    pages = load_pages(args.data_path)
+    total_bytes = sum(len(p["text"].encode("utf-8")) for p in pages)
+
+    model = None
+    queries = []
+    if args.quality:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.embedding_model)
+        queries = sample_queries(pages, args.queries, args.seed)
+
+    rows = []
+    for name, strategy in STRATEGIES.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            chunks = strategy(pages, args.chunk_size, args.chunk_overlap)
+        elapsed = (time.perf_counter() - start) / args.repeat
+
+        row = {
+            "strategy": name,
+            "chunks": len(chunks),
+            "avg_chunk_chars": sum(len(c["text"]) for c in chunks) / len(chunks),
+            "cross_page_chunks": sum(1 for c in chunks if c["page"] != c["page_end"]),
+            "ms_per_run": elapsed * 1000,
+            "pages_per_s": len(pages) / elapsed,
+            "mb_per_s": total_bytes / elapsed / 1e6,
+        }
+        if model is not None:
+            row.update(retrieval_quality(chunks, queries, model, args.top_k))
+        rows.append(row)
+
+    columns = ["strategy", "chunks", "avg_chunk_chars", "cross_page_chunks", "ms_per_run", "pages_per_s", "mb_per_s"]
+    if model is not None:
+        columns += [f"recall@{args.top_k}", "mrr"]
+
+    print(f"Corpus: {len(pages)} páginas, {total_bytes / 1e3:.1f} KB")
+    print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
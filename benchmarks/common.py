@@ -0,0 +1,54 @@
+"""Utilitários compartilhados pelos benchmarks"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from pypdf import PdfReader
+
+
+def load_pages(data_path: str) -> List[Dict]:
+    """Extrai as páginas de todos os PDFs de `data_path` (mesmo formato do indexer)"""
+    pages = []
+    for pdf_path in sorted(Path(data_path).glob("*.pdf")):
+        reader = PdfReader(str(pdf_path))
+        for page_num, page in enumerate(reader.pages, start=1):
+            text = page.extract_text()
+            if text.strip():
+                pages.append({"text": text, "page": page_num, "source": pdf_path.name})
+    return pages
+
+
+def read_rss_mb(pid: int, field: str = "VmRSS") -> Optional[float]:
+    """Lê o RSS de um processo via /proc (Linux); `field`: VmRSS, RssAnon (privado) ou RssFile (page cache)"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentil pelo método nearest-rank (mesmo critério do MetricsService)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def print_table(rows: List[Dict], columns: List[str]) -> None:
+    """Imprime uma lista de dicionários como tabela alinhada"""
+    def fmt(value):
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
+
+    widths = {
+        col: max(len(col), *(len(fmt(row.get(col, ""))) for row in rows)) if rows else len(col)
+        for col in columns
+    }
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    print("  ".join("-" * widths[col] for col in columns))
+    for row in rows:
+        print("  ".join(fmt(row.get(col, "")).ljust(widths[col]) for col in columns))
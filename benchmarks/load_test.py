@@ -0,0 +1,254 @@
+"""
+Load test reprodutível da API com um Ollama simulado
+
+Sobe o mock de Ollama (benchmarks.mock_ollama) e a aplicação FastAPI em
+um subprocesso uvicorn apontando para ele, reexecuta um conjunto de
+perguntas (JSONL com campos `question` e opcionalmente `top_k`) com
+concorrência controlada e reporta throughput, p50/p95/p99 por etapa
+(cliente, total, retrieval, LLM e overhead = guardrails/métricas/serialização)
+e memória RSS do processo da API.
+
+Uso:
+    python -m benchmarks.load_test --requests 200 --concurrency 8 --token-rate 40
+    python -m benchmarks.load_test --base-url http://localhost:8000 --requests 50  # API já rodando
+    python -m benchmarks.load_test --output resultado.json  # para comparar entre versões
+    python -m benchmarks.load_test --mock-replicas 3 --concurrency 12  # escala horizontal
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+from benchmarks import mock_ollama
+from benchmarks.common import percentile, print_table, read_rss_mb
+
+DEFAULT_QUESTIONS = Path(__file__).parent / "questions.jsonl"
+
+
+def load_questions(path: str) -> List[Dict]:
+    """Lê perguntas de um JSONL ({"question": ..., "top_k": ...})"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "question" in item:
+                questions.append({"question": item["question"], "top_k": item.get("top_k", 5)})
+    if not questions:
+        raise ValueError(f"Nenhuma pergunta encontrada em {path}")
+    return questions
+
+
+class MemorySampler:
+    """Amostra o RSS de um processo periodicamente em background"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_api(port: int, ollama_urls: List[str], args, workdir: Path) -> subprocess.Popen:
+    """Sobe a API em um subprocesso uvicorn com diretórios temporários"""
+    env = dict(os.environ)
+    env.update({
+        "OLLAMA_BASE_URL": ollama_urls[0],
+        "OLLAMA_BASE_URLS": ",".join(ollama_urls),
+        "OLLAMA_MODEL": args.mock_model,
+        "DATA_PATH": str(Path(args.data_path).resolve()),
+        "CHROMA_DB_PATH": str(workdir / "chroma_db"),
+        "CACHE_PATH": str(workdir / "cache"),
+        "LOG_DIR": str(workdir / "logs"),
+        "LOG_LEVEL": "WARNING",
+        # Todas as requisições saem do mesmo IP: sem rate limit para medir a API
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"API não ficou pronta em {timeout}s")
+
+
+def send_question(session: requests.Session, base_url: str, item: Dict, timeout: float) -> Dict:
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{base_url}/api/v1/ask", json=item, timeout=timeout)
+        status_code = response.status_code
+        body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+    except requests.exceptions.RequestException:
+        status_code, body = 0, {}
+    client_ms = (time.perf_counter() - start) * 1000
+
+    result = {"status_code": status_code, "client_ms": client_ms}
+    metrics = body.get("metrics") if isinstance(body, dict) else None
+    if status_code == 200 and metrics:
+        result.update({
+            "total_ms": metrics["total_latency_ms"],
+            "retrieval_ms": metrics["retrieval_latency_ms"],
+            "llm_ms": metrics["llm_latency_ms"],
+            "overhead_ms": metrics["total_latency_ms"] - metrics["retrieval_latency_ms"] - metrics["llm_latency_ms"],
+        })
+    return result
+
+
+def run_load(base_url: str, questions: List[Dict], total: int, concurrency: int, timeout: float) -> Dict:
+    items = [questions[i % len(questions)] for i in range(total)]
+    local = threading.local()
+
+    def worker(item):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return send_question(local.session, base_url, item, timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, items))
+    elapsed = time.perf_counter() - start
+
+    return {"results": results, "elapsed_s": elapsed}
+
+
+def summarize(run: Dict, memory: List[float], concurrency: int) -> Dict:
+    results = run["results"]
+    ok = [r for r in results if r["status_code"] == 200]
+
+    stages = {}
+    for stage in ("client_ms", "total_ms", "retrieval_ms", "llm_ms", "overhead_ms"):
+        values = [r[stage] for r in ok if stage in r]
+        stages[stage] = {
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "avg": sum(values) / len(values) if values else 0.0,
+        }
+
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "success": len(ok),
+        "blocked": sum(1 for r in results if r["status_code"] == 400),
+        "errors": sum(1 for r in results if r["status_code"] not in (200, 400)),
+        "elapsed_s": run["elapsed_s"],
+        "throughput_rps": len(results) / run["elapsed_s"] if run["elapsed_s"] else 0.0,
+        "stages": stages,
+        "rss_mb_peak": max(memory) if memory else None,
+        "rss_mb_end": memory[-1] if memory else None,
+    }
+
+
+def print_summary(summary: Dict) -> None:
+    print(
+        f"Requests: {summary['requests']} (ok={summary['success']}, blocked={summary['blocked']}, "
+        f"errors={summary['errors']}) | concorrência={summary['concurrency']} | "
+        f"throughput={summary['throughput_rps']:.2f} req/s"
+    )
+    if summary["rss_mb_peak"] is not None:
+        print(f"RSS API: pico={summary['rss_mb_peak']:.1f} MB, final={summary['rss_mb_end']:.1f} MB")
+    rows = [{"stage": stage, **values} for stage, values in summary["stages"].items()]
+    print_table(rows, ["stage", "avg", "p50", "p95", "p99"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=3, help="Requisições descartadas antes da medição")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--base-url", help="Usa uma API já em execução (não sobe mock nem API)")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--data-path", default="data")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Grava o resumo em JSON")
+    parser.add_argument("--mock-replicas", type=int, default=1, help="Número de réplicas do Ollama simulado")
+    mock_ollama.add_arguments(parser)
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+
+    api_process = None
+    mock_servers = []
+    workdir = tempfile.TemporaryDirectory(prefix="micro-rag-bench-")
+    base_url = args.base_url
+
+    try:
+        if not base_url:
+            mock_servers = [
+                mock_ollama.start_server(mock_ollama.config_from_args(args))
+                for _ in range(args.mock_replicas)
+            ]
+            ollama_urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in mock_servers]
+            api_process = start_api(args.api_port, ollama_urls, args, Path(workdir.name))
+            base_url = f"http://127.0.0.1:{args.api_port}"
+
+        wait_until_ready(base_url, args.startup_timeout)
+
+        if args.warmup:
+            run_load(base_url, questions, args.warmup, 1, args.timeout)
+
+        memory: List[float] = []
+        if api_process:
+            with MemorySampler(api_process.pid) as sampler:
+                run = run_load(base_url, questions, args.requests, args.concurrency, args.timeout)
+            memory = sampler.samples
+        else:
+            run = run_load(base_url, questions, args.requests, args.concurrency, args.timeout)
+
+        summary = summarize(run, memory, args.concurrency)
+        print_summary(summary)
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        if api_process:
+            api_process.terminate()
+            api_process.wait(timeout=30)
+        for server in mock_servers:
+            server.shutdown()
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Servidor Ollama simulado para benchmarks sem GPU e sem rede
+
+Implementa /api/tags e /api/generate (stream=false) com latência
+configurável: tempo de carga do modelo na primeira chamada, prefill
+proporcional aos tokens do prompt, decode a uma taxa de tokens/s e uma
+distribuição de latência extra (fixed, uniform ou lognormal). A resposta
+reaproveita palavras do contexto recebido, para que o groundedness do
+pipeline se comporte como com um modelo real.
+
+Uso standalone:
+    python -m benchmarks.mock_ollama --port 11435 --token-rate 30 --latency-dist lognormal
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class MockOllamaConfig:
+    """Parâmetros de latência do servidor simulado"""
+
+    def __init__(
+        self,
+        model: str = "llama2",
+        token_rate: float = 30.0,
+        prefill_rate: float = 500.0,
+        completion_tokens: int = 120,
+        load_ms: float = 0.0,
+        latency_ms: float = 0.0,
+        latency_dist: str = "fixed",
+        jitter: float = 0.5,
+        seed: Optional[int] = None
+    ):
+        self.model = model
+        self.token_rate = token_rate
+        self.prefill_rate = prefill_rate
+        self.completion_tokens = completion_tokens
+        self.load_ms = load_ms
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.loaded = False
+        self.load_lock = threading.Lock()
+
+    def extra_latency_ms(self) -> float:
+        """Amostra a latência extra conforme a distribuição configurada"""
+        if self.latency_ms <= 0:
+            return 0.0
+        with self.rng_lock:
+            if self.latency_dist == "uniform":
+                low = self.latency_ms * (1 - self.jitter)
+                return self.rng.uniform(low, self.latency_ms * (1 + self.jitter))
+            if self.latency_dist == "lognormal":
+                # Mediana = latency_ms, cauda longa controlada por jitter (sigma)
+                return self.latency_ms * self.rng.lognormvariate(0.0, self.jitter)
+        return self.latency_ms
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _fake_answer(prompt: str, completion_tokens: int) -> str:
+    """Monta uma resposta com palavras do contexto para parecer fundamentada"""
+    context = prompt.split("PERGUNTA:")[0]
+    words = re.findall(r"\w{4,}", context) or ["resposta"]
+    answer_words = [words[i % len(words)] for i in range(completion_tokens)]
+    return " ".join(answer_words) + "."
+
+
+def make_handler(config: MockOllamaConfig):
+    class MockOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json(200, {"models": [{"name": config.model}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            prompt = (payload.get("system") or "") + (payload.get("prompt") or "")
+
+            load_ms = 0.0
+            with config.load_lock:
+                if not config.loaded:
+                    load_ms = config.load_ms
+                    config.loaded = True
+
+            prompt_tokens = _estimate_tokens(prompt)
+            num_predict = (payload.get("options") or {}).get("num_predict", config.completion_tokens)
+            completion_tokens = min(config.completion_tokens, num_predict)
+
+            prefill_ms = prompt_tokens / config.prefill_rate * 1000
+            decode_ms = completion_tokens / config.token_rate * 1000
+            extra_ms = config.extra_latency_ms()
+
+            time.sleep((load_ms + prefill_ms + decode_ms + extra_ms) / 1000)
+
+            self._send_json(200, {
+                "model": payload.get("model", config.model),
+                "response": _fake_answer(prompt, completion_tokens) if prompt else "",
+                "done": True,
+                "total_duration": int((load_ms + prefill_ms + decode_ms + extra_ms) * 1e6),
+                "load_duration": int(load_ms * 1e6),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((prefill_ms + extra_ms) * 1e6),
+                "eval_count": completion_tokens,
+                "eval_duration": int(decode_ms * 1e6),
+            })
+
+    return MockOllamaHandler
+
+
+def start_server(config: MockOllamaConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Inicia o servidor em uma thread daemon e retorna a instância (porta em server_address)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Registra os parâmetros do mock em um parser (reutilizado pelo load test)"""
+    parser.add_argument("--mock-model", default="llama2")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="Tokens/s de decode")
+    parser.add_argument("--prefill-rate", type=float, default=500.0, help="Tokens/s de prefill")
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--load-ms", type=float, default=0.0, help="Carga do modelo na primeira chamada")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latência extra (mediana)")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def config_from_args(args) -> MockOllamaConfig:
+    return MockOllamaConfig(
+        model=args.mock_model,
+        token_rate=args.token_rate,
+        prefill_rate=args.prefill_rate,
+        completion_tokens=args.completion_tokens,
+        load_ms=args.load_ms,
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        jitter=args.jitter,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(config_from_args(args), args.host, args.port)
+    print(f"Mock Ollama ouvindo em http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
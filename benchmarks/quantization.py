@@ -0,0 +1,197 @@
+"""
+Benchmark do store vetorial quantizado (int8 + re-scoring exato)
+
+Compara a busca exata em float32 (força bruta, referência) com o
+QuantizedVectorStore para vários fatores de re-scoring, reportando
+recall@k em relação à busca exata, latência por consulta, bytes por vetor
+dos códigos e a memória real de cada store carregado em um processo novo
+(via /proc, sem o ruído dos vetores do próprio benchmark): privada por
+worker (RssAnon) e páginas de arquivo mapeadas (RssFile, page cache
+compartilhado), além do tamanho em disco do build.
+
+Os vetores vêm de um índice Chroma existente (--chroma-path, usa também
+perguntas reais se houver modelo de embeddings) ou são sintéticos
+(clusters gaussianos, padrão), para rodar sem rede e sem GPU.
+
+Uso:
+    python -m benchmarks.quantization --vectors 50000 --dim 384 --top-k 5
+    python -m benchmarks.quantization --chroma-path chroma_db --rescore-factors 1,2,4,8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.vector_store import QuantizedVectorStore
+from benchmarks.common import percentile, print_table, read_rss_mb
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Vetores agrupados em clusters (parecido com embeddings de um corpus temático) e consultas próximas"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.normal(size=(count, dim))
+    queries = vectors[rng.integers(0, count, 200)] + 0.4 * rng.normal(size=(200, dim))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def chroma_vectors(chroma_path: str, queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Vetores de um índice Chroma existente; consultas = chunks perturbados"""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    collection = client.get_collection("documents")
+    vectors = np.asarray(collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.integers(0, len(vectors), queries)]
+    return vectors, sample + 0.05 * rng.normal(size=sample.shape).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> List[set]:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    results = []
+    for query in queries:
+        scores = normalized @ (query / np.linalg.norm(query))
+        results.append(set(np.argpartition(-scores, top_k - 1)[:top_k].tolist()))
+    return results
+
+
+def measure_exact(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> List[float]:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        scores = normalized @ (query / np.linalg.norm(query))
+        np.argsort(-scores[np.argpartition(-scores, top_k - 1)[:top_k]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def measure_rss_child(workdir: str, mode: str) -> None:
+    """
+    Processo filho: carrega o store (int8) ou os vetores float32 inteiros,
+    executa uma busca e imprime o aumento de memória privada (RssAnon) e de
+    páginas de arquivo mapeadas (RssFile, page cache compartilhado entre workers)
+    """
+    store = QuantizedVectorStore(workdir)
+    build_path = store._current_build()
+    with open(build_path / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    dim = meta["dim"] or 1
+    # Inicializa os buffers do BLAS antes da medição (alocados no primeiro produto de matrizes)
+    np.ones((2048, dim), dtype=np.float32) @ np.ones(dim, dtype=np.float32)
+    query = np.ones(dim, dtype=np.float32)
+
+    pid = os.getpid()
+    before = {field: read_rss_mb(pid, field) for field in ("RssAnon", "RssFile")}
+    if mode == "int8":
+        store.load()
+        if meta["count"]:
+            store.search(query, 5)
+        resident = store
+    else:
+        resident = np.fromfile(build_path / "vectors.f32", dtype=np.float32).reshape(meta["count"], -1)
+        if meta["count"]:
+            resident @ query
+    after = {field: read_rss_mb(pid, field) for field in ("RssAnon", "RssFile")}
+    print(json.dumps({
+        "anon_bytes": (after["RssAnon"] - before["RssAnon"]) * 1024 * 1024,
+        "file_bytes": (after["RssFile"] - before["RssFile"]) * 1024 * 1024
+    }))
+    del resident
+
+
+def measure_rss(workdir: str, mode: str) -> Dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.quantization", "--rss-child", mode, "--rss-path", workdir],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rescore-factors", default="1,2,4,8")
+    parser.add_argument("--chroma-path", help="Usa os vetores de um índice existente")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rss-child", choices=["int8", "float32"], help=argparse.SUPPRESS)
+    parser.add_argument("--rss-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_child:
+        measure_rss_child(args.rss_path, args.rss_child)
+        return
+
+    if args.chroma_path:
+        vectors, queries = chroma_vectors(args.chroma_path, 200, args.seed)
+    else:
+        vectors, queries = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+
+    count, dim = vectors.shape
+    truth = exact_top_k(vectors, queries, args.top_k)
+    exact_latencies = measure_exact(vectors, queries, args.top_k)
+
+    with tempfile.TemporaryDirectory(prefix="quantized-bench-") as workdir:
+        QuantizedVectorStore.build(
+            workdir,
+            ids=[str(i) for i in range(count)],
+            embeddings=vectors,
+            metadatas=[{"source": "bench.pdf", "page": 1} for _ in range(count)],
+            version="benchmark"
+        )
+        float32_rss = measure_rss(workdir, "float32")
+        int8_rss = measure_rss(workdir, "int8")
+
+        rows = [{
+            "store": "float32 exato",
+            "rescore": "-",
+            "recall": 1.0,
+            "bytes_per_vector": float(dim * 4),
+            "anon_mb": float32_rss["anon_bytes"] / 1024 / 1024,
+            "anon_bytes_per_chunk": float32_rss["anon_bytes"] / count,
+            "file_mb": float32_rss["file_bytes"] / 1024 / 1024,
+            "p50_ms": percentile(exact_latencies, 0.50),
+            "p95_ms": percentile(exact_latencies, 0.95),
+        }]
+
+        store = QuantizedVectorStore(workdir)
+        store.load()
+        stats = store.get_stats()
+        for factor in [int(v) for v in args.rescore_factors.split(",") if v.strip()]:
+            store.rescore_factor = factor
+            hits, latencies = 0, []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                documents = store.search(query, args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(expected & {int(doc["chunk_id"]) for doc in documents})
+
+            rows.append({
+                "store": "int8 + re-scoring",
+                "rescore": factor,
+                "recall": hits / (len(queries) * args.top_k),
+                "bytes_per_vector": stats["bytes_per_vector"],
+                "anon_mb": int8_rss["anon_bytes"] / 1024 / 1024,
+                "anon_bytes_per_chunk": int8_rss["anon_bytes"] / count,
+                "file_mb": int8_rss["file_bytes"] / 1024 / 1024,
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+            })
+
+    print(f"Vetores: {count} x {dim} | consultas: {len(queries)} | top_k: {args.top_k}")
+    print(f"Build int8 em disco: {stats['disk_bytes'] / 1024 / 1024:.1f} MB (inclui vectors.f32 para o re-scoring)")
+    print_table(rows, ["store", "rescore", "recall", "bytes_per_vector", "anon_mb", "anon_bytes_per_chunk", "file_mb", "p50_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
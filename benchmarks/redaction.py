@@ -0,0 +1,118 @@
+"""
+Benchmark da sanitização de respostas (dados sensíveis)
+
+Compara, em respostas longas sintéticas com CPFs, CNPJs, cartões e emails:
+- legado: uma chamada re.sub/re.findall por padrão (implementação anterior
+  do GuardrailService.sanitize_response, sem emails)
+- engine: RedactionEngine.redact, uma passada com a regex combinada
+- stream: StreamRedactor alimentado com chunks do tamanho de tokens
+
+Confere também que a saída do stream é idêntica à do engine.
+
+Uso:
+    python -m benchmarks.redaction --sizes 2000,20000,200000 --iterations 50
+"""
+import argparse
+import random
+import re
+import time
+from typing import Callable, List
+
+from app.services.redaction import RedactionEngine
+from benchmarks.common import percentile, print_table
+
+SENSITIVE_SAMPLES = [
+    "123.456.789-09",
+    "12.345.678/0001-95",
+    "4111 1111 1111 1111",
+    "contato.locacao@imobiliaria.com.br",
+]
+WORDS = (
+    "o contrato de locação tem prazo de trinta meses e o valor do aluguel é reajustado "
+    "anualmente pelo IGP-M conforme a cláusula quinta do documento assinado pelas partes"
+).split()
+
+
+def synthetic_answer(chars: int, sensitive_every: int, seed: int) -> str:
+    """Texto em português com um dado sensível a cada `sensitive_every` palavras"""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    size = 0
+    while size < chars:
+        word = rng.choice(SENSITIVE_SAMPLES) if rng.randrange(sensitive_every) == 0 else rng.choice(WORDS)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts)[:chars]
+
+
+def legacy_sanitize(response: str) -> str:
+    """Implementação anterior: padrões não compilados, uma passada por padrão"""
+    response = re.sub(r"\b\d{3}[\.\-]?\d{3}[\.\-]?\d{3}[\.\-]?\d{2}\b", "[CPF REMOVIDO]", response)
+    response = re.sub(r"\b\d{2}[\.\-]?\d{3}[\.\-]?\d{3}/?\d{4}[\.\-]?\d{2}\b", "[CNPJ REMOVIDO]", response)
+    response = re.sub(r"\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b", "[CARTÃO REMOVIDO]", response)
+    return response
+
+
+def stream_chunks(text: str, seed: int) -> List[str]:
+    """Fatia o texto em chunks de 1 a 8 caracteres (tamanho típico de tokens)"""
+    rng = random.Random(seed)
+    chunks, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+def measure(fn: Callable[[], object], iterations: int) -> List[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2000,20000,200000", help="Tamanhos das respostas (caracteres)")
+    parser.add_argument("--sensitive-every", type=int, default=40, help="Um dado sensível a cada N palavras")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = RedactionEngine()
+    rows = []
+    for size in [int(v) for v in args.sizes.split(",") if v.strip()]:
+        text = synthetic_answer(size, args.sensitive_every, args.seed)
+        chunks = stream_chunks(text, args.seed)
+
+        def run_stream():
+            redactor = engine.stream()
+            return "".join(redactor.feed(chunk) for chunk in chunks) + redactor.flush()
+
+        expected, counts = engine.redact(text)
+        if run_stream() != expected:
+            raise AssertionError(f"Saída do stream difere da redação completa (size={size})")
+
+        for name, fn in (
+            ("legado (3x re.sub)", lambda: legacy_sanitize(text)),
+            ("engine (1 passada)", lambda: engine.redact(text)),
+            ("stream (chunks 1-8)", run_stream),
+        ):
+            latencies = measure(fn, args.iterations)
+            rows.append({
+                "chars": size,
+                "impl": name,
+                "matches": sum(counts.values()),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "mb_per_s": size / 1e6 / (percentile(latencies, 0.50) / 1000) if percentile(latencies, 0.50) else 0.0,
+            })
+
+    print(f"Um dado sensível a cada {args.sensitive_every} palavras | iterações: {args.iterations}")
+    print_table(rows, ["chars", "impl", "matches", "p50_ms", "p95_ms", "mb_per_s"])
+
+
+if __name__ == "__main__":
+    main()
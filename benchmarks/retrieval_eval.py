@@ -0,0 +1,259 @@
+"""
+Avaliação offline de qualidade vs latência do retrieval
+
+Varre combinações de modelo de embeddings, CHUNK_SIZE, CHUNK_OVERLAP e
+TOP_K sobre os PDFs de `data/`, usando DocumentIndexer e RAGService reais,
+e reporta em uma tabela: recall@k, MRR, tempo de construção do índice,
+tamanho do índice em disco e latência de retrieval por consulta.
+
+Cada índice é cacheado em `--cache-dir/<hash>` (hash do corpus + modelo +
+parâmetros de chunking); só configurações novas ou com PDFs alterados são
+reindexadas. TOP_K não afeta o índice e reaproveita o mesmo build.
+
+O conjunto rotulado é um JSONL com {"question", "source", "page"}; um
+acerto ocorre quando algum dos top-k chunks é do mesmo arquivo e cobre a
+página rotulada (page <= página <= page_end).
+
+Com --calibrate, compara o score top-1 das perguntas rotuladas com o de
+perguntas fora do domínio e sugere o MIN_RELEVANCE_SCORE do modelo
+(ver RELEVANCE_FLOORS em app/services/rag.py).
+
+Uso:
+    python -m benchmarks.retrieval_eval \\
+        --chunk-sizes 300,500,800 --chunk-overlaps 0,50,100 --top-ks 3,5,10
+    python -m benchmarks.retrieval_eval --calibrate --embedding-models all-MiniLM-L6-v2
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.services.indexer import DocumentIndexer
+from app.services.rag import RAGService
+from app.services.text_cache import PageTextCache, file_sha256
+from benchmarks.common import percentile, print_table
+
+DEFAULT_LABELS = Path(__file__).parent / "labeled_questions.jsonl"
+DEFAULT_OFF_TOPIC = Path(__file__).parent / "off_topic_questions.jsonl"
+
+
+def parse_list(value: str, cast=str) -> List:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def load_labels(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def corpus_fingerprint(data_path: Path) -> str:
+    """Hash combinado dos PDFs (nome + conteúdo)"""
+    digest = hashlib.sha256()
+    for pdf in sorted(data_path.glob("*.pdf")):
+        digest.update(pdf.name.encode("utf-8"))
+        digest.update(file_sha256(pdf).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def directory_size_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def build_or_load_index(
+    cache_dir: Path,
+    data_path: Path,
+    corpus_hash: str,
+    model_name: str,
+    model,
+    chunk_size: int,
+    chunk_overlap: int,
+    text_cache: PageTextCache
+) -> Dict:
+    """Constrói o índice da configuração ou reaproveita o cacheado"""
+    config = {
+        "corpus": corpus_hash,
+        "embedding_model": model_name,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+    }
+    config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    index_dir = cache_dir / config_hash
+    manifest_path = index_dir / "manifest.json"
+
+    indexer = DocumentIndexer(
+        data_path=str(data_path),
+        chroma_db_path=str(index_dir / "chroma_db"),
+        embedding_model_name=model_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        text_cache=text_cache,
+        embedding_model=model
+    )
+
+    if manifest_path.exists() and indexer.get_collection() is not None:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["cached"] = True
+    else:
+        start = time.perf_counter()
+        chunks = indexer.index_documents()
+        manifest = {
+            **config,
+            "chunks": chunks,
+            "build_time_s": time.perf_counter() - start,
+        }
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        manifest["cached"] = False
+
+    manifest["index_size_mb"] = directory_size_bytes(index_dir / "chroma_db") / 1e6
+    manifest["indexer"] = indexer
+    return manifest
+
+
+def evaluate(rag: RAGService, labels: List[Dict], top_k: int) -> Dict:
+    """Calcula recall@k, MRR@k e latência de retrieval por consulta"""
+    # Aquecimento (primeira consulta carrega o índice HNSW)
+    rag.retrieve_documents(labels[0]["question"], top_k)
+
+    hits = 0
+    reciprocal_ranks = 0.0
+    latencies = []
+    for label in labels:
+        documents, latency = rag.retrieve_documents(label["question"], top_k)
+        latencies.append(latency)
+        for rank, doc in enumerate(documents, start=1):
+            if doc["source"] == label["source"] and doc["page"] <= label["page"] <= doc["page_end"]:
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+                break
+
+    return {
+        "recall": hits / len(labels),
+        "mrr": reciprocal_ranks / len(labels),
+        "p50_query_ms": percentile(latencies, 0.50),
+        "p95_query_ms": percentile(latencies, 0.95),
+    }
+
+
+def calibrate(rag: RAGService, labels: List[Dict], off_topic: List[Dict]) -> Dict:
+    """Distribuição do score top-1 dentro e fora do domínio e piso sugerido"""
+    def top1_scores(questions):
+        scores = []
+        for item in questions:
+            documents, _ = rag.retrieve_documents(item["question"], 1)
+            scores.append(documents[0]["score"] if documents else 0.0)
+        return scores
+
+    in_domain = top1_scores(labels)
+    outside = top1_scores(off_topic)
+    in_domain_low = percentile(in_domain, 0.05)
+    outside_high = max(outside) if outside else 0.0
+
+    # Com separação, piso no meio do intervalo; sem separação, prioriza não
+    # descartar perguntas do domínio
+    if outside_high < in_domain_low:
+        suggested = (outside_high + in_domain_low) / 2
+    else:
+        suggested = min(outside_high, in_domain_low)
+
+    return {
+        "in_domain_min": min(in_domain),
+        "in_domain_p05": in_domain_low,
+        "off_topic_p95": percentile(outside, 0.95),
+        "off_topic_max": outside_high,
+        "suggested_floor": suggested,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-path", default="data")
+    parser.add_argument("--labels", default=str(DEFAULT_LABELS))
+    parser.add_argument("--embedding-models", default="all-MiniLM-L6-v2")
+    parser.add_argument("--chunk-sizes", default="500")
+    parser.add_argument("--chunk-overlaps", default="50")
+    parser.add_argument("--top-ks", default="3,5")
+    parser.add_argument("--cache-dir", default=".eval_cache")
+    parser.add_argument("--calibrate", action="store_true", help="Sugere MIN_RELEVANCE_SCORE por modelo")
+    parser.add_argument("--off-topic", default=str(DEFAULT_OFF_TOPIC))
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    data_path = Path(args.data_path)
+    cache_dir = Path(args.cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    text_cache = PageTextCache(str(cache_dir / "text"))
+    labels = load_labels(args.labels)
+    corpus_hash = corpus_fingerprint(data_path)
+
+    off_topic = load_labels(args.off_topic) if args.calibrate else []
+
+    rows = []
+    calibration_rows = []
+    for model_name in parse_list(args.embedding_models):
+        model = SentenceTransformer(model_name)
+        for chunk_size, chunk_overlap in itertools.product(
+            parse_list(args.chunk_sizes, int), parse_list(args.chunk_overlaps, int)
+        ):
+            if chunk_overlap >= chunk_size:
+                continue
+
+            index = build_or_load_index(
+                cache_dir, data_path, corpus_hash, model_name, model,
+                chunk_size, chunk_overlap, text_cache
+            )
+            rag = RAGService(
+                collection=index["indexer"].get_collection(),
+                embedding_model=model,
+                ollama_base_url="",
+                ollama_model=""
+            )
+
+            if args.calibrate:
+                calibration_rows.append({
+                    "model": model_name,
+                    "chunk_size": chunk_size,
+                    "overlap": chunk_overlap,
+                    **calibrate(rag, labels, off_topic),
+                })
+
+            for top_k in parse_list(args.top_ks, int):
+                rows.append({
+                    "model": model_name,
+                    "chunk_size": chunk_size,
+                    "overlap": chunk_overlap,
+                    "top_k": top_k,
+                    "chunks": index["chunks"],
+                    "build_s": index["build_time_s"],
+                    "cached": index["cached"],
+                    "index_mb": index["index_size_mb"],
+                    **evaluate(rag, labels, top_k),
+                })
+
+    print(f"Perguntas rotuladas: {len(labels)}")
+    print_table(rows, [
+        "model", "chunk_size", "overlap", "top_k", "chunks", "recall", "mrr",
+        "build_s", "cached", "index_mb", "p50_query_ms", "p95_query_ms"
+    ])
+
+    if calibration_rows:
+        print()
+        print("Calibração do piso de relevância (score top-1):")
+        print_table(calibration_rows, [
+            "model", "chunk_size", "overlap", "in_domain_min", "in_domain_p05",
+            "off_topic_p95", "off_topic_max", "suggested_floor"
+        ])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": rows, "calibration": calibration_rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark do custo de serialização da resposta de /api/v1/ask
+
+Compara o caminho padrão do FastAPI (revalidação pelo response_model +
+jsonable_encoder + json.dumps) com o caminho atual (model_dump + orjson)
+para cada combinação de citation_detail/context_only.
+
+Uso:
+    python -m benchmarks.serialization --iterations 5000 --top-k 5
+"""
+import argparse
+import random
+import string
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.models.schemas import Metrics, QuestionResponse
+from app.services.citations import build_citations
+from benchmarks.common import print_table
+
+MAX_CONTEXT_DOCS = 3
+
+
+def fake_documents(count: int, chunk_chars: int, seed: int):
+    """Gera documentos sintéticos no formato de RAGService.retrieve_documents"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + "áéíóúçã " * 4
+    return [
+        {
+            "text": "".join(rng.choice(alphabet) for _ in range(chunk_chars)),
+            "source": f"documento_{i}.pdf",
+            "page": rng.randint(1, 20),
+            "chunk_id": f"documento_{i}.pdf_p1_c{i}",
+            "score": rng.random(),
+        }
+        for i in range(count)
+    ]
+
+
+def build_response(documents, detail: str, context_only: bool) -> QuestionResponse:
+    cited = documents[:MAX_CONTEXT_DOCS] if context_only else documents
+    return QuestionResponse(
+        answer="Resposta de exemplo " * 40,
+        citations=build_citations(cited, detail),
+        metrics=Metrics(
+            total_latency_ms=1234.5,
+            retrieval_latency_ms=12.3,
+            llm_latency_ms=1200.1,
+            prompt_tokens=420,
+            completion_tokens=180,
+            total_tokens=600,
+            estimated_cost_usd=0.0,
+            top_k_used=len(documents),
+            context_size=sum(len(d["text"]) for d in documents),
+            groundedness_score=0.8
+        ),
+        status="success"
+    )
+
+
+def default_path(response: QuestionResponse) -> bytes:
+    """Caminho padrão do FastAPI com response_model"""
+    validated = QuestionResponse.model_validate(response.model_dump())
+    return JSONResponse(content=jsonable_encoder(validated)).body
+
+
+def orjson_path(response: QuestionResponse) -> bytes:
+    """Caminho atual do endpoint"""
+    return ORJSONResponse(content=response.model_dump()).body
+
+
+def measure(fn, response, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(response)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--chunk-chars", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    documents = fake_documents(args.top_k, args.chunk_chars, args.seed)
+
+    rows = []
+    for detail in ("excerpts", "ids", "none"):
+        for context_only in (False, True):
+            if detail == "none" and context_only:
+                continue
+            response = build_response(documents, detail, context_only)
+            default_us = measure(default_path, response, args.iterations)
+            orjson_us = measure(orjson_path, response, args.iterations)
+            rows.append({
+                "citation_detail": detail,
+                "context_only": context_only,
+                "bytes": len(orjson_path(response)),
+                "default_us": default_us,
+                "orjson_us": orjson_us,
+                "speedup": default_us / orjson_us,
+            })
+
+    print_table(rows, ["citation_detail", "context_only", "bytes", "default_us", "orjson_us", "speedup"])
+
+
+if __name__ == "__main__":
+    main()